@@ -0,0 +1,325 @@
+"""
+Benchmarks of the hot paths, over growing square grids.
+
+Each stage is measured at each size, from a fixed seed:
+- the wall time of the call (best of a few repeats, without tracing).
+- the peak memory allocated during the call (tracemalloc, which also traces numpy).
+- the number of memory blocks still allocated after the call (net allocations).
+
+A stage is not run at the next sizes once it takes longer than the time budget,
+so that the largest sizes only run the stages that scale.
+
+The results are appended to a JSON history, and compared with the previous
+run: a stage is a regression when it is slower (or uses more memory) by more
+than the threshold.
+"""
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Callable
+
+import numpy as np
+
+from hpgg.grid_graphs.cell_grid_graph import CellGridGraph, CellPathMatrix
+from hpgg.grid_graphs.tile_grid_graphs import TileGridGraph
+from hpgg.paths.stc_algo import AlgorithmSTC, SkeletonSTC
+
+SIZES = (10, 30, 100, 300, 1000, 2000, 4000)
+# outside of the source tree, as the history is specific to the machine
+DEFAULT_HISTORY_PATH = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "hpgg", "benchmark_history.json",
+)
+# a run is only compared with the runs of the same platform
+PLATFORM_FIELDS = ("node", "machine", "python", "numpy")
+# relative increase of time or peak memory that is a regression
+DEFAULT_THRESHOLD = 0.25
+# differences below these are noise
+MIN_TIME_DIFFERENCE = 1e-3
+MIN_MEMORY_DIFFERENCE = 1 << 16
+
+
+def get_holed_grid(size: int, seed: int) -> TileGridGraph:
+    """
+    A size x size connected grid, with size periphery holes and size inner holes.
+    """
+    rng = random.Random(seed)
+    grid = TileGridGraph(size, size)
+    grid.add_periphery_holes(size, keep_connected=True, rng=rng)
+    grid.add_holes(size, keep_connected=True, rng=rng)
+    return grid
+
+
+# a stage prepares its input (not measured), and returns the call to measure
+def _check_connected_graph(size: int, seed: int) -> Callable:
+    grid = get_holed_grid(size, seed)
+    return grid.check_connected_graph
+
+
+def _add_periphery_holes(size: int, seed: int) -> Callable:
+    grid = TileGridGraph.from_mask(np.ones((size, size), dtype=bool), check_connected=False)
+    rng = random.Random(seed)
+    return lambda: grid.add_periphery_holes(size, keep_connected=True, rng=rng)
+
+
+def _add_holes(size: int, seed: int) -> Callable:
+    grid = TileGridGraph.from_mask(np.ones((size, size), dtype=bool), check_connected=False)
+    rng = random.Random(seed)
+    return lambda: grid.add_holes(size, keep_connected=True, rng=rng)
+
+
+def _skeleton_stc(size: int, seed: int) -> Callable:
+    grid = get_holed_grid(size, seed)
+    return lambda: SkeletonSTC(grid)
+
+
+def _algorithm_stc(size: int, seed: int) -> Callable:
+    cell_grid_graph = CellGridGraph(get_holed_grid(size, seed))
+    return lambda: AlgorithmSTC(cell_grid_graph)
+
+
+def _cell_path_matrix(size: int, seed: int) -> Callable:
+    cell_grid_graph = CellGridGraph(get_holed_grid(size, seed))
+    return lambda: CellPathMatrix(cell_grid_graph)
+
+
+def _generate_tikz(size: int, seed: int) -> Callable:
+    grid = get_holed_grid(size, seed)
+    path = os.path.join(tempfile.gettempdir(), f"hpgg-benchmark-{os.getpid()}.tex")
+    def generate_tikz():
+        grid.generate_tikz(path)
+        os.remove(path)
+    return generate_tikz
+
+
+STAGES: dict[str, Callable[[int, int], Callable]] = {
+    "check_connected_graph": _check_connected_graph,
+    "add_periphery_holes": _add_periphery_holes,
+    "add_holes": _add_holes,
+    "SkeletonSTC": _skeleton_stc,
+    "AlgorithmSTC": _algorithm_stc,
+    "CellPathMatrix": _cell_path_matrix,
+    "generate_tikz": _generate_tikz,
+}
+
+
+@dataclass
+class Measure:
+    stage: str
+    size: int
+    time: float
+    peak_memory: int
+    allocated_blocks: int
+
+
+def measure(stage: str, size: int, seed: int = 0, repeat: int = 3) -> Measure:
+    """
+    Measure a stage at a size. Each repeat gets a new input from the same seed.
+    """
+    setup = STAGES[stage]
+    best_time = float("inf")
+    for _ in range(repeat):
+        call = setup(size, seed)
+        gc.collect()
+        start = time.perf_counter()
+        call()
+        best_time = min(best_time, time.perf_counter() - start)
+
+    # memory is measured on a separate run, as tracing slows the calls
+    call = setup(size, seed)
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    try:
+        call()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    allocated_blocks = sys.getallocatedblocks() - blocks
+    return Measure(stage, size, best_time, peak_memory, allocated_blocks)
+
+
+def run_benchmarks(
+    stages: list[str] | None = None,
+    sizes: tuple[int, ...] = SIZES,
+    seed: int = 0,
+    repeat: int = 3,
+    time_budget: float = 10.0,
+    log: Callable[[str], None] | None = None,
+) -> list[Measure]:
+    """
+    Measure the stages at growing sizes, until they take longer than time_budget.
+    """
+    measures = []
+    for stage in stages or list(STAGES):
+        for size in sorted(sizes):
+            result = measure(stage, size, seed, repeat)
+            measures.append(result)
+            if log is not None:
+                log(f"{stage:>22} {size:>5}: {result.time:10.4f}s {result.peak_memory / 2**20:10.1f}MiB "
+                    f"{result.allocated_blocks:>8} blocks")
+            if result.time > time_budget:
+                if log is not None:
+                    log(f"{stage:>22}: over the time budget, larger sizes skipped")
+                break
+    return measures
+
+
+def get_scaling_exponents(measures: list[Measure]) -> dict[str, list[tuple[int, float]]]:
+    """
+    Get the exponent of the time of each stage between consecutive sizes,
+    relative to the number of tiles (1 = linear in the number of tiles).
+    """
+    exponents: dict[str, list[tuple[int, float]]] = {}
+    by_stage: dict[str, list[Measure]] = {}
+    for result in measures:
+        by_stage.setdefault(result.stage, []).append(result)
+    for stage, results in by_stage.items():
+        results.sort(key=lambda result: result.size)
+        exponents[stage] = [
+            (b.size, float(np.log(b.time / a.time) / np.log(b.size**2 / a.size**2)))
+            for a, b in zip(results, results[1:])
+            if a.time > 0 and b.time > 0
+        ]
+    return exponents
+
+
+def load_history(path: str) -> list[dict]:
+    if not os.path.exists(path):
+        return []
+    with open(path) as file:
+        return json.load(file)
+
+
+def get_platform() -> dict:
+    return {
+        "node": platform.node(),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+    }
+
+
+def find_previous_run(history: list[dict], current_platform: dict) -> dict | None:
+    """
+    Get the last run of the history on the same platform, or None.
+    """
+    for run in reversed(history):
+        if all(run.get(name) == current_platform[name] for name in PLATFORM_FIELDS):
+            return run
+    return None
+
+
+def append_history(path: str, measures: list[Measure], seed: int):
+    history = load_history(path)
+    history.append({
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "seed": seed,
+        **get_platform(),
+        "measures": [asdict(result) for result in measures],
+    })
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(history, file, indent=1)
+
+
+def find_regressions(
+    measures: list[Measure],
+    previous: list[dict],
+    threshold: float = DEFAULT_THRESHOLD,
+) -> list[str]:
+    """
+    Compare the measures with those of a previous run.
+    Returns a message per regression, by increasing size, so the first one
+    is the first stage that breaks as the sizes grow.
+    """
+    previous_measures = {(result["stage"], result["size"]): result for result in previous}
+    regressions = []
+    for result in sorted(measures, key=lambda result: (result.size, result.stage)):
+        before = previous_measures.get((result.stage, result.size))
+        if before is None:
+            continue
+        if (result.time > before["time"] * (1 + threshold)
+                and result.time - before["time"] > MIN_TIME_DIFFERENCE):
+            regressions.append(
+                f"{result.stage} at {result.size}x{result.size}: "
+                f"time {before['time']:.4f}s -> {result.time:.4f}s"
+            )
+        if (result.peak_memory > before["peak_memory"] * (1 + threshold)
+                and result.peak_memory - before["peak_memory"] > MIN_MEMORY_DIFFERENCE):
+            regressions.append(
+                f"{result.stage} at {result.size}x{result.size}: "
+                f"peak memory {before['peak_memory']} -> {result.peak_memory} bytes"
+            )
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths of hpgg over growing grids.")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=None)
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(SIZES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--time-budget", type=float, default=10.0,
+                        help="seconds after which a stage is not run at larger sizes")
+    parser.add_argument("--history", default=DEFAULT_HISTORY_PATH)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--no-save", action="store_true", help="do not append this run to the history")
+    args = parser.parse_args(argv)
+
+    measures = run_benchmarks(args.stages, tuple(args.sizes), args.seed, args.repeat, args.time_budget, print)
+
+    print("\nScaling exponents (time ~ tiles^k):")
+    for stage, exponents in get_scaling_exponents(measures).items():
+        print(f"{stage:>22}: " + " ".join(f"{size}:{exponent:.2f}" for size, exponent in exponents))
+
+    previous = find_previous_run(load_history(args.history), get_platform())
+    regressions = find_regressions(measures, previous["measures"], args.threshold) if previous else []
+    if not args.no_save:
+        append_history(args.history, measures, args.seed)
+
+    if regressions:
+        print(f"\n{len(regressions)} regressions (over {100 * args.threshold:.0f}%):")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    return 0
+
+
+# Tests
+import unittest
+class TestBenchmarks(unittest.TestCase):
+    def test_small_run_and_regressions(self):
+        """
+        Test a run of all the stages on small grids, and the regression check.
+        """
+        measures = run_benchmarks(sizes=(8, 12), repeat=1)
+        self.assertEqual({result.stage for result in measures}, set(STAGES))
+        self.assertEqual(len(measures), 2 * len(STAGES))
+        self.assertTrue(all(result.time > 0 and result.peak_memory > 0 for result in measures))
+
+        previous = [asdict(result) for result in measures]
+        self.assertEqual(find_regressions(measures, previous), [])
+        slower = [Measure(result.stage, result.size, result.time + 1.0, result.peak_memory, 0) for result in measures]
+        regressions = find_regressions(slower, previous)
+        self.assertEqual(len(regressions), len(measures))
+        self.assertTrue(regressions[0].endswith("s") and "at 8x8" in regressions[0])
+
+        # only the runs of the same platform are compared
+        current_platform = get_platform()
+        other_platform = {**current_platform, "numpy": "0.0"}
+        history = [
+            {**current_platform, "measures": previous},
+            {**other_platform, "measures": []},
+        ]
+        self.assertIs(find_previous_run(history, current_platform), history[0])
+        self.assertIsNone(find_previous_run(history[1:], current_platform))
@@ -0,0 +1,10 @@
+import time
+
+# the start-up time includes the imports of hpgg
+START_TIME = time.perf_counter()
+
+import sys
+
+from hpgg.cli import main
+
+sys.exit(main(start_time=START_TIME))
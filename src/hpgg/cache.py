@@ -0,0 +1,277 @@
+"""
+Cache of solutions (CellPathMatrix), keyed by the canonical form of the
+tile grid graph, the name of the algorithm and its parameters.
+
+The solutions are stored in the canonical orientation, so a rotated or
+reflected copy of a solved instance is a hit, and its solution is mapped
+back to its orientation (see `hpgg.grid_graphs.canonical`).
+
+There are two tiers:
+- in memory, an LRU of the payloads, evicted by total size in bytes.
+- on disk (optional), a sqlite file, read with memory-mapped I/O.
+  Hits on disk are also put in memory.
+
+A payload packs the CellPath values of 2 cells per byte, as in the binary
+datasets (see `hpgg.io.binary_format`).
+"""
+import hashlib
+import json
+import sqlite3
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+
+from hpgg.grid_graphs.canonical import get_canonical_form
+from hpgg.grid_graphs.cell_grid_graph import CellPathMatrix
+from hpgg.grid_graphs.tile_grid_graphs import TileGridGraph
+from hpgg.io.binary_format import pack_cell_codes, unpack_cell_codes
+
+DEFAULT_MEMORY_SIZE = 64 * 1024 * 1024
+DISK_MMAP_SIZE = 256 * 1024 * 1024
+
+
+def encode_cell_codes(codes: np.ndarray) -> bytes:
+    """
+    Get the payload of an array of CellPath values: its shape (2 uint32)
+    and the values packed by `pack_cell_codes`.
+    """
+    rows, cols = codes.shape
+    return rows.to_bytes(4, "little") + cols.to_bytes(4, "little") + pack_cell_codes(codes).tobytes()
+
+
+def decode_cell_codes(payload: bytes | memoryview) -> np.ndarray:
+    """
+    Get back the array of CellPath values of a payload.
+    """
+    rows = int.from_bytes(payload[0:4], "little")
+    cols = int.from_bytes(payload[4:8], "little")
+    return unpack_cell_codes(np.frombuffer(payload, dtype=np.uint8, offset=8), rows, cols)
+
+
+def get_cache_key(canonical_hash: bytes, algorithm: str, params: dict | None = None) -> str:
+    """
+    Get the key of a solution: a hash of the canonical form, the algorithm
+    and its parameters (which must be JSON-serializable).
+    """
+    description = json.dumps([algorithm, params or {}], sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(canonical_hash + description.encode(), digest_size=16).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class SolutionCache():
+    """
+    Two-tier cache of solutions. Use it as a context manager, or call close,
+    to close the sqlite file.
+    """
+    def __init__(
+        self,
+        path: str | None = None,
+        max_memory_size: int = DEFAULT_MEMORY_SIZE,
+    ):
+        """
+        path is the sqlite file of the disk tier (None for memory only).
+        max_memory_size is the total size in bytes of the payloads kept in memory.
+        """
+        self.max_memory_size = max_memory_size
+        self.memory: OrderedDict[str, bytes] = OrderedDict()
+        self.memory_size = 0
+        self.stats = CacheStats()
+
+        self.connection = None
+        if path is not None:
+            self.connection = sqlite3.connect(path)
+            self.connection.execute(f"PRAGMA mmap_size = {DISK_MMAP_SIZE}")
+            self.connection.execute("PRAGMA journal_mode = WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS solutions (key TEXT PRIMARY KEY, payload BLOB NOT NULL)"
+            )
+            self.connection.commit()
+
+    def __enter__(self) -> "SolutionCache":
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def __len__(self) -> int:
+        """
+        Number of solutions (on disk if there is a disk tier, else in memory).
+        """
+        if self.connection is not None:
+            return self.connection.execute("SELECT COUNT(*) FROM solutions").fetchone()[0]
+        return len(self.memory)
+
+    def __put_in_memory(self, key: str, payload: bytes):
+        if key in self.memory:
+            self.memory_size -= len(self.memory.pop(key))
+        if len(payload) > self.max_memory_size:
+            return
+        self.memory[key] = payload
+        self.memory_size += len(payload)
+        while self.memory_size > self.max_memory_size:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_size -= len(evicted)
+            self.stats.evictions += 1
+
+    def get_payload(self, key: str) -> bytes | None:
+        """
+        Get the payload of a key, or None (and count a miss).
+        """
+        payload = self.memory.get(key)
+        if payload is not None:
+            self.memory.move_to_end(key)
+            self.stats.memory_hits += 1
+            return payload
+        if self.connection is not None:
+            row = self.connection.execute("SELECT payload FROM solutions WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                payload = bytes(row[0])
+                self.__put_in_memory(key, payload)
+                self.stats.disk_hits += 1
+                return payload
+        self.stats.misses += 1
+        return None
+
+    def put_payload(self, key: str, payload: bytes):
+        self.__put_in_memory(key, payload)
+        if self.connection is not None:
+            self.connection.execute("INSERT OR REPLACE INTO solutions VALUES (?, ?)", (key, payload))
+            self.connection.commit()
+        self.stats.stores += 1
+
+    def get(
+        self,
+        tile_grid_graph: TileGridGraph,
+        algorithm: str,
+        params: dict | None = None,
+    ) -> CellPathMatrix | None:
+        """
+        Get the cached solution of a tile grid graph, in its orientation, or None.
+        """
+        form = get_canonical_form(tile_grid_graph)
+        payload = self.get_payload(get_cache_key(form.get_hash(), algorithm, params))
+        if payload is None:
+            return None
+        return form.from_canonical(CellPathMatrix.from_codes(decode_cell_codes(payload)))
+
+    def put(
+        self,
+        tile_grid_graph: TileGridGraph,
+        algorithm: str,
+        cell_path_matrix: CellPathMatrix,
+        params: dict | None = None,
+    ):
+        """
+        Cache the solution of a tile grid graph.
+        """
+        form = get_canonical_form(tile_grid_graph)
+        payload = encode_cell_codes(form.to_canonical(cell_path_matrix).codes)
+        self.put_payload(get_cache_key(form.get_hash(), algorithm, params), payload)
+
+    def get_or_solve(
+        self,
+        tile_grid_graph: TileGridGraph,
+        algorithm: str,
+        solve: Callable[[TileGridGraph], CellPathMatrix],
+        params: dict | None = None,
+    ) -> CellPathMatrix:
+        """
+        Get the cached solution, or solve the instance and cache its solution.
+        """
+        form = get_canonical_form(tile_grid_graph)
+        key = get_cache_key(form.get_hash(), algorithm, params)
+        payload = self.get_payload(key)
+        if payload is not None:
+            return form.from_canonical(CellPathMatrix.from_codes(decode_cell_codes(payload)))
+        cell_path_matrix = solve(tile_grid_graph)
+        self.put_payload(key, encode_cell_codes(form.to_canonical(cell_path_matrix).codes))
+        return cell_path_matrix
+
+
+# Tests
+import unittest
+class TestSolutionCache(unittest.TestCase):
+    def test_encoding(self):
+        """
+        Test that the payloads give back the CellPath values.
+        """
+        rng = np.random.default_rng(0)
+        for rows, cols in ((1, 1), (3, 5), (8, 8)):
+            codes = rng.integers(-1, 7, size=(rows, cols)).astype(np.int8)
+            payload = encode_cell_codes(codes)
+            self.assertEqual(len(payload), 8 + (rows * cols + 1) // 2)
+            self.assertTrue(np.array_equal(decode_cell_codes(payload), codes))
+
+    def test_tiers_and_orientations(self):
+        """
+        Test the hits of both tiers, the eviction, and that a rotated
+        instance gets a valid solution from the cache.
+        """
+        import os
+        import random
+        import tempfile
+        from hpgg.grid_graphs.canonical import transform_tile_grid_graph
+        from hpgg.grid_graphs.cell_grid_graph import CellGridGraph
+        from hpgg.paths.stc_algo import AlgorithmSTC
+        from hpgg.paths.validation import validate_cell_path_matrix
+
+        def solve(tile_grid_graph: TileGridGraph) -> CellPathMatrix:
+            return AlgorithmSTC(CellGridGraph(tile_grid_graph))
+
+        random.seed(0)
+        grid = TileGridGraph(5, 7)
+        grid.add_holes(4, keep_connected=True)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cache.sqlite")
+            with SolutionCache(path) as cache:
+                self.assertIsNone(cache.get(grid, "stc"))
+                cache.get_or_solve(grid, "stc", solve)
+                for transform in range(8):
+                    oriented = transform_tile_grid_graph(grid, transform)
+                    cell_path_matrix = cache.get_or_solve(oriented, "stc", solve)
+                    report = validate_cell_path_matrix(cell_path_matrix, CellGridGraph(oriented))
+                    self.assertTrue(report.is_valid, report.get_message())
+                self.assertIsNone(cache.get(grid, "stc", {"seed": 1}))
+                self.assertEqual(cache.stats.memory_hits, 8)
+                self.assertEqual(cache.stats.misses, 3)
+                self.assertEqual(cache.stats.stores, 1)
+
+            # a new session only has the disk tier
+            with SolutionCache(path, max_memory_size=10) as cache:
+                self.assertEqual(len(cache), 1)
+                self.assertIsNotNone(cache.get(grid, "stc"))
+                self.assertEqual(cache.stats.disk_hits, 1)
+                # the payload is larger than the memory tier
+                self.assertEqual(len(cache.memory), 0)
+
+        cache = SolutionCache(max_memory_size=300)
+        for size in range(2, 8):
+            cache.get_or_solve(TileGridGraph(size, size), "stc", solve)
+        self.assertLessEqual(cache.memory_size, 300)
+        self.assertGreater(cache.stats.evictions, 0)
+        self.assertIsNotNone(cache.get(TileGridGraph(7, 7), "stc"))
+        self.assertIsNone(cache.get(TileGridGraph(2, 2), "stc"))
@@ -0,0 +1,316 @@
+"""
+Command line of hpgg, for batches of short jobs.
+
+    python -m hpgg solve [FILE ...] [-a stc] [--format jsonl|binary] [-o OUTPUT] [--workers N]
+    python -m hpgg generate N M -N COUNT ...   (see `hpgg.generation`)
+
+`solve` streams the grids of text files (see `hpgg.io.text_format`), or of
+stdin, and writes a solution per grid, in the order of the input:
+- jsonl: {"index", "n", "m", "cells"}, where cells is a string per row of
+  cells, with the character of the CellPath value + 1 ('0' for NO_CELL).
+  A grid that cannot be parsed or solved gives {"index", "error"}.
+- binary: a binary dataset of the grids and their CellPathMatrix (see
+  `hpgg.io.binary_format`). A grid that cannot be solved is skipped.
+The start-up time (imports and setup) and the throughput are reported on stderr.
+
+Only the modules of the command are imported, when it runs: the solvers
+need numpy, never networkx.
+"""
+import argparse
+import sys
+import time
+
+ALGORITHMS = ("stc", "random-stc")
+FORMATS = ("jsonl", "binary")
+# grids per task sent to a worker
+CHUNK_SIZE = 64
+# tasks in flight per worker, so that the input is read as a stream
+TASKS_PER_WORKER = 4
+
+
+def solve_masks(algorithm: str, seed: int, tasks: list[tuple]) -> list[tuple]:
+    """
+    Solve the grids (index, n, m, bit-packed mask, parse error or None) of a task.
+    Returns (index, n, m, packed mask, cell codes or None, error or None) per grid.
+    """
+    from hpgg.grid_graphs.cell_grid_graph import CellGridGraph
+    from hpgg.grid_graphs.tile_grid_graphs import TileGridGraph
+    from hpgg.paths.stc_algo import AlgorithmRandomSTC, AlgorithmSTC
+
+    results = []
+    for index, n, m, packed, error in tasks:
+        if error is not None:
+            results.append((index, n, m, packed, None, error))
+            continue
+        grid = TileGridGraph.from_packed(packed, n, m, check_connected=False)
+        try:
+            if not grid.check_connected_graph():
+                raise Exception("The graph is not connected.")
+            cell_grid_graph = CellGridGraph(grid)
+            if algorithm == "stc":
+                cell_path_matrix = AlgorithmSTC(cell_grid_graph)
+            else:
+                cell_path_matrix = AlgorithmRandomSTC(cell_grid_graph, 1, (seed, index))[0]
+            results.append((index, n, m, packed, cell_path_matrix.codes, None))
+        except Exception as error:
+            results.append((index, n, m, packed, None, str(error) or type(error).__name__))
+    return results
+
+
+def _iter_tasks(sources: list[str]):
+    """
+    Stream the grids of the sources as chunks of (index, n, m, packed mask, None),
+    or (index, 0, 0, None, error) for a grid that cannot be parsed.
+    """
+    import numpy as np
+    from hpgg.io.text_format import iter_grid_lines, parse_tile_mask
+
+    chunk = []
+    index = 0
+    for source in sources:
+        stream = sys.stdin.buffer if source == "-" else source
+        for lines, first_line_number, name in iter_grid_lines(stream):
+            try:
+                mask = parse_tile_mask(lines, first_line_number, name)
+                chunk.append((index, *mask.shape, np.packbits(mask, axis=None).tobytes(), None))
+            except Exception as error:
+                chunk.append((index, 0, 0, None, str(error)))
+            index += 1
+            if len(chunk) == CHUNK_SIZE:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def _iter_results(algorithm: str, seed: int, sources: list[str], nb_workers: int):
+    """
+    Solve the grids of the sources, with nb_workers processes (in this process
+    for 1), and yield the results in the order of the input.
+    """
+    tasks = _iter_tasks(sources)
+    if nb_workers == 1:
+        for task in tasks:
+            yield from solve_masks(algorithm, seed, task)
+        return
+
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(nb_workers) as pool:
+        # a bounded window of tasks, so the input is not read ahead
+        window = deque()
+        for task in tasks:
+            window.append(pool.submit(solve_masks, algorithm, seed, task))
+            if len(window) >= nb_workers * TASKS_PER_WORKER:
+                yield from window.popleft().result()
+        while window:
+            yield from window.popleft().result()
+
+
+def _format_cells(codes) -> list[str]:
+    import numpy as np
+
+    characters = (codes + np.int8(ord("1"))).view(np.uint8)
+    return [row.tobytes().decode() for row in characters]
+
+
+def solve(args: argparse.Namespace) -> int:
+    import json
+    import os
+
+    if args.format == "binary" and args.output is None:
+        print("The binary format needs an output file (-o).", file=sys.stderr)
+        return 2
+    # the missing files are reported before any output is written
+    for source in args.files:
+        if source != "-" and not os.path.isfile(source):
+            print(f"{source}: no such file.", file=sys.stderr)
+            return 2
+    nb_workers = args.workers or os.cpu_count() or 1
+
+    writer = None
+    output = sys.stdout
+    if args.format == "binary":
+        from hpgg.grid_graphs.cell_grid_graph import CellPathMatrix
+        from hpgg.grid_graphs.tile_grid_graphs import TileGridGraph
+        from hpgg.io.binary_format import BinaryDatasetWriter
+        writer = BinaryDatasetWriter(args.output)
+    elif args.output is not None:
+        output = open(args.output, "w", buffering=1 << 20)
+
+    nb_solved = nb_failed = 0
+    first_time = None
+    try:
+        for index, n, m, packed, codes, error in _iter_results(args.algorithm, args.seed, args.files, nb_workers):
+            if first_time is None:
+                first_time = time.perf_counter()
+            if error is not None:
+                nb_failed += 1
+                if writer is None:
+                    output.write(json.dumps({"index": index, "error": error}) + "\n")
+                continue
+            nb_solved += 1
+            if writer is not None:
+                grid = TileGridGraph.from_packed(packed, n, m, check_connected=False)
+                writer.append(grid, CellPathMatrix.from_codes(codes))
+            else:
+                output.write(json.dumps({"index": index, "n": n, "m": m, "cells": _format_cells(codes)}) + "\n")
+    except OSError as error:
+        print(f"{error.filename}: {error.strerror}.", file=sys.stderr)
+        return 2
+    finally:
+        if writer is not None:
+            writer.close()
+        elif output is not sys.stdout:
+            output.close()
+        else:
+            output.flush()
+
+    if not args.quiet:
+        end_time = time.perf_counter()
+        print(f"start-up {1e3 * (args.ready_time - args.start_time):.1f}ms (imports and setup)", file=sys.stderr)
+        nb_instances = nb_solved + nb_failed
+        if nb_instances:
+            elapsed_time = end_time - args.ready_time
+            print(
+                f"{nb_instances} instances in {elapsed_time:.3f}s "
+                f"({nb_instances / elapsed_time:.0f} instances/s, first result after "
+                f"{1e3 * (first_time - args.ready_time):.1f}ms, {nb_workers} workers), "
+                f"{nb_failed} failed",
+                file=sys.stderr,
+            )
+    return 1 if nb_failed else 0
+
+
+def _nb_workers(text: str) -> int:
+    nb_workers = int(text)
+    if nb_workers < 0:
+        raise argparse.ArgumentTypeError(f"{nb_workers} workers, expected 0 or more.")
+    return nb_workers
+
+
+def main(argv: list[str] | None = None, start_time: float | None = None) -> int:
+    """
+    Run a command. start_time is the time (time.perf_counter) the process started
+    loading hpgg, for the start-up report.
+    """
+    start_time = time.perf_counter() if start_time is None else start_time
+    parser = argparse.ArgumentParser(prog="hpgg", description="Hamiltonian paths in grid graphs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    solve_parser = commands.add_parser("solve", help="solve a stream of grids")
+    solve_parser.add_argument("files", nargs="*", default=["-"], help="text files of grids ('-' for stdin)")
+    solve_parser.add_argument("-a", "--algorithm", choices=ALGORITHMS, default="stc")
+    solve_parser.add_argument("--seed", type=int, default=0, help="seed of random-stc")
+    solve_parser.add_argument("--format", choices=FORMATS, default="jsonl")
+    solve_parser.add_argument("-o", "--output", default=None, help="output file (by default, stdout)")
+    solve_parser.add_argument("--workers", type=_nb_workers, default=1, help="processes (0 for one per CPU)")
+    solve_parser.add_argument("-q", "--quiet", action="store_true", help="do not report the times")
+
+    commands.add_parser("generate", help="generate random grids (see hpgg.generation)", add_help=False)
+
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["generate"]:
+        from hpgg.generation import main as generate
+        generate(argv[1:])
+        return 0
+
+    args = parser.parse_args(argv)
+    args.start_time = start_time
+    if args.command == "solve":
+        # the core modules are loaded before the first grid is read
+        import hpgg.io.text_format
+        import hpgg.paths.stc_algo
+        args.ready_time = time.perf_counter()
+        return solve(args)
+    return 0
+
+
+# Tests
+import unittest
+class TestCLI(unittest.TestCase):
+    def test_solve_jsonl_and_binary(self):
+        """
+        Test that the solutions of a stream of grids are valid, in the input
+        order, with and without workers.
+        """
+        import io
+        import json
+        import os
+        import tempfile
+        import numpy as np
+        from hpgg.grid_graphs.cell_grid_graph import CellGridGraph, CellPathMatrix
+        from hpgg.grid_graphs.tile_grid_graphs import tile_grid_graph_from_text
+        from hpgg.io.binary_format import BinaryDataset
+        from hpgg.paths.validation import validate_cell_path_matrix
+
+        text = "x x x\nx . x\nx x x\n\nx .\n. x\n\n" + "x x\nx x\n\n" * 70
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "grids.txt")
+            with open(path, "w") as file:
+                file.write(text)
+
+            for workers in ("1", "2"):
+                output = os.path.join(directory, f"solutions-{workers}.jsonl")
+                status = main(["solve", path, "-o", output, "--workers", workers, "-q"])
+                self.assertEqual(status, 1)
+                with open(output) as file:
+                    lines = [json.loads(line) for line in file]
+                self.assertEqual([line["index"] for line in lines], list(range(72)))
+                self.assertIn("error", lines[1])
+                codes = np.array([[ord(c) - ord("1") for c in row] for row in lines[0]["cells"]], dtype=np.int8)
+                grid = tile_grid_graph_from_text("x x x\nx . x\nx x x")
+                report = validate_cell_path_matrix(CellPathMatrix.from_codes(codes), CellGridGraph(grid))
+                self.assertTrue(report.is_valid, report.get_message())
+
+            output = os.path.join(directory, "solutions.bin")
+            main(["solve", path, "--format", "binary", "-o", output, "-a", "random-stc", "-q"])
+            dataset = BinaryDataset(output)
+            self.assertEqual(len(dataset), 71)
+            for grid, cell_path_matrix in dataset:
+                report = validate_cell_path_matrix(cell_path_matrix, CellGridGraph(grid))
+                self.assertTrue(report.is_valid, report.get_message())
+
+        stdin = sys.stdin
+        stdout = sys.stdout
+        sys.stdin = io.TextIOWrapper(io.BytesIO(b"x x\nx x\n"))
+        sys.stdout = io.StringIO()
+        try:
+            self.assertEqual(main(["solve", "-q"]), 0)
+            self.assertEqual(json.loads(sys.stdout.getvalue())["n"], 2)
+        finally:
+            sys.stdin = stdin
+            sys.stdout = stdout
+
+    def test_errors(self):
+        """
+        Test that a malformed grid gives an error record without stopping the
+        stream, and that a missing file or negative workers are rejected.
+        """
+        import contextlib
+        import io
+        import json
+        import os
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "grids.txt")
+            with open(path, "w") as file:
+                file.write("x x\nx o\n\nx x\nx x\n")
+            output = os.path.join(directory, "solutions.jsonl")
+            for workers in ("1", "2"):
+                self.assertEqual(main(["solve", path, "-o", output, "--workers", workers, "-q"]), 1)
+                with open(output) as file:
+                    lines = [json.loads(line) for line in file]
+                self.assertEqual([line["index"] for line in lines], [0, 1])
+                self.assertIn(":2:3: unexpected character 'o'", lines[0]["error"])
+                self.assertEqual(lines[1]["n"], 2)
+
+            stderr = io.StringIO()
+            with contextlib.redirect_stderr(stderr):
+                missing = os.path.join(directory, "missing.txt")
+                self.assertEqual(main(["solve", path, missing, "-o", output, "-q"]), 2)
+                self.assertIn("missing.txt: no such file", stderr.getvalue())
+                with self.assertRaises(SystemExit):
+                    main(["solve", path, "--workers", "-1"])
@@ -0,0 +1,269 @@
+"""
+Generation of batches of random connected tile grid graphs, on a process pool.
+
+Each instance k draws its holes with its own random.Random, seeded from
+(seed, k), so a batch is the same for any number of workers and chunks.
+A drawn grid that is not connected is rejected and drawn again, from the
+same generator.
+
+The instances are generated by chunks, sent back as bit-packed tile masks,
+and given to a sink (a callable) in the order of their indices, or as soon
+as their chunk is done.
+
+Usage:
+    python -m hpgg.generation 12 16 -N 10000 --periphery-holes 8 --holes 4 -o grids.bin
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Callable, Iterator
+
+import numpy as np
+
+from hpgg.grid_graphs.tile_grid_graphs import NotConnectedException, TileGridGraph
+
+# number of chunks per worker, so that faster chunks balance slower ones
+CHUNKS_PER_WORKER = 4
+MAX_CHUNK_SIZE = 256
+
+
+@dataclass
+class GenerationParams:
+    n: int
+    m: int
+    nb_periphery_holes: int = 5
+    nb_holes: int = 3
+    narrow: bool = False
+    # only remove tiles that keep the graph connected (fewer rejections)
+    keep_connected: bool = True
+    # attempts per instance before giving up
+    max_attempts: int = 1000
+
+
+@dataclass
+class GeneratedInstance:
+    index: int
+    seed: int
+    nb_attempts: int
+    packed: np.ndarray
+    n: int
+    m: int
+
+    def get_tile_grid_graph(self) -> TileGridGraph:
+        return TileGridGraph.from_packed(self.packed, self.n, self.m, check_connected=False)
+
+
+@dataclass
+class GenerationStats:
+    nb_instances: int = 0
+    nb_attempts: int = 0
+    elapsed_time: float = 0.0
+
+    @property
+    def nb_rejections(self) -> int:
+        return self.nb_attempts - self.nb_instances
+
+    @property
+    def rejection_rate(self) -> float:
+        return self.nb_rejections / self.nb_attempts if self.nb_attempts else 0.0
+
+    @property
+    def instances_per_second(self) -> float:
+        return self.nb_instances / self.elapsed_time if self.elapsed_time > 0 else 0.0
+
+    def get_message(self) -> str:
+        return (
+            f"{self.nb_instances} instances in {self.elapsed_time:.2f}s "
+            f"({self.instances_per_second:.0f} instances/s), "
+            f"{self.nb_rejections} rejections ({100 * self.rejection_rate:.1f}% of attempts)"
+        )
+
+
+def get_instance_seed(seed: int, index: int) -> int:
+    """
+    Get the seed of the instance index of a batch.
+    """
+    return int(np.random.SeedSequence([seed, index]).generate_state(1, np.uint64)[0])
+
+
+def generate_tile_grid_graph(params: GenerationParams, rng: random.Random) -> tuple[TileGridGraph, int]:
+    """
+    Draw grids until one is connected.
+    Returns it and the number of attempts.
+    Raises an Exception after params.max_attempts attempts.
+    """
+    for attempt in range(1, params.max_attempts + 1):
+        grid = TileGridGraph(params.n, params.m)
+        try:
+            grid.add_periphery_holes(params.nb_periphery_holes, params.keep_connected, rng)
+            grid.add_holes(params.nb_holes, params.keep_connected, rng)
+            if params.narrow:
+                grid.make_narrow()
+        except NotConnectedException:
+            # a hole without keep_connected, or make_narrow, cut the grid
+            continue
+        if grid.check_connected_graph():
+            return grid, attempt
+    raise Exception(f"No connected grid after {params.max_attempts} attempts.")
+
+
+def _generate_chunk(task: tuple) -> list[GeneratedInstance]:
+    params, seed, start, end = task
+    instances = []
+    for index in range(start, end):
+        instance_seed = get_instance_seed(seed, index)
+        grid, nb_attempts = generate_tile_grid_graph(params, random.Random(instance_seed))
+        instances.append(GeneratedInstance(index, instance_seed, nb_attempts, grid.to_packed(), grid.n, grid.m))
+    return instances
+
+
+def generate_instances(
+    params: GenerationParams,
+    nb_instances: int,
+    seed: int = 0,
+    nb_workers: int | None = None,
+    ordered: bool = True,
+    chunk_size: int | None = None,
+) -> Iterator[GeneratedInstance]:
+    """
+    Generate nb_instances instances with nb_workers processes (by default,
+    one per CPU). With a single worker, they are generated in this process.
+    With ordered, the instances are yielded by increasing index.
+    """
+    nb_workers = nb_workers or os.cpu_count() or 1
+    if chunk_size is None:
+        chunk_size = math.ceil(nb_instances / (nb_workers * CHUNKS_PER_WORKER))
+        chunk_size = max(1, min(chunk_size, MAX_CHUNK_SIZE))
+    tasks = [
+        (params, seed, start, min(start + chunk_size, nb_instances))
+        for start in range(0, nb_instances, chunk_size)
+    ]
+
+    if nb_workers == 1:
+        for task in tasks:
+            yield from _generate_chunk(task)
+        return
+
+    with ProcessPoolExecutor(nb_workers) as pool:
+        if ordered:
+            for chunk in pool.map(_generate_chunk, tasks):
+                yield from chunk
+        else:
+            futures = [pool.submit(_generate_chunk, task) for task in tasks]
+            for future in as_completed(futures):
+                yield from future.result()
+
+
+def generate_batch(
+    params: GenerationParams,
+    nb_instances: int,
+    sink: Callable[[GeneratedInstance], None],
+    seed: int = 0,
+    nb_workers: int | None = None,
+    ordered: bool = True,
+    chunk_size: int | None = None,
+) -> GenerationStats:
+    """
+    Generate nb_instances instances (see `generate_instances`), give each to sink,
+    and return the number of instances and attempts, and the time taken.
+    """
+    stats = GenerationStats()
+    start_time = time.perf_counter()
+    for instance in generate_instances(params, nb_instances, seed, nb_workers, ordered, chunk_size):
+        sink(instance)
+        stats.nb_instances += 1
+        stats.nb_attempts += instance.nb_attempts
+    stats.elapsed_time = time.perf_counter() - start_time
+    return stats
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Generate random connected tile grid graphs.")
+    parser.add_argument("n", type=int, help="number of tile rows")
+    parser.add_argument("m", type=int, help="number of tile columns")
+    parser.add_argument("-N", "--nb-instances", type=int, default=1)
+    parser.add_argument("--periphery-holes", type=int, default=5)
+    parser.add_argument("--holes", type=int, default=3)
+    parser.add_argument("--narrow", action="store_true")
+    parser.add_argument("--allow-disconnecting", action="store_true",
+                        help="remove any tile, and reject the disconnected grids")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--unordered", action="store_true")
+    parser.add_argument("-o", "--output", default=None,
+                        help="binary dataset to append to (by default, print the grids)")
+    args = parser.parse_args(argv)
+
+    params = GenerationParams(
+        args.n, args.m, args.periphery_holes, args.holes, args.narrow,
+        keep_connected=not args.allow_disconnecting,
+    )
+
+    if args.output is None:
+        def sink(instance: GeneratedInstance):
+            print(f"# instance {instance.index} (seed {instance.seed})")
+            instance.get_tile_grid_graph().print()
+            print()
+        stats = generate_batch(params, args.nb_instances, sink, args.seed, args.workers, not args.unordered)
+    else:
+        from hpgg.io.binary_format import BinaryDatasetWriter
+        with BinaryDatasetWriter(args.output) as writer:
+            def sink(instance: GeneratedInstance):
+                writer.append(instance.get_tile_grid_graph())
+            stats = generate_batch(params, args.nb_instances, sink, args.seed, args.workers, not args.unordered)
+    print(stats.get_message(), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
+
+
+# Tests
+import unittest
+class TestGeneration(unittest.TestCase):
+    def test_reproducible_batches(self):
+        """
+        Test that a batch does not depend on the workers, chunks and order,
+        and that all its grids are connected.
+        """
+        params = GenerationParams(6, 7, nb_periphery_holes=6, nb_holes=3)
+        reference = list(generate_instances(params, 12, seed=3, nb_workers=1))
+        self.assertEqual([instance.index for instance in reference], list(range(12)))
+        for instance in reference:
+            self.assertTrue(instance.get_tile_grid_graph().check_connected_graph())
+
+        for nb_workers, ordered, chunk_size in ((1, True, 5), (2, True, 2), (2, False, 3)):
+            instances = list(generate_instances(params, 12, 3, nb_workers, ordered, chunk_size))
+            instances.sort(key=lambda instance: instance.index)
+            for instance, expected in zip(instances, reference):
+                self.assertTrue(np.array_equal(instance.packed, expected.packed))
+
+        other = list(generate_instances(params, 12, seed=4, nb_workers=1))
+        self.assertFalse(all(
+            np.array_equal(a.packed, b.packed) for a, b in zip(reference, other)
+        ))
+
+    def test_rejections(self):
+        """
+        Test that the disconnected grids are rejected and counted.
+        """
+        params = GenerationParams(5, 5, nb_periphery_holes=4, nb_holes=6, keep_connected=False)
+        grids = []
+        stats = generate_batch(params, 30, grids.append, seed=0, nb_workers=1)
+        self.assertEqual(stats.nb_instances, 30)
+        self.assertGreater(stats.nb_rejections, 0)
+        for instance in grids:
+            self.assertTrue(instance.get_tile_grid_graph().check_connected_graph())
+
+    def test_errors_are_not_retried(self):
+        """
+        Test that an error other than a disconnected grid is raised at once.
+        """
+        params = GenerationParams(5, 5, nb_holes=None)
+        with self.assertRaises(TypeError):
+            list(generate_instances(params, 1, nb_workers=1))
@@ -0,0 +1,241 @@
+"""
+Connectivity-preserving hole insertion.
+
+A tile can be removed without disconnecting the grid graph iff it is
+not an articulation point. Two levels are used to know which tiles are safe:
+- a local test on the 8 tiles around a tile (the ring): if all its existing
+  neighbours are connected through the ring, any path going through the tile
+  can be rerouted around it. This is updated in O(1) after each hole.
+- the articulation points of the whole graph (Tarjan), recomputed only
+  when no tile passes the local test anymore.
+"""
+import random
+
+import numpy as np
+
+from hpgg.grid_graphs.periphery import IndexedTileSet
+
+
+def articulation_points(mask: np.ndarray) -> np.ndarray:
+    """
+    Get a boolean mask of the articulation points of the 4-connected grid graph
+    defined by a 2D boolean mask. Uses an iterative version of Tarjan's algorithm.
+    """
+    n, m = mask.shape
+    exists = np.asarray(mask, dtype=bool).ravel().tolist()
+    nb_tiles = n * m
+    discovery = [0] * nb_tiles
+    low = [0] * nb_tiles
+    is_articulation = bytearray(nb_tiles)
+    timer = 1
+
+    for start in range(nb_tiles):
+        if not exists[start] or discovery[start]:
+            continue
+        discovery[start] = low[start] = timer
+        timer += 1
+        root_children = 0
+
+        # explicit DFS stack: node, parent, next direction to explore
+        nodes = [start]
+        parents = [-1]
+        directions = [0]
+        while nodes:
+            v = nodes[-1]
+            k = directions[-1]
+            if k == 4:
+                nodes.pop()
+                directions.pop()
+                p = parents.pop()
+                if p < 0:
+                    continue
+                if low[v] < low[p]:
+                    low[p] = low[v]
+                if p == start:
+                    root_children += 1
+                elif low[v] >= discovery[p]:
+                    is_articulation[p] = 1
+                continue
+            directions[-1] = k + 1
+
+            i, j = divmod(v, m)
+            if k == 0:
+                w = v - m if i > 0 else -1
+            elif k == 1:
+                w = v + 1 if j < m - 1 else -1
+            elif k == 2:
+                w = v + m if i < n - 1 else -1
+            else:
+                w = v - 1 if j > 0 else -1
+            if w < 0 or not exists[w]:
+                continue
+
+            if not discovery[w]:
+                discovery[w] = low[w] = timer
+                timer += 1
+                nodes.append(w)
+                parents.append(v)
+                directions.append(0)
+            elif w != parents[-1] and discovery[w] < low[v]:
+                low[v] = discovery[w]
+
+        if root_children > 1:
+            is_articulation[start] = 1
+
+    return np.frombuffer(bytes(is_articulation), dtype=bool).reshape(n, m)
+
+
+def locally_simple_mask(mask: np.ndarray) -> np.ndarray:
+    """
+    Vectorized local test: True for the tiles whose existing neighbours
+    (at least one) are all connected through the 8 tiles around them.
+    Removing such a tile never disconnects the graph.
+    """
+    mask = np.asarray(mask, dtype=bool)
+    padded = np.pad(mask, 1)
+    n, m = mask.shape
+
+    def shifted(dx: int, dy: int) -> np.ndarray:
+        return padded[1 + dx:1 + dx + n, 1 + dy:1 + dy + m]
+
+    north, east, south, west = shifted(-1, 0), shifted(0, 1), shifted(1, 0), shifted(0, -1)
+    north_east, south_east = shifted(-1, 1), shifted(1, 1)
+    south_west, north_west = shifted(1, -1), shifted(-1, -1)
+
+    nb_neighbours = (
+        north.astype(np.int8) + east + south + west
+    )
+    nb_links = (
+        (north & north_east & east).astype(np.int8)
+        + (east & south_east & south)
+        + (south & south_west & west)
+        + (west & north_west & north)
+    )
+    nb_groups = np.maximum(nb_neighbours - nb_links, 1)
+    return mask & (nb_neighbours > 0) & (nb_groups == 1)
+
+
+def is_locally_simple(tile_exists: np.ndarray, i: int, j: int) -> bool:
+    """
+    Scalar version of `locally_simple_mask`, for a single existing tile.
+    """
+    n, m = tile_exists.shape
+
+    def exists(x: int, y: int) -> bool:
+        return 0 <= x < n and 0 <= y < m and bool(tile_exists[x, y])
+
+    north, east, south, west = exists(i-1, j), exists(i, j+1), exists(i+1, j), exists(i, j-1)
+    nb_neighbours = north + east + south + west
+    if nb_neighbours == 0:
+        return False
+    nb_links = (
+        (north and east and exists(i-1, j+1))
+        + (east and south and exists(i+1, j+1))
+        + (south and west and exists(i+1, j-1))
+        + (west and north and exists(i-1, j-1))
+    )
+    return max(nb_neighbours - nb_links, 1) == 1
+
+
+class HoleCarver():
+    """
+    Add holes to a tile grid graph, one at a time, without ever disconnecting it.
+
+    The region restricts where holes can be added:
+    - "periphery": tiles on the border or adjacent to a hole.
+    - "inner": tiles whose 4 neighbours exist.
+    - "any": all tiles.
+
+    Candidate tiles (existing, in the region, and locally simple) are kept in an
+    indexed set, updated around each new hole. When the set is empty, the
+    articulation points of the whole graph are recomputed to find the remaining
+    removable tiles.
+    """
+    REGIONS = ("periphery", "inner", "any")
+
+    def __init__(
+        self,
+        tile_grid_graph,
+        region: str = "any",
+        rng: random.Random | None = None,
+    ):
+        if region not in self.REGIONS:
+            raise Exception(f"Unknown region '{region}', expected one of {self.REGIONS}.")
+        self.tile_grid_graph = tile_grid_graph
+        self.region = region
+        self.rng = rng
+
+        tile_exists = tile_grid_graph.tile_exists
+        candidates = locally_simple_mask(tile_exists) & self.__region_mask()
+        self.candidates = IndexedTileSet(np.flatnonzero(candidates).tolist())
+
+    def __region_mask(self) -> np.ndarray:
+        if self.region == "periphery":
+            return self.tile_grid_graph.get_periphery_mask()
+        if self.region == "inner":
+            return self.tile_grid_graph.get_inner_mask()
+        return np.ones((self.tile_grid_graph.n, self.tile_grid_graph.m), dtype=bool)
+
+    def __in_region(self, i: int, j: int) -> bool:
+        if self.region == "any":
+            return True
+        n, m = self.tile_grid_graph.n, self.tile_grid_graph.m
+        tile_exists = self.tile_grid_graph.tile_exists
+        is_inner = (
+            0 < i < n - 1 and 0 < j < m - 1
+            and tile_exists[i-1, j] and tile_exists[i+1, j]
+            and tile_exists[i, j-1] and tile_exists[i, j+1]
+        )
+        return not is_inner if self.region == "periphery" else bool(is_inner)
+
+    def __update_candidate(self, index: int):
+        i, j = divmod(index, self.tile_grid_graph.m)
+        tile_exists = self.tile_grid_graph.tile_exists
+        if (
+            tile_exists[i, j]
+            and self.__in_region(i, j)
+            and is_locally_simple(tile_exists, i, j)
+        ):
+            self.candidates.add(index)
+        else:
+            self.candidates.discard(index)
+
+    def __global_candidates(self) -> np.ndarray:
+        tile_exists = self.tile_grid_graph.tile_exists
+        if np.count_nonzero(tile_exists) <= 1:
+            return np.zeros(0, dtype=np.int64)
+        removable = tile_exists & ~articulation_points(tile_exists) & self.__region_mask()
+        return np.flatnonzero(removable)
+
+    def remove_tile(self, index: int):
+        """
+        Remove a tile (flat index) and update the candidates around it.
+        The tile must be removable.
+        """
+        n, m = self.tile_grid_graph.n, self.tile_grid_graph.m
+        self.tile_grid_graph.tile_exists.flat[index] = False
+        self.candidates.discard(index)
+
+        i, j = divmod(index, m)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                if (dx or dy) and 0 <= i + dx < n and 0 <= j + dy < m:
+                    self.__update_candidate(index + dx * m + dy)
+
+    def add_holes(self, nb_holes: int) -> int:
+        """
+        Add up to nb_holes holes, keeping the graph connected.
+        Returns the number of holes added, which is smaller than nb_holes
+        only if no tile of the region can be removed anymore.
+        """
+        randrange = self.rng.randrange if self.rng is not None else random.randrange
+        for k in range(nb_holes):
+            if len(self.candidates) > 0:
+                index = self.candidates.sample(self.rng)
+            else:
+                removable = self.__global_candidates()
+                if len(removable) == 0:
+                    return k
+                index = int(removable[randrange(len(removable))])
+            self.remove_tile(index)
+        return nb_holes
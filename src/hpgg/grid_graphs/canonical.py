@@ -0,0 +1,309 @@
+"""
+Canonical form of tile grid graphs, up to rotations and reflections.
+
+The 8 transforms of the dihedral group D4 are numbered 0 to 7: transform t
+transposes the array if t & 4, then rotates it t & 3 quarter turns
+counterclockwise (`np.rot90`). The canonical form is the smallest of the 8
+transformed tile masks, compared by shape (rows, cols) first, then by
+their bit-packed bytes. It is hashed with a 128-bit BLAKE2b digest.
+
+The CellPath values follow the transforms with a lookup table, so a path
+found on the canonical form maps back to any orientation of the instance.
+Batches of masks of the same shape are canonicalized with whole-array
+operations, which is what makes deduplicating large datasets fast.
+"""
+import hashlib
+from dataclasses import dataclass
+
+import numpy as np
+
+from hpgg.grid_graphs.cell_grid_graph import CELL_PATH_SIDES, SIDES_TO_CELL_PATH, CellPath, CellPathMatrix
+from hpgg.grid_graphs.tile_grid_graphs import EAST, NORTH, SOUTH, WEST, TileGridGraph
+
+NB_TRANSFORMS = 8
+IDENTITY = 0
+
+
+def transform_array(array: np.ndarray, transform: int) -> np.ndarray:
+    """
+    Apply a transform to the last 2 axes of an array (a view when possible).
+    """
+    if transform & 4:
+        array = np.swapaxes(array, -1, -2)
+    return np.rot90(array, transform & 3, axes=(-2, -1))
+
+
+def _get_composition_table() -> np.ndarray:
+    probe = np.arange(6).reshape(2, 3)
+    results = [transform_array(probe, transform) for transform in range(NB_TRANSFORMS)]
+    table = np.zeros((NB_TRANSFORMS, NB_TRANSFORMS), dtype=np.int64)
+    for first in range(NB_TRANSFORMS):
+        for second in range(NB_TRANSFORMS):
+            composed = transform_array(results[first], second)
+            table[first, second] = next(
+                transform for transform, result in enumerate(results)
+                if result.shape == composed.shape and np.array_equal(result, composed)
+            )
+    return table
+
+
+# COMPOSITION[first, second] is the transform of applying first, then second
+COMPOSITION = _get_composition_table()
+INVERSE = np.array([int(np.flatnonzero(COMPOSITION[transform] == IDENTITY)[0]) for transform in range(NB_TRANSFORMS)])
+
+
+def compose_transforms(first: int, second: int) -> int:
+    return int(COMPOSITION[first, second])
+
+
+def invert_transform(transform: int) -> int:
+    return int(INVERSE[transform])
+
+
+def _transform_sides(sides: int, transform: int) -> int:
+    # transposing swaps north and west, south and east
+    # a counterclockwise quarter turn sends east to north, north to west, ...
+    transpose = {NORTH: WEST, WEST: NORTH, SOUTH: EAST, EAST: SOUTH}
+    quarter_turn = {EAST: NORTH, NORTH: WEST, WEST: SOUTH, SOUTH: EAST}
+    directions = [direction for direction in (NORTH, EAST, SOUTH, WEST) if sides & direction]
+    if transform & 4:
+        directions = [transpose[direction] for direction in directions]
+    for _ in range(transform & 3):
+        directions = [quarter_turn[direction] for direction in directions]
+    return sum(directions)
+
+
+# CELL_PATH_TRANSFORMS[transform, value + 1] is the transformed CellPath value
+CELL_PATH_TRANSFORMS = np.array([
+    [
+        SIDES_TO_CELL_PATH[_transform_sides(int(sides), transform)].value if sides else value
+        for value, sides in zip(range(-1, len(CellPath) - 1), CELL_PATH_SIDES)
+    ]
+    for transform in range(NB_TRANSFORMS)
+], dtype=np.int8)
+
+
+def transform_cell_codes(codes: np.ndarray, transform: int) -> np.ndarray:
+    """
+    Transform an array of CellPath values: the cells move, and their
+    paths turn with them.
+    """
+    return CELL_PATH_TRANSFORMS[transform][transform_array(codes, transform).astype(np.intp) + 1]
+
+
+def transform_cell_path_matrix(cell_path_matrix: CellPathMatrix, transform: int) -> CellPathMatrix:
+    return CellPathMatrix.from_codes(transform_cell_codes(cell_path_matrix.codes, transform))
+
+
+def transform_tile_grid_graph(tile_grid_graph: TileGridGraph, transform: int) -> TileGridGraph:
+    return TileGridGraph.from_mask(transform_array(tile_grid_graph.tile_exists, transform), check_connected=False)
+
+
+def hash_packed(rows: int, cols: int, packed: bytes) -> bytes:
+    """
+    Stable 128-bit hash of a bit-packed tile mask and its shape.
+    """
+    return _hash_header(rows, cols, packed).digest()
+
+
+def _hash_header(rows: int, cols: int, packed: bytes = b""):
+    header = rows.to_bytes(4, "little") + cols.to_bytes(4, "little")
+    return hashlib.blake2b(header + packed, digest_size=16)
+
+
+@dataclass
+class CanonicalForm:
+    """
+    The canonical tile mask of an instance, bit-packed, and the transform
+    from the instance to it.
+    """
+    rows: int
+    cols: int
+    packed: bytes
+    transform: int
+
+    def get_hash(self) -> bytes:
+        return hash_packed(self.rows, self.cols, self.packed)
+
+    def get_tile_grid_graph(self) -> TileGridGraph:
+        return TileGridGraph.from_packed(self.packed, self.rows, self.cols, check_connected=False)
+
+    def to_canonical(self, cell_path_matrix: CellPathMatrix) -> CellPathMatrix:
+        """
+        Map a path of the instance to the canonical form.
+        """
+        return transform_cell_path_matrix(cell_path_matrix, self.transform)
+
+    def from_canonical(self, cell_path_matrix: CellPathMatrix) -> CellPathMatrix:
+        """
+        Map a path of the canonical form back to the instance.
+        """
+        return transform_cell_path_matrix(cell_path_matrix, invert_transform(self.transform))
+
+
+def get_canonical_keys(masks: np.ndarray) -> tuple[np.ndarray, np.ndarray, tuple[int, int]]:
+    """
+    Canonicalize a batch of tile masks of the same shape (B x n x m).
+
+    Returns the canonical bit-packed masks as a B array of fixed-length bytes
+    (comparable and hashable with numpy), the transform of each mask,
+    and the canonical shape.
+    """
+    masks = np.asarray(masks, dtype=bool)
+    n, m = masks.shape[-2:]
+    rows, cols = min(n, m), max(n, m)
+    best_keys, best_transforms = None, None
+    for transform in range(NB_TRANSFORMS):
+        transformed = transform_array(masks, transform)
+        if transformed.shape[-2:] != (rows, cols):
+            continue
+        packed = np.packbits(transformed.reshape(len(masks), -1), axis=1)
+        keys = np.ascontiguousarray(packed).view(f"S{packed.shape[1]}").ravel()
+        if best_keys is None:
+            best_keys = keys
+            best_transforms = np.full(len(masks), transform, dtype=np.int8)
+        else:
+            # the bytes have the same length, so numpy comparisons are lexicographic
+            smaller = keys < best_keys
+            best_keys = np.where(smaller, keys, best_keys)
+            best_transforms[smaller] = transform
+    return best_keys, best_transforms, (rows, cols)
+
+
+def get_canonical_form(tile_grid_graph: TileGridGraph) -> CanonicalForm:
+    """
+    Get the canonical form of a tile grid graph.
+    """
+    keys, transforms, (rows, cols) = get_canonical_keys(tile_grid_graph.tile_exists[np.newaxis])
+    return CanonicalForm(rows, cols, keys[0].ljust(keys.dtype.itemsize, b"\0"), int(transforms[0]))
+
+
+def get_canonical_hash(tile_grid_graph: TileGridGraph) -> bytes:
+    return get_canonical_form(tile_grid_graph).get_hash()
+
+
+def get_canonical_hashes(masks: np.ndarray) -> list[bytes]:
+    """
+    Get the 128-bit hashes of the canonical forms of a batch of tile masks
+    of the same shape (B x n x m).
+    """
+    keys, _, (rows, cols) = get_canonical_keys(masks)
+    width = keys.dtype.itemsize
+    # the raw buffer keeps the trailing zero bytes, that numpy strips from the items
+    buffer = keys.tobytes()
+    header = _hash_header(rows, cols)
+    hashes = []
+    for start in range(0, len(buffer), width):
+        digest = header.copy()
+        digest.update(buffer[start:start + width])
+        hashes.append(digest.digest())
+    return hashes
+
+
+def deduplicate_masks(masks: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Group a batch of tile masks of the same shape (B x n x m) by canonical form.
+
+    Returns the index of the first mask of each group, the group of each
+    mask, and the transform from each mask to its canonical form.
+    A path found for the first mask of a group maps to the canonical form
+    with its transform, then to any other mask with the inverse of its transform.
+    """
+    keys, transforms, _ = get_canonical_keys(masks)
+    _, first_indices, groups = np.unique(keys, return_index=True, return_inverse=True)
+    order = np.argsort(first_indices, kind="stable")
+    ranks = np.empty(len(order), dtype=np.int64)
+    ranks[order] = np.arange(len(order))
+    return first_indices[order], ranks[groups.ravel()], transforms
+
+
+# Tests
+import unittest
+class TestCanonicalForm(unittest.TestCase):
+    def test_transforms(self):
+        """
+        Test the group tables, and that the CellPath values turn with the cells.
+        """
+        from hpgg.grid_graphs.cell_grid_graph import CellGridGraph
+        from hpgg.grid_graphs.tile_grid_graphs import tile_grid_graph_from_text
+        from hpgg.paths.stc_algo import AlgorithmSTC
+        from hpgg.paths.validation import validate_cell_path_matrix
+
+        array = np.arange(12).reshape(3, 4)
+        for first in range(NB_TRANSFORMS):
+            self.assertTrue(np.array_equal(
+                transform_array(transform_array(array, first), invert_transform(first)), array
+            ))
+            for second in range(NB_TRANSFORMS):
+                self.assertTrue(np.array_equal(
+                    transform_array(transform_array(array, first), second),
+                    transform_array(array, compose_transforms(first, second)),
+                ))
+
+        grid = tile_grid_graph_from_text("""
+        x x x .
+        x . x x
+        x x x .
+        """.strip())
+        cell_path_matrix = AlgorithmSTC(CellGridGraph(grid))
+        for transform in range(NB_TRANSFORMS):
+            transformed = transform_cell_path_matrix(cell_path_matrix, transform)
+            report = validate_cell_path_matrix(transformed, CellGridGraph(transform_tile_grid_graph(grid, transform)))
+            self.assertTrue(report.is_valid, report.get_message())
+
+    def test_canonical_form_and_hash(self):
+        """
+        Test that the 8 orientations of a grid have the same canonical form,
+        and that a path of the canonical form maps back to each of them.
+        """
+        import random
+        from hpgg.grid_graphs.cell_grid_graph import CellGridGraph
+        from hpgg.paths.stc_algo import AlgorithmSTC
+        from hpgg.paths.validation import validate_cell_path_matrix
+
+        random.seed(0)
+        for _ in range(10):
+            grid = TileGridGraph(random.randint(1, 7), random.randint(1, 7))
+            grid.add_holes(random.randint(0, 4), keep_connected=True)
+            form = get_canonical_form(grid)
+            self.assertEqual(form.rows, min(grid.n, grid.m))
+            self.assertTrue(np.array_equal(
+                form.get_tile_grid_graph().tile_exists, transform_array(grid.tile_exists, form.transform)
+            ))
+            canonical_path = form.to_canonical(AlgorithmSTC(CellGridGraph(grid)))
+            for transform in range(NB_TRANSFORMS):
+                oriented = transform_tile_grid_graph(grid, transform)
+                oriented_form = get_canonical_form(oriented)
+                self.assertEqual(oriented_form.packed, form.packed)
+                self.assertEqual(oriented_form.get_hash(), form.get_hash())
+                path = oriented_form.from_canonical(canonical_path)
+                report = validate_cell_path_matrix(path, CellGridGraph(oriented))
+                self.assertTrue(report.is_valid, report.get_message())
+
+        # a hash differs for another grid, and is stable
+        self.assertNotEqual(get_canonical_hash(TileGridGraph(2, 3)), get_canonical_hash(TileGridGraph(2, 4)))
+        self.assertEqual(get_canonical_hash(TileGridGraph(2, 3)).hex(), hash_packed(2, 3, bytes([0xfc])).hex())
+
+    def test_deduplicate_masks(self):
+        """
+        Test the grouping of random orientations of a few masks.
+        """
+        rng = np.random.default_rng(0)
+        base = rng.random((20, 5, 5)) < 0.5
+        instances = rng.integers(0, 20, 500)
+        transforms = rng.integers(0, NB_TRANSFORMS, 500)
+        masks = np.stack([transform_array(base[k], t) for k, t in zip(instances, transforms)])
+
+        first_indices, groups, mask_transforms = deduplicate_masks(masks)
+        self.assertEqual(len(first_indices), len(np.unique(instances)))
+        self.assertTrue(np.array_equal(first_indices[groups[first_indices]], first_indices))
+        for k in range(len(masks)):
+            same = instances == instances[k]
+            self.assertTrue(np.all(groups[same] == groups[k]))
+            canonical = transform_array(masks[k], mask_transforms[k])
+            representative = first_indices[groups[k]]
+            self.assertTrue(np.array_equal(canonical, transform_array(masks[representative], mask_transforms[representative])))
+
+        hashes = get_canonical_hashes(masks)
+        self.assertEqual(hashes[0], get_canonical_hash(TileGridGraph.from_mask(masks[0], check_connected=False)))
+        self.assertEqual(len(set(hashes)), len(first_indices))
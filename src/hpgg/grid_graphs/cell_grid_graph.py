@@ -1,5 +1,9 @@
 from enum import Enum
 
+import numpy as np
+
+from hpgg.grid_graphs.tile_grid_graphs import DIRECTION_OFFSETS, EAST, NORTH, SOUTH, WEST
+
 class CellPath(Enum):
     """
     A cell path is a path that is defined on a cell of a cell grid graph.
@@ -80,17 +84,52 @@ CELL_PATH_TO_CHAR = {
     CellPath.BOTTOM_RIGHT: '┌',
 }
 
+# sides of a cell crossed by its path, as a 4-bit mask (NORTH, EAST, SOUTH, WEST)
+CELL_PATH_TO_SIDES = {
+    CellPath.HORIZONTAL: WEST | EAST,
+    CellPath.VERTICAL: NORTH | SOUTH,
+    CellPath.BOTTOM_LEFT: WEST | SOUTH,
+    CellPath.TOP_RIGHT: WEST | NORTH,
+    CellPath.TOP_LEFT: NORTH | EAST,
+    CellPath.BOTTOM_RIGHT: EAST | SOUTH,
+}
+
+SIDES_TO_CELL_PATH = {
+    sides: cell_path for cell_path, sides in CELL_PATH_TO_SIDES.items()
+}
+
+
+# cell neighbours of the cell at (x % 2, y % 2) in its tile:
+# inside the tile (always present), and outside the tile (present iff the adjacent tile exists)
+CELL_INNER_NEIGHBOURS = np.array([
+    [SOUTH | EAST, SOUTH | WEST],
+    [NORTH | EAST, NORTH | WEST],
+], dtype=np.uint8)
+CELL_OUTER_NEIGHBOURS = np.array([
+    [NORTH | WEST, NORTH | EAST],
+    [SOUTH | WEST, SOUTH | EAST],
+], dtype=np.uint8)
 
 class CellGridGraph():
     """
     A cell grid graph is a G4 graph where the cells are the vertices.
     Such a grid graph can be defined from a given tile grid graph.
     Each tile contains a group of 2x2 adjacent cells. 
+
+    The cells are never stored: every query goes back to the tile array.
     """
     def __init__(self, tile_grid_graph):
         self.tile_grid_graph = tile_grid_graph
 
     def cell_exists(self, x, y):
+        """
+        Check if the cell (x, y) exists.
+        x and y can also be arrays of coordinates, in which case
+        a boolean array is returned.
+        """
+        if np.ndim(x) > 0 or np.ndim(y) > 0:
+            return self.__cells_exist(x, y)
+
         x_tile = x // 2
         y_tile = y // 2
 
@@ -101,7 +140,53 @@ class CellGridGraph():
         ):
             return False
 
-        return self.tile_grid_graph.tile_exists[x_tile][y_tile]
+        return bool(self.tile_grid_graph.tile_exists[x_tile][y_tile])
+
+    def __cells_exist(self, x, y) -> np.ndarray:
+        x, y = np.broadcast_arrays(np.asarray(x), np.asarray(y))
+        inside = (
+            (x >= 0) & (x < self.get_nb_rows())
+            & (y >= 0) & (y < self.get_nb_columns())
+        )
+        exists = np.zeros(x.shape, dtype=bool)
+        exists[inside] = self.tile_grid_graph.tile_exists[x[inside] // 2, y[inside] // 2]
+        return exists
+
+    def get_cell_mask_view(self) -> np.ndarray:
+        """
+        Get the existence of the cells as a read-only n x 2 x m x 2 view
+        over the tile array (no copy): cell (x, y) is at [x // 2, x % 2, y // 2, y % 2].
+        """
+        n, m = self.tile_grid_graph.n, self.tile_grid_graph.m
+        tiles = self.tile_grid_graph.tile_exists
+        return np.broadcast_to(tiles[:, np.newaxis, :, np.newaxis], (n, 2, m, 2))
+
+    def get_cell_mask(self) -> np.ndarray:
+        """
+        Get the existence of the cells as a rows x cols boolean array.
+        Unlike `get_cell_mask_view`, this is a copy.
+        """
+        return self.get_cell_mask_view().reshape(self.get_nb_rows(), self.get_nb_columns())
+
+    def get_neighbour_masks(self, x, y) -> np.ndarray:
+        """
+        Get the 4-bit masks (NORTH, EAST, SOUTH, WEST) of the existing neighbours
+        of the given cells. x and y are arrays of coordinates of existing cells.
+        """
+        x, y = np.broadcast_arrays(np.asarray(x), np.asarray(y))
+        tile_masks = self.tile_grid_graph.get_neighbour_masks()[x // 2, y // 2]
+        return CELL_INNER_NEIGHBOURS[x % 2, y % 2] | (tile_masks & CELL_OUTER_NEIGHBOURS[x % 2, y % 2])
+
+    def iter_neighbours(self, x: int, y: int):
+        """
+        Iterate over the existing neighbours (x, y) of a cell.
+        """
+        for dx, dy in DIRECTION_OFFSETS.values():
+            if self.cell_exists(x + dx, y + dy):
+                yield (x + dx, y + dy)
+
+    def get_nb_cells(self) -> int:
+        return 4 * self.tile_grid_graph.get_nb_tiles()
 
     def get_nb_rows(self) -> int:
         return self.tile_grid_graph.n * 2
@@ -109,24 +194,141 @@ class CellGridGraph():
     def get_nb_columns(self) -> int:
         return self.tile_grid_graph.m * 2
 
+class CellPathRowView():
+    """
+    A row of a CellPathMatrix, seen as a list of CellPath.
+    Reads and writes go directly to the underlying int8 array.
+    """
+    def __init__(self, codes_row: np.ndarray):
+        self.codes_row = codes_row
+
+    def __len__(self) -> int:
+        return len(self.codes_row)
+
+    def __getitem__(self, j):
+        if isinstance(j, slice):
+            return [CellPath(code) for code in self.codes_row[j].tolist()]
+        return CellPath(int(self.codes_row[j]))
+
+    def __setitem__(self, j, cell_path):
+        if isinstance(j, slice):
+            self.codes_row[j] = [path.value for path in cell_path]
+        else:
+            self.codes_row[j] = cell_path.value
+
+    def __iter__(self):
+        return (CellPath(code) for code in self.codes_row.tolist())
+
+class CellPathMatrixView():
+    """
+    A CellPathMatrix seen as a list of lists of CellPath: view[i][j].
+    """
+    def __init__(self, codes: np.ndarray):
+        self.codes = codes
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, i: int) -> CellPathRowView:
+        return CellPathRowView(self.codes[i])
+
+    def __iter__(self):
+        return (CellPathRowView(codes_row) for codes_row in self.codes)
+
+# characters of the CellPath values, indexed by value + 1 (NO_CELL is -1)
+CELL_PATH_CHARS = np.array(
+    [CELL_PATH_TO_CHAR[CellPath(value)] for value in range(-1, len(CellPath) - 1)]
+)
+
+# sides crossed by the CellPath values, indexed by value + 1 (NO_CELL is -1)
+CELL_PATH_SIDES = np.array(
+    [CELL_PATH_TO_SIDES.get(CellPath(value), 0) for value in range(-1, len(CellPath) - 1)],
+    dtype=np.uint8,
+)
+
 class CellPathMatrix():
+    """
+    The CellPath of each cell of a cell grid graph.
+    It is stored as a rows x cols int8 array of CellPath values (`codes`),
+    1 byte per cell. `cell_path_matrix[i][j]` gives access to the CellPath enums.
+    """
     def __init__(self, cell_grid_graph: CellGridGraph):
         self.rows = cell_grid_graph.get_nb_rows()
         self.cols = cell_grid_graph.get_nb_columns()
 
-        # initialize the matrix with no path on each cell
-        cell_path_matrix = []
-        for i in range(self.rows*2):
-            cell_path_matrix.append([])
-            for j in range(self.cols*2):
-                if cell_grid_graph.cell_exists(i, j):
-                    cell_path_matrix[i].append(CellPath.NO_PATH)
-                else:
-                    cell_path_matrix[i].append(CellPath.NO_CELL)
-        self.cell_path_matrix = cell_path_matrix
+        # initialize the matrix with no path on each cell:
+        # each tile is upsampled to its 2x2 cells, and then
+        # 1 (tile) -> 0 (NO_PATH), 0 (no tile) -> -1 (NO_CELL)
+        tiles = cell_grid_graph.tile_grid_graph.tile_exists.astype(np.int8)
+        self.codes = np.kron(tiles, np.ones((2, 2), dtype=np.int8)) - 1
+
+    @classmethod
+    def from_codes(cls, codes: np.ndarray) -> "CellPathMatrix":
+        """
+        Create a CellPathMatrix from a rows x cols array of CellPath values.
+        The array is used as is (no copy if it is already int8).
+        """
+        cell_path_matrix = cls.__new__(cls)
+        cell_path_matrix.codes = np.asarray(codes, dtype=np.int8)
+        cell_path_matrix.rows, cell_path_matrix.cols = cell_path_matrix.codes.shape
+        return cell_path_matrix
+
+    @property
+    def cell_path_matrix(self) -> CellPathMatrixView:
+        return CellPathMatrixView(self.codes)
+
+    def get_cell_path(self, x: int, y: int) -> CellPath:
+        return CellPath(int(self.codes[x, y]))
+
+    def set_cell_path(self, x: int, y: int, cell_path: CellPath):
+        self.codes[x, y] = cell_path.value
+
+    def get_sides(self) -> np.ndarray:
+        """
+        Get the sides crossed by the path in each cell, as a rows x cols
+        uint8 array of 4-bit masks (NORTH, EAST, SOUTH, WEST).
+        """
+        return CELL_PATH_SIDES[self.codes.astype(np.intp) + 1]
+
+    def to_text(self) -> str:
+        chars = CELL_PATH_CHARS[self.codes.astype(np.intp) + 1]
+        return "\n".join("".join(row) for row in chars.tolist())
 
     def print(self):
-        for i in range(self.rows):
-            for j in range(self.cols):
-                print(CELL_PATH_TO_CHAR[self.cell_path_matrix[i][j]], end='') 
-            print()
\ No newline at end of file
+        print(self.to_text())
+
+
+
+# Tests
+import unittest
+class TestCellGridGraph(unittest.TestCase):
+    def test_batched_queries_match_scalar_ones(self):
+        """
+        Test the batched cell queries against the scalar ones.
+        """
+        from hpgg.grid_graphs.tile_grid_graphs import tile_grid_graph_from_text
+
+        grid_text = """
+        x x .
+        . x x
+        x x x
+        """
+        cell_grid_graph = CellGridGraph(tile_grid_graph_from_text(grid_text.strip()))
+        x, y = np.meshgrid(np.arange(-1, 7), np.arange(-1, 7), indexing="ij")
+        expected = [[cell_grid_graph.cell_exists(i, j) for j in range(-1, 7)] for i in range(-1, 7)]
+        self.assertEqual(cell_grid_graph.cell_exists(x, y).tolist(), expected)
+
+        cell_mask = cell_grid_graph.get_cell_mask()
+        self.assertEqual(cell_mask.tolist(), [row[1:-1] for row in expected[1:-1]])
+        self.assertTrue(np.shares_memory(
+            cell_grid_graph.get_cell_mask_view(), cell_grid_graph.tile_grid_graph.tile_exists
+        ))
+
+        x, y = np.nonzero(cell_mask)
+        neighbour_masks = cell_grid_graph.get_neighbour_masks(x, y)
+        for i, j, neighbour_mask in zip(x.tolist(), y.tolist(), neighbour_masks.tolist()):
+            expected_mask = sum(
+                direction for direction, (dx, dy) in DIRECTION_OFFSETS.items()
+                if (i + dx, j + dy) in set(cell_grid_graph.iter_neighbours(i, j))
+            )
+            self.assertEqual(neighbour_mask, expected_mask)
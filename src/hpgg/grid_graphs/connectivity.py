@@ -0,0 +1,163 @@
+"""
+Connected components of grid graphs, without recursion.
+
+The grid is first split into horizontal runs of adjacent cells.
+Each run is trivially connected, so the union-find only has to
+merge runs through the vertical adjacencies between consecutive rows.
+The union-find itself is vectorized (hooking + pointer jumping),
+which keeps the whole computation at array speed.
+"""
+import numpy as np
+
+
+def spanning_forest(
+    nb_nodes: int,
+    u: np.ndarray,
+    v: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized union-find over the graph of nb_nodes nodes and edges (u[k], v[k]).
+
+    Returns:
+    - roots: for each node, the smallest node of its connected component.
+    - tree_edges: indices k of the edges that form a spanning forest.
+
+    Each round, every root that still has an outgoing edge to another
+    component is hooked to a smaller root. Pointer jumping is then done
+    on the hooked roots only, followed by a single pass over all nodes.
+    """
+    parent = np.arange(nb_nodes, dtype=np.int64)
+    u = np.asarray(u, dtype=np.int64)
+    v = np.asarray(v, dtype=np.int64)
+    edge_ids = np.arange(len(u), dtype=np.int64)
+    tree_edges = []
+
+    # slot[root] remembers which edge won the hooking of a root
+    slot = np.empty(nb_nodes, dtype=np.int64)
+
+    while len(u) > 0:
+        root_u = parent[u]
+        root_v = parent[v]
+        active = root_u != root_v
+        if not active.all():
+            u, v, edge_ids = u[active], v[active], edge_ids[active]
+            root_u, root_v = root_u[active], root_v[active]
+        if len(u) == 0:
+            break
+
+        high = np.maximum(root_u, root_v)
+        low = np.minimum(root_u, root_v)
+
+        # a root can only be hooked once per round: keep one edge per root
+        positions = np.arange(len(high), dtype=np.int64)
+        slot[high] = positions
+        winners = slot[high] == positions
+        hooked = high[winners]
+        parent[hooked] = low[winners]
+        tree_edges.append(edge_ids[winners])
+
+        # pointer jumping among the hooked roots, until they point to a root
+        while len(hooked) > 0:
+            current = parent[hooked]
+            grand_parent = parent[current]
+            moving = grand_parent != current
+            hooked = hooked[moving]
+            parent[hooked] = grand_parent[moving]
+
+        # every other node pointed to a root, which now points to the final root
+        parent = parent[parent]
+
+    if tree_edges:
+        return parent, np.concatenate(tree_edges)
+    return parent, np.zeros(0, dtype=np.int64)
+
+
+def row_runs(mask: np.ndarray) -> tuple[np.ndarray, int]:
+    """
+    Split each row of the mask into runs of adjacent True cells.
+
+    Returns the flat run index of every cell (only meaningful where mask is True),
+    and the number of runs. Runs are numbered in row-major order.
+    """
+    starts = mask.copy()
+    starts[:, 1:] &= ~mask[:, :-1]
+    run_ids = np.cumsum(starts.ravel(), dtype=np.int64) - 1
+    nb_runs = int(run_ids[-1]) + 1 if run_ids.size else 0
+    return run_ids, nb_runs
+
+
+def run_adjacencies(mask: np.ndarray, run_ids: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Get the vertical adjacencies between runs of consecutive rows.
+
+    Two overlapping runs touch on a contiguous interval of columns,
+    so only the leftmost column of each interval is kept.
+    Returns (upper run, lower run, flat index of the upper cell).
+    """
+    m = mask.shape[1]
+    both = mask[:-1, :] & mask[1:, :]
+    first = both.copy()
+    first[:, 1:] &= ~both[:, :-1]
+    cells = np.flatnonzero(first)
+    return run_ids[cells], run_ids[cells + m], cells
+
+
+def _run_roots(mask: np.ndarray) -> tuple[np.ndarray, np.ndarray, int]:
+    run_ids, nb_runs = row_runs(mask)
+    upper, lower, _ = run_adjacencies(mask, run_ids)
+    roots, _ = spanning_forest(nb_runs, upper, lower)
+    return run_ids, roots, nb_runs
+
+
+def count_components(mask: np.ndarray) -> int:
+    """
+    Count the 4-connected components of a 2D boolean mask.
+    """
+    mask = np.asarray(mask, dtype=bool)
+    if mask.size == 0:
+        return 0
+    _, roots, nb_runs = _run_roots(mask)
+    return int(np.count_nonzero(roots == np.arange(nb_runs)))
+
+
+def is_connected(mask: np.ndarray) -> bool:
+    """
+    Check that all True cells of a 2D boolean mask form a single 4-connected component.
+    An empty mask is trivially connected.
+    """
+    return count_components(mask) <= 1
+
+
+def label_components(mask: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Label the 4-connected components of a 2D boolean mask.
+
+    Returns:
+    - labels: an int32 array of the shape of the mask, with the component index
+      of each cell, or -1 for holes. Components are numbered in the row-major
+      order of their first cell.
+    - sizes: the number of cells of each component.
+
+    Ex: (. = hole, x = cell)
+    x x . x       0  0 -1  1
+    . . . x  ->  -1 -1 -1  1
+    x x x x       1  1  1  1
+    """
+    mask = np.asarray(mask, dtype=bool)
+    labels = np.full(mask.shape, -1, dtype=np.int32)
+    if mask.size == 0:
+        return labels, np.zeros(0, dtype=np.int64)
+
+    run_ids, roots, nb_runs = _run_roots(mask)
+    if nb_runs == 0:
+        return labels, np.zeros(0, dtype=np.int64)
+
+    is_root = roots == np.arange(nb_runs)
+    run_components = (np.cumsum(is_root) - 1)[roots].astype(np.int32)
+
+    flat_mask = mask.ravel()
+    labels.ravel()[flat_mask] = run_components[run_ids[flat_mask]]
+
+    run_sizes = np.bincount(run_ids[flat_mask], minlength=nb_runs)
+    sizes = np.bincount(run_components, weights=run_sizes, minlength=int(is_root.sum())).astype(np.int64)
+    return labels, sizes
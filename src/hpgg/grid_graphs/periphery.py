@@ -0,0 +1,91 @@
+import random
+
+import numpy as np
+
+
+class IndexedTileSet():
+    """
+    A set of flat tile indices, with O(1) add, remove and uniform sampling.
+    The indices are kept in a list, and a dict gives the position of each
+    index in the list. Removing an index swaps it with the last one.
+    """
+    def __init__(self, indices: list[int] | None = None):
+        self.indices: list[int] = list(indices) if indices is not None else []
+        self.positions: dict[int, int] = {
+            index: position for position, index in enumerate(self.indices)
+        }
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def __contains__(self, index: int) -> bool:
+        return index in self.positions
+
+    def __iter__(self):
+        return iter(self.indices)
+
+    def add(self, index: int):
+        if index not in self.positions:
+            self.positions[index] = len(self.indices)
+            self.indices.append(index)
+
+    def discard(self, index: int):
+        position = self.positions.pop(index, None)
+        if position is None:
+            return
+        last = self.indices.pop()
+        if last != index:
+            self.indices[position] = last
+            self.positions[last] = position
+
+    def sample(self, rng: random.Random | None = None) -> int:
+        """
+        Draw one index uniformly at random.
+        """
+        if not self.indices:
+            raise Exception("Cannot sample from an empty set of tiles.")
+        randrange = rng.randrange if rng is not None else random.randrange
+        return self.indices[randrange(len(self.indices))]
+
+
+class PeripheryIndex():
+    """
+    The existing tiles that are on the periphery of a tile grid graph:
+    tiles on the border of the grid, or adjacent to a hole.
+
+    The index is built once from the tile mask, then kept up to date
+    as holes are punched, so that each hole costs O(1).
+    """
+    def __init__(self, tile_grid_graph):
+        self.tile_grid_graph = tile_grid_graph
+        periphery_mask = tile_grid_graph.get_periphery_mask() & tile_grid_graph.tile_exists
+        self.tiles = IndexedTileSet(np.flatnonzero(periphery_mask).tolist())
+
+    def __len__(self) -> int:
+        return len(self.tiles)
+
+    def __contains__(self, index: int) -> bool:
+        return index in self.tiles
+
+    def sample(self, rng: random.Random | None = None) -> int:
+        return self.tiles.sample(rng)
+
+    def add_hole(self, index: int):
+        """
+        Remove the tile at the given flat index from the grid,
+        and add its existing neighbours to the periphery.
+        """
+        n, m = self.tile_grid_graph.n, self.tile_grid_graph.m
+        tile_exists = self.tile_grid_graph.tile_exists
+        tile_exists.flat[index] = False
+        self.tiles.discard(index)
+
+        i, j = divmod(index, m)
+        if i > 0 and tile_exists[i - 1, j]:
+            self.tiles.add(index - m)
+        if i < n - 1 and tile_exists[i + 1, j]:
+            self.tiles.add(index + m)
+        if j > 0 and tile_exists[i, j - 1]:
+            self.tiles.add(index - 1)
+        if j < m - 1 and tile_exists[i, j + 1]:
+            self.tiles.add(index + 1)
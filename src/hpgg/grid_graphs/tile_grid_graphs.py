@@ -1,4 +1,12 @@
 import random
+from contextlib import contextmanager
+
+import numpy as np
+
+from hpgg import instrumentation
+from hpgg.grid_graphs.articulation import HoleCarver
+from hpgg.grid_graphs.connectivity import is_connected, label_components
+from hpgg.grid_graphs.periphery import PeripheryIndex
 
 # Tikz template
 TIKZ_FIG_BEGIN = """
@@ -16,6 +24,32 @@ TIKZ_FIG_END = """
 \\end{figure}
 """
 
+# Neighbour directions, as bits of a 4-bit neighbour mask.
+# The first coordinate is the row index (x), the second the column index (y).
+NORTH = 1
+EAST = 2
+SOUTH = 4
+WEST = 8
+
+DIRECTION_OFFSETS: dict[int, tuple[int, int]] = {
+    NORTH: (-1, 0),
+    EAST: (0, 1),
+    SOUTH: (1, 0),
+    WEST: (0, -1),
+}
+
+OPPOSITE_DIRECTION: dict[int, int] = {
+    NORTH: SOUTH,
+    EAST: WEST,
+    SOUTH: NORTH,
+    WEST: EAST,
+}
+
+class NotConnectedException(Exception):
+    """
+    Raised when the tiles of a grid graph are not connected.
+    """
+
 class TileGridGraph:
     def __init__(
         self, 
@@ -24,40 +58,116 @@ class TileGridGraph:
     ):
         """
         Creates a default grid graph of size n x m tiles, with no holes.
+
+        The tiles are stored as a n x m boolean numpy array, `tile_exists`.
+        It can still be used as a list of lists: `tile_exists[i][j]`.
         """
         self.n = n
         self.m = m
 
-        self.tile_exists = [[True for _ in range(m)] for _ in range(n)]
+        self.tile_exists = np.ones((n, m), dtype=bool)
         
         if self.check_connected_graph() == False:
-            raise Exception("The graph is not connected.")
-    
-    def __get_periphery_indices(self) -> set[tuple[int, int]]:
+            raise NotConnectedException("The graph is not connected.")
+
+    @classmethod
+    def from_mask(
+        cls,
+        mask: np.ndarray,
+        check_connected: bool = True,
+    ) -> "TileGridGraph":
+        """
+        Create a grid graph from a n x m boolean mask (True = tile, False = hole).
+        The mask is copied.
+        """
+        mask = np.array(mask, dtype=bool)
+        if mask.ndim != 2:
+            raise Exception("The tile mask must be a 2D array.")
+
+        grid = cls.__new__(cls)
+        grid.n, grid.m = mask.shape
+        grid.tile_exists = mask
+
+        if check_connected and grid.check_connected_graph() == False:
+            raise NotConnectedException("The graph is not connected.")
+        return grid
+
+    @classmethod
+    def from_packed(
+        cls,
+        packed: np.ndarray | bytes,
+        n: int,
+        m: int,
+        check_connected: bool = True,
+    ) -> "TileGridGraph":
+        """
+        Create a grid graph from a bit-packed tile mask, as returned by `to_packed`.
+        """
+        packed = np.frombuffer(packed, dtype=np.uint8) if isinstance(packed, bytes) else packed
+        mask = np.unpackbits(packed, count=n*m).reshape(n, m).astype(bool)
+        return cls.from_mask(mask, check_connected)
+
+    def to_packed(self) -> np.ndarray:
         """
-        Get the periphery indices of the grid.
+        Bit-pack the tile mask (row-major, 8 tiles per byte).
+        """
+        return np.packbits(self.tile_exists, axis=None)
+
+    def get_periphery_mask(self) -> np.ndarray:
+        """
+        Get a n x m boolean mask of the periphery of the grid.
         A periphery index is an index that is on the periphery of the grid graph.
         This is not only the trivial borders of the grid graph, 
         but also the cells that are adjacent to holes.
         """
-        periphery_indices: set[tuple[int, int]] = set()
-        for i in range(self.n):
-            for j in range(self.m):
-                # trivial periphery
-                if i in [0, self.n-1] or j in [0, self.m-1]:
-                    periphery_indices.add((i, j))
-                
-                # case where there are already holes on the periphery
-                # in such a case, we need to add the cells that are adjacent to the holes
-                if self.tile_exists[i][j] == False:
-                    for dx, dy in [(1, 0), (-1, 0), (0, 1), (0, -1)]:
-                        # check if the adjacent cell is in the grid
-                        if 0 <= i + dx < self.n and 0 <= j + dy < self.m:
-                            periphery_indices.add((i + dx, j + dy))
-        
-        return periphery_indices
+        periphery = np.zeros((self.n, self.m), dtype=bool)
+        if self.n == 0 or self.m == 0:
+            return periphery
+
+        # trivial periphery
+        periphery[0, :] = True
+        periphery[-1, :] = True
+        periphery[:, 0] = True
+        periphery[:, -1] = True
+
+        # cells that are adjacent to holes
+        holes = ~self.tile_exists
+        periphery[1:, :] |= holes[:-1, :]
+        periphery[:-1, :] |= holes[1:, :]
+        periphery[:, 1:] |= holes[:, :-1]
+        periphery[:, :-1] |= holes[:, 1:]
+
+        return periphery
+
+    def get_inner_mask(self) -> np.ndarray:
+        """
+        Get a n x m boolean mask of the indices that are not on the periphery.
+        """
+        return ~self.get_periphery_mask()
 
-    def add_periphery_holes(self, nb_holes: int):
+    def get_neighbour_masks(self) -> np.ndarray:
+        """
+        Get a n x m uint8 array of 4-bit neighbour masks.
+        For each existing tile, the bit of a direction (NORTH, EAST, SOUTH, WEST)
+        is set if the adjacent tile in that direction exists. Holes have a mask of 0.
+        """
+        tiles = self.tile_exists
+        masks = np.zeros((self.n, self.m), dtype=np.uint8)
+        masks[1:, :] |= np.where(tiles[1:, :] & tiles[:-1, :], NORTH, 0).astype(np.uint8)
+        masks[:, :-1] |= np.where(tiles[:, :-1] & tiles[:, 1:], EAST, 0).astype(np.uint8)
+        masks[:-1, :] |= np.where(tiles[:-1, :] & tiles[1:, :], SOUTH, 0).astype(np.uint8)
+        masks[:, 1:] |= np.where(tiles[:, 1:] & tiles[:, :-1], WEST, 0).astype(np.uint8)
+        return masks
+
+    def get_nb_tiles(self) -> int:
+        return int(np.count_nonzero(self.tile_exists))
+    
+    def add_periphery_holes(
+        self,
+        nb_holes: int,
+        keep_connected: bool = False,
+        rng: random.Random | None = None,
+    ):
         """
         Add holes that are on the periphery of the grid.
         Ex: (. = hole, x = cell)
@@ -66,20 +176,40 @@ class TileGridGraph:
         . . x x x
         x x x . x
         x . . . .
+
+        With keep_connected, only tiles that are not articulation points
+        are removed, so the graph stays connected after each hole.
+        The holes are drawn with rng (by default, the global random module).
         """
-        def __add_one_periphery_hole():
-            # List of all periphery cell indices
-            periphery_indices = self.__get_periphery_indices()
-            
-            # Randomly select 1 tuple 
-            return random.sample(sorted(periphery_indices), 1)[0]
+        with instrumentation.span("add_periphery_holes", nb_holes=nb_holes), self.__count_holes():
+            if keep_connected:
+                HoleCarver(self, region="periphery", rng=rng).add_holes(nb_holes)
+                return
 
-        for k in range(nb_holes):
-            i, j = __add_one_periphery_hole()
-            self.tile_exists[i][j] = False
-        
-        if self.check_connected_graph() == False:
-            raise Exception("The graph is not connected.")
+            # existing periphery tiles, updated as each hole is punched
+            periphery = PeripheryIndex(self)
+
+            for k in range(nb_holes):
+                if len(periphery) == 0:
+                    break
+                periphery.add_hole(periphery.sample(rng))
+
+            if self.check_connected_graph() == False:
+                raise NotConnectedException("The graph is not connected.")
+
+    @contextmanager
+    def __count_holes(self):
+        """
+        Count the holes added in the context (only if the instrumentation is enabled).
+        """
+        if not instrumentation.is_enabled():
+            yield
+            return
+        nb_tiles = self.get_nb_tiles()
+        try:
+            yield
+        finally:
+            instrumentation.count("tile_grid_graph.holes", nb_tiles - self.get_nb_tiles())
 
     def check_connected_graph(self) -> bool:
         """
@@ -104,32 +234,23 @@ class TileGridGraph:
         x . . . .
         This graph is not connected.
         """
-        def dfs(x, y, visited):
-            if (x, y) in visited or not (0 <= x < self.n and 0 <= y < self.m) or not self.tile_exists[x][y]:
-                return
-            visited.add((x, y))
-            for dx, dy in [(1, 0), (-1, 0), (0, 1), (0, -1)]:
-                dfs(x + dx, y + dy, visited)
-
-        visited = set()
-        start_cell: tuple[int, int] | None = None
-        # Find the first cell
-        for i in range(self.n):
-            for j in range(self.m):
-                if self.tile_exists[i][j] and start_cell is None:
-                    start_cell = (i, j)
-                    break
-
-        if start_cell is None:
-            return True  # The grid has no cells, thus it's trivially connected.
-
-        dfs(start_cell[0], start_cell[1], visited)
-
-        # Check if all cells are visited
-        return all(self.tile_exists[i][j] == ((i, j) in visited) for i in range(self.n) for j in range(self.m))
+        with instrumentation.span("check_connected_graph", n=self.n, m=self.m):
+            return is_connected(self.tile_exists)
 
+    def get_components(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get the connected components of the grid graph.
+        Returns a n x m int32 array of component labels (-1 for holes),
+        and the number of tiles of each component.
+        """
+        return label_components(self.tile_exists)
 
-    def add_holes(self, nb_holes: int):
+    def add_holes(
+        self,
+        nb_holes: int,
+        keep_connected: bool = False,
+        rng: random.Random | None = None,
+    ):
         """
         Add holes that are not on the periphery of the grid.
         Ex: (. = hole, x = cell)
@@ -139,16 +260,24 @@ class TileGridGraph:
         x . x x x
         x x x x x
         Those holes are not connected to the periphery.
+
+        With keep_connected, only tiles that are not articulation points
+        are removed, so the graph stays connected after each hole.
+        Each new hole is then also kept apart from the previous ones.
+        The holes are drawn with rng (by default, the global random module).
         """
-        # List of all non-periphery cell indices
-        periphery_indices = self.__get_periphery_indices()
-        inner_indices = [(i, j) for i in range(self.n) for j in range(self.m) if (i, j) not in periphery_indices]
+        with instrumentation.span("add_holes", nb_holes=nb_holes), self.__count_holes():
+            if keep_connected:
+                HoleCarver(self, region="inner", rng=rng).add_holes(nb_holes)
+                return
 
-        # Randomly select nb_holes indices to convert to holes, avoiding duplicates
-        holes_indices = random.sample(inner_indices, min(nb_holes, len(inner_indices)))
+            # flat indices of all non-periphery cells
+            inner_indices = np.flatnonzero(self.get_inner_mask())
 
-        for i, j in holes_indices:
-            self.tile_exists[i][j] = False
+            # Randomly select nb_holes indices to convert to holes, avoiding duplicates
+            selected = (rng or random).sample(range(len(inner_indices)), min(nb_holes, len(inner_indices)))
+
+            self.tile_exists.flat[inner_indices[selected]] = False
     
     def make_narrow(self):
         """
@@ -156,16 +285,12 @@ class TileGridGraph:
         Remove all cells that are not on the periphery.
         This makes the grid graph narrower.
         """
-        # List of all non-periphery cell indices
-        periphery_indices = self.__get_periphery_indices()
-        inner_indices = [(i, j) for i in range(self.n) for j in range(self.m) if (i, j) not in periphery_indices]
+        with instrumentation.span("make_narrow"), self.__count_holes():
+            # Put all non-periphery cells to False
+            self.tile_exists[self.get_inner_mask()] = False
 
-        # Put all inner cells to False
-        for i, j in inner_indices:
-            self.tile_exists[i][j] = False
-        
-        if self.check_connected_graph() == False:
-            raise Exception("The graph is not connected.")
+            if self.check_connected_graph() == False:
+                raise NotConnectedException("The graph is not connected.")
 
     def generate_tikz(self, output_path: str):
         """
@@ -186,31 +311,9 @@ class TileGridGraph:
             \\label{fig:xsxs}
         \\end{figure}
         """
-        tikz_code = TIKZ_FIG_BEGIN
-
-        tikz_code += "\t\t % Tiles\n"
-
-        # Draw the tiles
-        for i in range(self.n):
-            for j in range(self.m):
-                if self.tile_exists[i][j]:
-                    tikz_code += f"\t\t\\draw[fill=gray!20, draw=black, very thick] ({j},{-i}) rectangle ({j+1},{-i-1});\n"
-        
-        tikz_code += "\n\t\t % Inner cells\n"
-
-        # Draw the inner cells
-        for i in range(self.n):
-            for j in range(self.m):
-                if self.tile_exists[i][j]:
-                    tikz_code += f"\t\t\\draw[draw=gray, thin] ({j},{-i}) rectangle ({j+0.5},{-i-0.5});\n"
-                    tikz_code += f"\t\t\\draw[draw=gray, thin] ({j},{-i-0.5}) rectangle ({j+0.5},{-i-1});\n"
-                    tikz_code += f"\t\t\\draw[draw=gray, thin] ({j+0.5},{-i}) rectangle ({j+1},{-i-0.5});\n"
-                    tikz_code += f"\t\t\\draw[draw=gray, thin] ({j+0.5},{-i-0.5}) rectangle ({j+1},{-i-1});\n"
-
-        tikz_code += TIKZ_FIG_END
-
-        with open(output_path, "w") as file:
-            file.write(tikz_code)
+        # the tiles are merged into rectangles, see `hpgg.rendering`
+        from hpgg.rendering import render
+        render(output_path, self, format="tikz")
 
     def print(self):
         """
@@ -231,19 +334,10 @@ def tile_grid_graph_from_text(string: str) -> TileGridGraph:
     x . x x . x x 
     x x . x x x x
     """
-    # remove tabs
-    string = string.replace("\t", "").replace(" ", "")
-
-    lines = string.split("\n")
-    n = len(lines)
-    m = len(lines[0])
-    grid_graph = TileGridGraph(n, m)
-
-    for i in range(n):
-        for j in range(m):
-            grid_graph.tile_exists[i][j] = lines[i][j] == "x"
-    
-    return grid_graph
+    # a single grid of the text format, see `hpgg.io.text_format`
+    from hpgg.io.text_format import parse_tile_mask
+    mask = parse_tile_mask(string.strip().encode().split(b"\n"))
+    return TileGridGraph.from_mask(mask, check_connected=False)
 
 
 
@@ -293,3 +387,84 @@ class TestGridGraph(unittest.TestCase):
         """
         grid = tile_grid_graph_from_text(grid_text.strip())
         self.assertTrue(grid.check_connected_graph())
+
+    def test_components(self):
+        """
+        Test the component labels and sizes.
+        """
+        grid_text = """
+        x x . x x
+        . . x . x
+        x x . x x
+        """
+        grid = tile_grid_graph_from_text(grid_text.strip())
+        labels, sizes = grid.get_components()
+        self.assertEqual(labels[0].tolist(), [0, 0, -1, 1, 1])
+        self.assertEqual(labels[1].tolist(), [-1, -1, 2, -1, 1])
+        self.assertEqual(labels[2].tolist(), [3, 3, -1, 1, 1])
+        self.assertEqual(sizes.tolist(), [2, 5, 1, 2])
+
+    def test_large_snake_is_connected(self):
+        """
+        Test a long serpentine corridor, that used to exceed the recursion limit.
+        """
+        grid = TileGridGraph(301, 300)
+        grid.tile_exists[1::4, :-1] = False
+        grid.tile_exists[3::4, 1:] = False
+        self.assertTrue(grid.check_connected_graph())
+        grid.tile_exists[4][150] = False
+        self.assertFalse(grid.check_connected_graph())
+
+    def test_periphery_and_neighbour_masks(self):
+        """
+        Test the vectorized periphery, inner and neighbour queries.
+        """
+        grid_text = """
+        x x x x
+        x x x x
+        x x . x
+        x x x x
+        """
+        grid = tile_grid_graph_from_text(grid_text.strip())
+        inner_indices = set(map(tuple, np.argwhere(grid.get_inner_mask()).tolist()))
+        self.assertEqual(inner_indices, {(1, 1), (2, 2)})
+        self.assertEqual(grid.get_neighbour_masks()[1][2], NORTH | EAST | WEST)
+        self.assertEqual(grid.get_neighbour_masks()[2][2], 0)
+
+    def test_list_style_access_and_packing(self):
+        """
+        Test that the array-backed tiles keep the list-style API and can be bit-packed.
+        """
+        grid = TileGridGraph(3, 5)
+        grid.tile_exists[0][4] = False
+        self.assertFalse(grid.tile_exists[0][4])
+        self.assertEqual(grid.get_nb_tiles(), 14)
+
+        unpacked = TileGridGraph.from_packed(grid.to_packed(), 3, 5)
+        self.assertTrue(np.array_equal(unpacked.tile_exists, grid.tile_exists))
+
+    def test_periphery_index_is_kept_up_to_date(self):
+        """
+        Test that the incremental periphery matches the vectorized one after each hole.
+        """
+        random.seed(0)
+        grid = TileGridGraph(8, 9)
+        periphery = PeripheryIndex(grid)
+        for _ in range(20):
+            periphery.add_hole(periphery.sample())
+            expected = np.flatnonzero(grid.get_periphery_mask() & grid.tile_exists)
+            self.assertEqual(sorted(periphery.tiles), expected.tolist())
+        self.assertEqual(grid.get_nb_tiles(), 8*9 - 20)
+
+    def test_holes_keep_connected(self):
+        """
+        Test that connectivity-preserving holes never disconnect the graph.
+        """
+        random.seed(0)
+        for _ in range(20):
+            grid = TileGridGraph(10, 12)
+            grid.add_periphery_holes(40, keep_connected=True)
+            self.assertTrue(grid.check_connected_graph())
+            self.assertEqual(grid.get_nb_tiles(), 10*12 - 40)
+            grid.add_holes(5, keep_connected=True)
+            self.assertTrue(grid.check_connected_graph())
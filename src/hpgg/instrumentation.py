@@ -0,0 +1,283 @@
+"""
+Named spans and counters in the hot paths, sent to a pluggable collector.
+
+The instrumented code calls `span(name)` and `count(name, value)`. When no
+collector is set (the default), `span` returns a shared empty context and
+`count` returns at once, so the instrumentation costs a function call.
+Counters that are expensive to compute are guarded by `is_enabled()`.
+
+Ex:
+    collector = TraceCollector()
+    with collecting(collector):
+        AlgorithmSTC(cell_grid_graph)
+    print(collector.get_summary())
+    collector.write_chrome_trace("trace.json")  # chrome://tracing, Perfetto
+    collector.write_pstats("stc.prof")          # pstats, snakeviz
+"""
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, ContextManager, Iterator
+
+if TYPE_CHECKING:
+    import pstats
+
+_NULL_SPAN = nullcontext()
+_collector: "Collector | None" = None
+
+
+class Collector():
+    """
+    Receives the spans and counters. Subclass it to send them elsewhere.
+    """
+    def span(self, name: str, args: dict) -> ContextManager:
+        return _NULL_SPAN
+
+    def count(self, name: str, value: int):
+        pass
+
+
+def span(name: str, **args) -> ContextManager:
+    """
+    A context measuring a named phase, with JSON-serializable args (ex: the size).
+    """
+    collector = _collector
+    if collector is None:
+        return _NULL_SPAN
+    return collector.span(name, args)
+
+
+def count(name: str, value: int = 1):
+    """
+    Add value to a named counter.
+    """
+    collector = _collector
+    if collector is not None:
+        collector.count(name, value)
+
+
+def is_enabled() -> bool:
+    return _collector is not None
+
+
+def set_collector(collector: Collector | None) -> Collector | None:
+    """
+    Set the collector (None to disable the instrumentation).
+    Returns the previous one.
+    """
+    global _collector
+    previous, _collector = _collector, collector
+    return previous
+
+
+@contextmanager
+def collecting(collector: Collector) -> Iterator[Collector]:
+    """
+    Use a collector inside the context, then restore the previous one.
+    """
+    previous = set_collector(collector)
+    try:
+        yield collector
+    finally:
+        set_collector(previous)
+
+
+@dataclass
+class SpanEvent:
+    name: str
+    parent: str | None
+    start: int
+    end: int
+    # time not spent in the child spans
+    own: int
+    thread: int
+    args: dict = field(default_factory=dict)
+
+
+class TraceCollector(Collector):
+    """
+    Keep every span (times in ns, from time.perf_counter_ns) and the
+    counter values, to summarize them or export them.
+    """
+    def __init__(self):
+        self.events: list[SpanEvent] = []
+        self.counters: dict[str, int] = defaultdict(int)
+        # (time, name, value after the update)
+        self.counter_events: list[tuple[int, str, int]] = []
+        self.local = threading.local()
+
+    def __get_stack(self) -> list[list]:
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    @contextmanager
+    def span(self, name: str, args: dict) -> Iterator[None]:
+        stack = self.__get_stack()
+        # [name, time spent in the child spans]
+        frame = [name, 0]
+        parent = stack[-1][0] if stack else None
+        stack.append(frame)
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            end = time.perf_counter_ns()
+            stack.pop()
+            if stack:
+                stack[-1][1] += end - start
+            self.events.append(SpanEvent(name, parent, start, end, end - start - frame[1], threading.get_ident(), args))
+
+    def count(self, name: str, value: int):
+        self.counters[name] += value
+        self.counter_events.append((time.perf_counter_ns(), name, self.counters[name]))
+
+    def get_summary(self) -> str:
+        """
+        The number of calls, total and own time of each span, and the counters.
+        """
+        totals: dict[str, list] = {}
+        for event in self.events:
+            total = totals.setdefault(event.name, [0, 0, 0])
+            total[0] += 1
+            total[1] += event.end - event.start
+            total[2] += event.own
+        lines = [f"{'span':<40} {'calls':>8} {'total (s)':>12} {'own (s)':>12}"]
+        for name, (calls, total_time, own_time) in sorted(totals.items(), key=lambda item: -item[1][1]):
+            lines.append(f"{name:<40} {calls:>8} {total_time / 1e9:>12.6f} {own_time / 1e9:>12.6f}")
+        if self.counters:
+            lines.append(f"\n{'counter':<40} {'value':>8}")
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"{name:<40} {value:>8}")
+        return "\n".join(lines)
+
+    def get_chrome_trace(self) -> dict:
+        """
+        The spans and counters in the Chrome trace event format (times in µs).
+        """
+        pid = os.getpid()
+        events = [
+            {
+                "name": event.name, "cat": "hpgg", "ph": "X", "pid": pid, "tid": event.thread,
+                "ts": event.start / 1e3, "dur": (event.end - event.start) / 1e3, "args": event.args,
+            }
+            for event in self.events
+        ]
+        events += [
+            {"name": name, "cat": "hpgg", "ph": "C", "pid": pid, "ts": timestamp / 1e3, "args": {name: value}}
+            for timestamp, name, value in self.counter_events
+        ]
+        events.sort(key=lambda event: event["ts"])
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path: str):
+        import json
+
+        with open(path, "w") as file:
+            json.dump(self.get_chrome_trace(), file)
+
+    def get_pstats_dict(self) -> dict:
+        """
+        The spans as the stats of cProfile: each span name is a function,
+        called by the span around it.
+        """
+        def key(name: str) -> tuple[str, int, str]:
+            return ("hpgg", 0, name)
+
+        stats: dict = {}
+        for event in self.events:
+            duration = (event.end - event.start) / 1e9
+            own = event.own / 1e9
+            calls, _, total_own, cumulative, callers = stats.get(key(event.name), (0, 0, 0.0, 0.0, {}))
+            if event.parent is not None:
+                caller = callers.get(key(event.parent), (0, 0, 0.0, 0.0))
+                callers[key(event.parent)] = (
+                    caller[0] + 1, caller[1] + 1, caller[2] + own, caller[3] + duration
+                )
+            stats[key(event.name)] = (calls + 1, calls + 1, total_own + own, cumulative + duration, callers)
+        return stats
+
+    def get_pstats(self) -> "pstats.Stats":
+        import pstats
+
+        return pstats.Stats(_StatsSource(self.get_pstats_dict()))
+
+    def write_pstats(self, path: str):
+        """
+        Write the stats in the file format of cProfile (loaded by pstats.Stats(path)).
+        """
+        import marshal
+
+        with open(path, "wb") as file:
+            marshal.dump(self.get_pstats_dict(), file)
+
+
+class _StatsSource():
+    """
+    What pstats.Stats expects from a profiler.
+    """
+    def __init__(self, stats: dict):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+# Tests
+import unittest
+class TestInstrumentation(unittest.TestCase):
+    def test_disabled(self):
+        """
+        Test that nothing is collected without a collector.
+        """
+        self.assertFalse(is_enabled())
+        self.assertIs(span("x"), _NULL_SPAN)
+        count("x")
+
+    def test_stc_pipeline(self):
+        """
+        Test the spans and counters of the STC pipeline, and their exports.
+        """
+        import io
+        import json
+        import pstats
+        import tempfile
+        from hpgg.grid_graphs.cell_grid_graph import CellGridGraph
+        from hpgg.grid_graphs.tile_grid_graphs import TileGridGraph
+        from hpgg.paths.stc_algo import AlgorithmSTC
+
+        collector = TraceCollector()
+        with collecting(collector):
+            grid = TileGridGraph(6, 8)
+            grid.add_holes(3, keep_connected=True)
+            AlgorithmSTC(CellGridGraph(grid))
+        self.assertFalse(is_enabled())
+
+        names = {event.name for event in collector.events}
+        for name in ("AlgorithmSTC", "SkeletonSTC", "check_connected_graph", "add_holes"):
+            self.assertIn(name, names)
+        by_name = {event.name: event for event in collector.events}
+        self.assertEqual(by_name["SkeletonSTC"].parent, "AlgorithmSTC")
+        self.assertLessEqual(by_name["SkeletonSTC"].own, by_name["SkeletonSTC"].end - by_name["SkeletonSTC"].start)
+
+        nb_tiles = 6 * 8 - 3
+        self.assertEqual(collector.counters["tile_grid_graph.holes"], 3)
+        self.assertEqual(collector.counters["stc.cells_written"], 4 * nb_tiles)
+        degrees = sum(collector.counters[f"stc.nodes.degree_{degree}"] for degree in range(5))
+        self.assertEqual(degrees, nb_tiles)
+
+        trace = json.loads(json.dumps(collector.get_chrome_trace()))
+        self.assertEqual(
+            sum(event["ph"] == "X" for event in trace["traceEvents"]), len(collector.events)
+        )
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "stc.prof")
+            collector.write_pstats(path)
+            stats = pstats.Stats(path, stream=io.StringIO())
+            self.assertIn(("hpgg", 0, "AlgorithmSTC"), stats.stats)
+            self.assertIn(("hpgg", 0, "AlgorithmSTC"), stats.stats[("hpgg", 0, "SkeletonSTC")][4])
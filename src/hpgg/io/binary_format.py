@@ -0,0 +1,310 @@
+"""
+Binary datasets of tile grid graphs, with their CellPathMatrix (optional).
+
+A dataset is a data file and an index file (the data path + ".idx").
+
+The data file is a header (magic, version) followed by the records, appended
+one after the other. A record is:
+- rows, cols (uint32, in tiles), flags (uint8, HAS_CELL_PATH) and 3 bytes of padding.
+- the tile mask, bit-packed (8 tiles per byte, row-major), see `TileGridGraph.to_packed`.
+- if HAS_CELL_PATH, the CellPath values of the 2rows x 2cols cells, 4 bits per cell.
+
+The index file is the offset of each record (uint64), so that the record k
+is read from the memory-mapped data file without reading the others.
+Both files are only appended to. A missing index, or one that does not end
+at the end of the data file (ex: a writer killed between the writes of the
+two files), is rebuilt by scanning the record headers.
+"""
+import os
+import struct
+
+import numpy as np
+
+from hpgg.grid_graphs.cell_grid_graph import CellPathMatrix
+from hpgg.grid_graphs.tile_grid_graphs import TileGridGraph
+
+MAGIC = b"HPGGDATA"
+VERSION = 1
+FILE_HEADER = struct.Struct("<8sI4x")
+RECORD_HEADER = struct.Struct("<IIB3x")
+HAS_CELL_PATH = 1
+
+
+def pack_cell_codes(codes: np.ndarray) -> np.ndarray:
+    """
+    Pack an array of CellPath values, 4 bits per cell (value + 1, so NO_CELL is 0),
+    2 cells per byte, row-major.
+    """
+    nibbles = (codes.astype(np.uint8) + 1).ravel() & 0x0F
+    if len(nibbles) % 2:
+        nibbles = np.append(nibbles, np.uint8(0))
+    return (nibbles[0::2] << 4) | nibbles[1::2]
+
+
+def unpack_cell_codes(packed: np.ndarray, rows: int, cols: int) -> np.ndarray:
+    """
+    Unpack a rows x cols array of CellPath values packed by `pack_cell_codes`.
+    """
+    nibbles = np.empty(2 * len(packed), dtype=np.uint8)
+    nibbles[0::2] = packed >> 4
+    nibbles[1::2] = packed & 0x0F
+    return (nibbles[:rows * cols].astype(np.int8) - 1).reshape(rows, cols)
+
+
+def get_record_size(rows: int, cols: int, flags: int) -> int:
+    size = RECORD_HEADER.size + (rows * cols + 7) // 8
+    if flags & HAS_CELL_PATH:
+        size += 2 * rows * cols
+    return size
+
+
+def get_index_path(path: str) -> str:
+    return path + ".idx"
+
+
+def build_index(path: str) -> np.ndarray:
+    """
+    Get the offsets of the records of a data file, by scanning the record headers.
+    """
+    offsets = []
+    size = os.path.getsize(path)
+    with open(path, "rb") as file:
+        _check_file_header(file.read(FILE_HEADER.size))
+        offset = FILE_HEADER.size
+        while offset < size:
+            file.seek(offset)
+            rows, cols, flags = RECORD_HEADER.unpack(file.read(RECORD_HEADER.size))
+            offsets.append(offset)
+            offset += get_record_size(rows, cols, flags)
+    if offset != size:
+        raise Exception(f"The last record of {path} is truncated.")
+    return np.array(offsets, dtype="<u8")
+
+
+def _is_index_consistent(index_path: str, data: np.ndarray) -> bool:
+    """
+    Check that the index ends with the last record of the data file.
+    """
+    index_size = os.path.getsize(index_path)
+    if index_size % 8:
+        return False
+    if index_size == 0:
+        return len(data) == FILE_HEADER.size
+    with open(index_path, "rb") as file:
+        file.seek(index_size - 8)
+        last_offset = struct.unpack("<Q", file.read(8))[0]
+    if not FILE_HEADER.size <= last_offset <= len(data) - RECORD_HEADER.size:
+        return False
+    rows, cols, flags = RECORD_HEADER.unpack_from(data, last_offset)
+    return last_offset + get_record_size(rows, cols, flags) == len(data)
+
+
+def _check_file_header(header: bytes):
+    if len(header) < FILE_HEADER.size:
+        raise Exception("The file is not a dataset (no header).")
+    magic, version = FILE_HEADER.unpack(header)
+    if magic != MAGIC:
+        raise Exception("The file is not a dataset (wrong magic).")
+    if version != VERSION:
+        raise Exception(f"Unsupported dataset version {version}.")
+
+
+class BinaryDatasetWriter():
+    """
+    Append tile grid graphs (and their CellPathMatrix) to a dataset,
+    which is created if it does not exist.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        index_path = get_index_path(path)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            with open(path, "wb") as file:
+                file.write(FILE_HEADER.pack(MAGIC, VERSION))
+            open(index_path, "wb").close()
+        elif (not os.path.exists(index_path)
+                or not _is_index_consistent(index_path, np.memmap(path, dtype=np.uint8, mode="r"))):
+            build_index(path).tofile(index_path)
+
+        self.data_file = open(path, "ab")
+        self.index_file = open(index_path, "ab")
+        self.offset = self.data_file.tell()
+
+    def __enter__(self) -> "BinaryDatasetWriter":
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def close(self):
+        self.data_file.close()
+        self.index_file.close()
+
+    def append(self, tile_grid_graph: TileGridGraph, cell_path_matrix: CellPathMatrix | None = None):
+        rows, cols = tile_grid_graph.n, tile_grid_graph.m
+        flags = 0
+        parts = [tile_grid_graph.to_packed().tobytes()]
+        if cell_path_matrix is not None:
+            if cell_path_matrix.codes.shape != (2 * rows, 2 * cols):
+                raise Exception("The CellPathMatrix does not match the tile grid graph.")
+            flags |= HAS_CELL_PATH
+            parts.append(pack_cell_codes(cell_path_matrix.codes).tobytes())
+        record = RECORD_HEADER.pack(rows, cols, flags) + b"".join(parts)
+
+        self.data_file.write(record)
+        self.index_file.write(struct.pack("<Q", self.offset))
+        self.offset += len(record)
+
+
+class BinaryDataset():
+    """
+    Random access to the records of a dataset, through a memory map of the
+    data file. The records appended after opening it are not seen.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.data = np.memmap(path, dtype=np.uint8, mode="r")
+        _check_file_header(self.data[:FILE_HEADER.size].tobytes())
+
+        index_path = get_index_path(path)
+        if len(self.data) == FILE_HEADER.size:
+            self.offsets = np.zeros(0, dtype="<u8")
+        elif os.path.exists(index_path) and _is_index_consistent(index_path, self.data):
+            self.offsets = np.memmap(index_path, dtype="<u8", mode="r")
+        else:
+            self.offsets = build_index(path)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __get_record(self, k: int) -> tuple[int, int, int, int]:
+        if not -len(self) <= k < len(self):
+            raise IndexError(f"No record {k} in a dataset of {len(self)} records.")
+        offset = int(self.offsets[k])
+        rows, cols, flags = RECORD_HEADER.unpack_from(self.data, offset)
+        return rows, cols, flags, offset + RECORD_HEADER.size
+
+    def get_mask(self, k: int) -> np.ndarray:
+        """
+        Get the tile mask (n x m booleans) of the record k.
+        """
+        rows, cols, _, offset = self.__get_record(k)
+        packed = self.data[offset:offset + (rows * cols + 7) // 8]
+        return np.unpackbits(packed, count=rows * cols).reshape(rows, cols).astype(bool)
+
+    def get_tile_grid_graph(self, k: int) -> TileGridGraph:
+        return TileGridGraph.from_mask(self.get_mask(k), check_connected=False)
+
+    def get_cell_path_matrix(self, k: int) -> CellPathMatrix | None:
+        """
+        Get the CellPathMatrix of the record k, or None if it has none.
+        """
+        rows, cols, flags, offset = self.__get_record(k)
+        if not flags & HAS_CELL_PATH:
+            return None
+        offset += (rows * cols + 7) // 8
+        packed = self.data[offset:offset + 2 * rows * cols]
+        return CellPathMatrix.from_codes(unpack_cell_codes(packed, 2 * rows, 2 * cols))
+
+    def __getitem__(self, k: int) -> tuple[TileGridGraph, CellPathMatrix | None]:
+        return self.get_tile_grid_graph(k), self.get_cell_path_matrix(k)
+
+    def __iter__(self):
+        for k in range(len(self)):
+            yield self[k]
+
+
+# Tests
+import unittest
+class TestBinaryFormat(unittest.TestCase):
+    def test_write_and_read(self):
+        """
+        Test that the records are read back, in any order, across several writers.
+        """
+        import random
+        import tempfile
+        from hpgg.grid_graphs.cell_grid_graph import CellGridGraph
+        from hpgg.paths.stc_algo import AlgorithmSTC
+
+        random.seed(0)
+        instances = []
+        for k in range(20):
+            grid = TileGridGraph(random.randint(1, 9), random.randint(1, 9))
+            grid.add_holes(random.randint(0, 5), keep_connected=True)
+            cell_path_matrix = AlgorithmSTC(CellGridGraph(grid)) if k % 3 else None
+            instances.append((grid, cell_path_matrix))
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "dataset.bin")
+            with BinaryDatasetWriter(path) as writer:
+                for grid, cell_path_matrix in instances[:10]:
+                    writer.append(grid, cell_path_matrix)
+            self.assertEqual(len(BinaryDataset(path)), 10)
+            with BinaryDatasetWriter(path) as writer:
+                for grid, cell_path_matrix in instances[10:]:
+                    writer.append(grid, cell_path_matrix)
+
+            dataset = BinaryDataset(path)
+            self.assertEqual(len(dataset), 20)
+            for k in reversed(range(20)):
+                grid, cell_path_matrix = dataset[k]
+                self.assertTrue(np.array_equal(grid.tile_exists, instances[k][0].tile_exists))
+                if instances[k][1] is None:
+                    self.assertIsNone(cell_path_matrix)
+                else:
+                    self.assertTrue(np.array_equal(cell_path_matrix.codes, instances[k][1].codes))
+            with self.assertRaises(IndexError):
+                dataset.get_mask(20)
+
+            # the index is rebuilt from the data file
+            offsets = np.array(dataset.offsets)
+            del dataset
+            os.remove(get_index_path(path))
+            self.assertTrue(np.array_equal(BinaryDataset(path).offsets, offsets))
+
+    def test_inconsistent_index(self):
+        """
+        Test that an empty or truncated index is rebuilt, by the reader and by
+        the writer, and that a truncated record is an error.
+        """
+        import tempfile
+
+        grid = TileGridGraph(3, 4)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "dataset.bin")
+            index_path = get_index_path(path)
+            with BinaryDatasetWriter(path) as writer:
+                for _ in range(5):
+                    writer.append(grid)
+            offsets = np.fromfile(index_path, dtype="<u8")
+
+            for index in (b"", offsets[:3].tobytes(), offsets.tobytes()[:-3]):
+                with open(index_path, "wb") as file:
+                    file.write(index)
+                dataset = BinaryDataset(path)
+                self.assertTrue(np.array_equal(dataset.offsets, offsets))
+                del dataset
+
+            with open(index_path, "wb") as file:
+                file.write(offsets[:2].tobytes())
+            with BinaryDatasetWriter(path) as writer:
+                writer.append(grid)
+            dataset = BinaryDataset(path)
+            self.assertEqual(len(dataset), 6)
+            self.assertTrue(np.array_equal(dataset.get_mask(5), grid.tile_exists))
+            del dataset
+
+            with open(path, "ab") as file:
+                file.write(RECORD_HEADER.pack(3, 4, 0))
+            with self.assertRaisesRegex(Exception, "truncated"):
+                BinaryDataset(path)
+
+    def test_cell_codes_packing(self):
+        """
+        Test that the packing of the CellPath values is lossless.
+        """
+        rng = np.random.default_rng(0)
+        for rows, cols in ((1, 1), (3, 5), (8, 8)):
+            codes = rng.integers(-1, 7, size=(rows, cols)).astype(np.int8)
+            packed = pack_cell_codes(codes)
+            self.assertEqual(len(packed), (rows * cols + 1) // 2)
+            self.assertTrue(np.array_equal(unpack_cell_codes(packed, rows, cols), codes))
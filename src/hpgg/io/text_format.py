@@ -0,0 +1,164 @@
+"""
+Text files of tile grid graphs: one line per row of tiles, 'x' for a tile
+and '.' for a hole, spaces and tabs being ignored. A file holds many grids,
+separated by blank lines. The lines starting with '#' are comments.
+
+Ex:
+# instance 0
+x x x .
+. x x x
+
+x x
+x x
+
+The files are read line by line and each grid is converted to its tile mask
+with a single array operation, so a corpus is parsed as a lazy stream.
+"""
+from typing import BinaryIO, Iterator
+
+import numpy as np
+
+from hpgg.grid_graphs.tile_grid_graphs import TileGridGraph
+
+TILE = ord("x")
+HOLE = ord(".")
+WHITESPACE = b" \t\r\n"
+
+
+def _get_column(line: bytes, position: int) -> int:
+    """
+    Get the column (from 1) in the raw line of the character at the given
+    position in the line without whitespace.
+    """
+    seen = 0
+    for column, character in enumerate(line, start=1):
+        if character not in WHITESPACE:
+            if seen == position:
+                return column
+            seen += 1
+    return len(line) + 1
+
+
+def parse_tile_mask(lines: list[bytes], first_line_number: int = 1, name: str = "<text>") -> np.ndarray:
+    """
+    Convert the lines of a grid to its n x m boolean tile mask.
+    Raises an Exception giving the line and column of a ragged line or of
+    a character that is not a tile or a hole.
+    """
+    rows = [line.translate(None, WHITESPACE) for line in lines]
+    m = len(rows[0])
+    for k, row in enumerate(rows):
+        if len(row) != m:
+            raise Exception(
+                f"{name}:{first_line_number + k}: row of {len(row)} tiles, expected {m} as in the first row."
+            )
+
+    characters = np.frombuffer(b"".join(rows), dtype=np.uint8).reshape(len(rows), m)
+    tiles = characters == TILE
+    invalid = ~tiles & (characters != HOLE)
+    if invalid.any():
+        k, position = (int(index) for index in np.argwhere(invalid)[0])
+        column = _get_column(lines[k], position)
+        raise Exception(
+            f"{name}:{first_line_number + k}:{column}: "
+            f"unexpected character {chr(characters[k, position])!r}, expected 'x' or '.'."
+        )
+    return tiles
+
+
+def iter_grid_lines(source: str | BinaryIO) -> Iterator[tuple[list[bytes], int, str]]:
+    """
+    Stream the lines of the grids of a file (a path or a binary file), without
+    parsing them, as (lines, number of the first line, name of the file).
+    """
+    if isinstance(source, str):
+        with open(source, "rb") as file:
+            yield from iter_grid_lines(file)
+        return
+
+    name = getattr(source, "name", "<stream>")
+    lines: list[bytes] = []
+    first_line_number = 0
+    for line_number, line in enumerate(source, start=1):
+        stripped = line.strip()
+        if stripped.startswith(b"#"):
+            continue
+        if stripped:
+            if not lines:
+                first_line_number = line_number
+            lines.append(line)
+        elif lines:
+            yield lines, first_line_number, name
+            lines = []
+    if lines:
+        yield lines, first_line_number, name
+
+
+def iter_tile_masks(source: str | BinaryIO) -> Iterator[np.ndarray]:
+    """
+    Stream the tile masks of the grids of a file (a path or a binary file).
+    """
+    for lines, first_line_number, name in iter_grid_lines(source):
+        yield parse_tile_mask(lines, first_line_number, name)
+
+
+def iter_tile_grid_graphs(source: str | BinaryIO, check_connected: bool = True) -> Iterator[TileGridGraph]:
+    """
+    Stream the tile grid graphs of a file (a path or a binary file).
+    With check_connected, raises an Exception at the first grid that is not connected.
+    """
+    for mask in iter_tile_masks(source):
+        yield TileGridGraph.from_mask(mask, check_connected)
+
+
+def tile_grid_graphs_to_text(tile_grid_graphs: list[TileGridGraph]) -> str:
+    """
+    Get the text of grids, separated by blank lines.
+    """
+    return "\n".join(
+        "".join(" ".join("x" if tile else "." for tile in row) + "\n" for row in grid.tile_exists.tolist())
+        for grid in tile_grid_graphs
+    )
+
+
+# Tests
+import unittest
+class TestTextFormat(unittest.TestCase):
+    def test_stream_of_grids(self):
+        """
+        Test that the grids of a file are read back, with comments and
+        surrounding blank lines.
+        """
+        import io
+        import random
+
+        random.seed(0)
+        grids = []
+        for k in range(10):
+            grid = TileGridGraph(random.randint(1, 8), random.randint(1, 8))
+            grid.add_holes(random.randint(0, 4), keep_connected=True)
+            grids.append(grid)
+        text = "# corpus\n\n" + tile_grid_graphs_to_text(grids).replace("\n\n", "\n\n\n# next\n") + "\n\n"
+
+        parsed = list(iter_tile_grid_graphs(io.BytesIO(text.encode())))
+        self.assertEqual(len(parsed), len(grids))
+        for grid, expected in zip(parsed, grids):
+            self.assertTrue(np.array_equal(grid.tile_exists, expected.tile_exists))
+
+    def test_errors(self):
+        """
+        Test that malformed grids are reported at their line and column.
+        """
+        import io
+
+        with self.assertRaisesRegex(Exception, r":5: row of 2 tiles, expected 3"):
+            list(iter_tile_masks(io.BytesIO(b"x x\n\nx x x\nx . x\nx x\n")))
+        with self.assertRaisesRegex(Exception, r":2:3: unexpected character 'o'"):
+            list(iter_tile_masks(io.BytesIO(b"x x\nx o\n")))
+        with self.assertRaisesRegex(Exception, "not connected"):
+            list(iter_tile_grid_graphs(io.BytesIO(b"x .\n. x\n")))
+
+        # the grids after a malformed one can still be read
+        grids = list(iter_grid_lines(io.BytesIO(b"x o\n\nx x\n")))
+        self.assertEqual([first_line_number for _, first_line_number, _ in grids], [1, 3])
+        self.assertTrue(parse_tile_mask(*grids[1]).all())
@@ -0,0 +1,335 @@
+"""
+Ordered extraction of the Hamiltonian cycle described by a CellPathMatrix.
+
+The glyphs only say which sides of each cell the path crosses.
+To get a visiting order, the cycle is first oriented: for a counterclockwise
+traversal, the inside of the cycle is always on the left of each move.
+Which grid corners are inside the cycle is known from the parity of the
+vertical path segments on their left (ray casting), with one cumulative xor.
+The successors are then ranked from the start cell (ruling set + pointer
+jumping), so the whole extraction runs at array speed.
+"""
+from typing import Iterator
+
+import numpy as np
+
+from hpgg.grid_graphs.cell_grid_graph import CellPathMatrix
+from hpgg.grid_graphs.tile_grid_graphs import EAST, NORTH, OPPOSITE_DIRECTION, SOUTH, WEST
+
+DIRECTIONS = ("ccw", "cw")
+
+NOT_A_CYCLE_MESSAGE = "The CellPathMatrix is not a single Hamiltonian cycle."
+
+
+def get_inside_corners(sides: np.ndarray) -> np.ndarray:
+    """
+    Get which grid corners are inside the cycle, as a (rows+1) x (cols+1)
+    boolean array. Corner (a, b) is the top-left corner of cell (a, b).
+    """
+    rows, cols = sides.shape
+    # vertical path segments crossed by a ray going west from the corners of row a
+    crossings = np.zeros((rows + 1, cols + 1), dtype=np.uint8)
+    crossings[1:, 1:] = (sides & SOUTH) != 0
+    return np.bitwise_xor.accumulate(crossings, axis=1).astype(bool)
+
+
+def get_cycle_successors(
+    cell_path_matrix: CellPathMatrix,
+    direction: str = "ccw",
+) -> np.ndarray:
+    """
+    Get the flat index (x * cols + y) of the next cell of each cell along the cycle,
+    or -1 for the cells that the path does not go through.
+    direction is "ccw" (counterclockwise, as drawn by `print`) or "cw".
+    """
+    if direction not in DIRECTIONS:
+        raise Exception(f"Unknown direction '{direction}', expected one of {DIRECTIONS}.")
+
+    sides = cell_path_matrix.get_sides()
+    rows, cols = sides.shape
+    inside = get_inside_corners(sides)
+
+    # for each move, the corner on the left of the move
+    # (inside the cycle iff the move is counterclockwise)
+    left_is_inside = {
+        NORTH: inside[:-1, :-1],
+        EAST: inside[:-1, 1:],
+        SOUTH: inside[1:, 1:],
+        WEST: inside[1:, :-1],
+    }
+    offsets = {NORTH: -cols, EAST: 1, SOUTH: cols, WEST: -1}
+
+    # the path must stay inside the grid
+    if (
+        np.any(sides[0, :] & NORTH) or np.any(sides[-1, :] & SOUTH)
+        or np.any(sides[:, 0] & WEST) or np.any(sides[:, -1] & EAST)
+    ):
+        raise Exception(NOT_A_CYCLE_MESSAGE)
+
+    successors = np.full(rows * cols, -1, dtype=np.int64)
+    flat_sides = sides.ravel()
+    for move, forward in left_is_inside.items():
+        if direction == "cw":
+            forward = ~forward
+        cells = np.flatnonzero((flat_sides & move).astype(bool) & forward.ravel())
+        # the next cell must join back
+        if np.any((flat_sides[cells + offsets[move]] & OPPOSITE_DIRECTION[move]) == 0):
+            raise Exception(NOT_A_CYCLE_MESSAGE)
+        successors[cells] = cells + offsets[move]
+
+    # each cell of the path must have exactly one forward side
+    if np.count_nonzero(successors >= 0) != np.count_nonzero(flat_sides):
+        raise Exception(NOT_A_CYCLE_MESSAGE)
+    return successors
+
+
+def get_cycle_order(
+    cell_path_matrix: CellPathMatrix,
+    start: tuple[int, int] | None = None,
+    direction: str = "ccw",
+) -> np.ndarray:
+    """
+    Get the flat indices of the cells, in the order of the cycle.
+    By default, the cycle starts at the first cell of the path (row-major order).
+    """
+    successors = get_cycle_successors(cell_path_matrix, direction)
+    cols = cell_path_matrix.cols
+    path_cells = np.flatnonzero(successors >= 0)
+    nb_cells = len(path_cells)
+    if nb_cells == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    index_type = np.int32 if nb_cells < 2**31 else np.int64
+    positions = np.full(len(successors), -1, dtype=index_type)
+    positions[path_cells] = np.arange(nb_cells, dtype=index_type)
+    next_positions = positions[successors[path_cells]]
+    del successors
+
+    # each cell must be reached exactly once
+    if np.any(np.bincount(next_positions, minlength=nb_cells) != 1):
+        raise Exception(NOT_A_CYCLE_MESSAGE)
+
+    if start is None:
+        start_position = 0
+    else:
+        start_position = int(positions[start[0] * cols + start[1]])
+        if start_position < 0:
+            raise Exception(f"The start cell {start} is not on the path.")
+    del positions
+
+    ranks = rank_cycle(next_positions, start_position)
+    order = np.empty(nb_cells, dtype=path_cells.dtype)
+    order[ranks] = path_cells
+    return order
+
+
+def pick_rulers(nb_nodes: int, spacing: int) -> np.ndarray:
+    """
+    Pick about one node in spacing, at random (with a fixed seed).
+    """
+    rng = np.random.default_rng(0)
+    return rng.random(nb_nodes) < 1 / spacing
+
+
+def walk_to_rulers(
+    next_positions: np.ndarray,
+    is_ruler: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Walk forward from all the rulers together, until each one reaches the next ruler.
+
+    Returns:
+    - ruler_indices: the index of each ruler among the rulers (-1 for other nodes).
+    - ruler_of: the ruler each node was reached from (-1 if no ruler reached it:
+      the node is on a cycle without any ruler).
+    - offsets: the distance from that ruler to each node.
+    - next_rulers: the next ruler of each ruler, followed by a sentinel slot.
+    - gaps: the distance from each ruler to the next one, followed by a sentinel 0.
+    """
+    nb_nodes = len(next_positions)
+    index_type = next_positions.dtype
+    rulers = np.flatnonzero(is_ruler).astype(index_type)
+    nb_rulers = len(rulers)
+    ruler_indices = np.full(nb_nodes, -1, dtype=index_type)
+    ruler_indices[rulers] = np.arange(nb_rulers, dtype=index_type)
+
+    ruler_of = np.full(nb_nodes, -1, dtype=index_type)
+    offsets = np.zeros(nb_nodes, dtype=index_type)
+    ruler_of[rulers] = ruler_indices[rulers]
+    next_rulers = np.full(nb_rulers + 1, nb_rulers, dtype=index_type)
+    gaps = np.zeros(nb_rulers + 1, dtype=np.int64)
+
+    owners = np.arange(nb_rulers, dtype=index_type)
+    current = next_positions[rulers]
+    distance = 1
+    while len(current) > 0:
+        arrived = is_ruler[current]
+        next_rulers[owners[arrived]] = ruler_indices[current[arrived]]
+        gaps[owners[arrived]] = distance
+        walking = ~arrived
+        current, owners = current[walking], owners[walking]
+        ruler_of[current] = owners
+        offsets[current] = distance
+        current = next_positions[current]
+        distance += 1
+
+    return ruler_indices, ruler_of, offsets, next_rulers, gaps
+
+
+def count_permutation_cycles(next_positions: np.ndarray) -> int:
+    """
+    Count the cycles of a permutation by pointer jumping: after log2(N) rounds,
+    each node knows the smallest node of its cycle.
+    """
+    nb_nodes = len(next_positions)
+    smallest = np.arange(nb_nodes, dtype=next_positions.dtype)
+    for _ in range(int(nb_nodes).bit_length()):
+        smallest = np.minimum(smallest, smallest[next_positions])
+        next_positions = next_positions[next_positions]
+    return int(np.count_nonzero(smallest == np.arange(nb_nodes)))
+
+
+def count_cycles(
+    next_positions: np.ndarray,
+    spacing: int = 64,
+) -> int:
+    """
+    Count the cycles of a permutation in O(N) work.
+    The rulers are linked into a smaller permutation (one cycle per cycle
+    that contains a ruler), and the few nodes on cycles without rulers
+    form another small permutation.
+    """
+    nb_nodes = len(next_positions)
+    if nb_nodes == 0:
+        return 0
+    is_ruler = pick_rulers(nb_nodes, spacing)
+    _, ruler_of, _, next_rulers, _ = walk_to_rulers(next_positions, is_ruler)
+    nb_cycles = count_permutation_cycles(next_rulers[:-1])
+
+    # cycles without any ruler
+    rest = np.flatnonzero(ruler_of < 0)
+    if len(rest) > 0:
+        rest_positions = np.full(nb_nodes, -1, dtype=next_positions.dtype)
+        rest_positions[rest] = np.arange(len(rest), dtype=next_positions.dtype)
+        nb_cycles += count_permutation_cycles(rest_positions[next_positions[rest]])
+    return nb_cycles
+
+
+def rank_cycle(
+    next_positions: np.ndarray,
+    start: int,
+    spacing: int = 64,
+) -> np.ndarray:
+    """
+    Get the rank of each node along the cycle given by next_positions
+    (a permutation), starting from the node start.
+
+    About one node in spacing is picked as a ruler. All the rulers walk
+    forward together until they reach the next ruler, which ranks every node
+    relative to its ruler in O(N) total work. The few rulers are then ranked
+    by pointer jumping.
+    """
+    nb_nodes = len(next_positions)
+    index_type = next_positions.dtype
+
+    is_ruler = pick_rulers(nb_nodes, spacing)
+    is_ruler[start] = True
+    ruler_indices, ruler_of, offsets, next_rulers, gaps = walk_to_rulers(next_positions, is_ruler)
+    nb_rulers = len(next_rulers) - 1
+
+    if np.any(ruler_of < 0):
+        raise Exception(NOT_A_CYCLE_MESSAGE)
+
+    # weighted list ranking of the rulers, with the cycle broken before the start
+    # (index nb_rulers is a sentinel after the last ruler)
+    start_ruler = ruler_indices[start]
+    last_ruler = np.flatnonzero(next_rulers[:nb_rulers] == start_ruler)[0]
+    next_rulers[last_ruler] = nb_rulers
+    next_rulers[nb_rulers] = nb_rulers
+    remaining = gaps.copy()
+    for _ in range(int(nb_rulers).bit_length() + 1):
+        remaining += remaining[next_rulers]
+        next_rulers = next_rulers[next_rulers]
+    if np.any(next_rulers != nb_rulers):
+        raise Exception(NOT_A_CYCLE_MESSAGE)
+    ruler_ranks = (nb_nodes - remaining[:nb_rulers]).astype(index_type)
+
+    return ruler_ranks[ruler_of] + offsets
+
+
+def extract_cycle(
+    cell_path_matrix: CellPathMatrix,
+    start: tuple[int, int] | None = None,
+    direction: str = "ccw",
+) -> np.ndarray:
+    """
+    Get the Hamiltonian cycle of a CellPathMatrix, as a contiguous (N, 2)
+    int32 array of cell coordinates (x, y), in visiting order.
+    The start cell is not repeated at the end.
+    """
+    order = get_cycle_order(cell_path_matrix, start, direction)
+    return flat_indices_to_coordinates(order, cell_path_matrix.cols)
+
+
+def iter_cycle(
+    cell_path_matrix: CellPathMatrix,
+    chunk_size: int = 1 << 16,
+    start: tuple[int, int] | None = None,
+    direction: str = "ccw",
+) -> Iterator[np.ndarray]:
+    """
+    Stream the Hamiltonian cycle of a CellPathMatrix as (k, 2) int32 arrays
+    of at most chunk_size cells. Only the flat visiting order is kept
+    in memory, the coordinates are computed chunk by chunk.
+    """
+    order = get_cycle_order(cell_path_matrix, start, direction)
+    for chunk_start in range(0, len(order), chunk_size):
+        yield flat_indices_to_coordinates(order[chunk_start:chunk_start + chunk_size], cell_path_matrix.cols)
+
+
+def flat_indices_to_coordinates(flat_indices: np.ndarray, cols: int) -> np.ndarray:
+    coordinates = np.empty((len(flat_indices), 2), dtype=np.int32)
+    coordinates[:, 0], coordinates[:, 1] = np.divmod(flat_indices, cols)
+    return coordinates
+
+
+# Tests
+import unittest
+class TestCycleExtraction(unittest.TestCase):
+    def test_extract_small_cycle(self):
+        """
+        Test the order, start and direction of an extracted cycle.
+          ┌──┐
+          │┌─┘
+        ┌─┘│
+        └──┘
+        """
+        from hpgg.grid_graphs.cell_grid_graph import CellGridGraph
+        from hpgg.grid_graphs.tile_grid_graphs import tile_grid_graph_from_text
+        from hpgg.paths.stc_algo import AlgorithmSTC
+
+        grid = tile_grid_graph_from_text(". x x\nx x .")
+        cell_path_matrix = AlgorithmSTC(CellGridGraph(grid))
+
+        cycle = extract_cycle(cell_path_matrix)
+        self.assertEqual(cycle.dtype, np.int32)
+        self.assertEqual(cycle[:5].tolist(), [[0, 2], [1, 2], [2, 2], [2, 1], [2, 0]])
+        self.assertEqual(len(cycle), 16)
+
+        reverse = extract_cycle(cell_path_matrix, start=(0, 2), direction="cw")
+        self.assertEqual(reverse[1:].tolist(), cycle[::-1][:-1].tolist())
+
+        chunks = list(iter_cycle(cell_path_matrix, chunk_size=5))
+        self.assertEqual([len(chunk) for chunk in chunks], [5, 5, 5, 1])
+        self.assertEqual(np.concatenate(chunks).tolist(), cycle.tolist())
+
+    def test_broken_cycle_is_rejected(self):
+        """
+        Test that a CellPathMatrix with two cycles is rejected.
+        """
+        codes = np.array([
+            [6, 3, 6, 3],
+            [5, 4, 5, 4],
+        ], dtype=np.int8)
+        with self.assertRaises(Exception):
+            extract_cycle(CellPathMatrix.from_codes(codes))
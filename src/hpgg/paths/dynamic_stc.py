@@ -0,0 +1,706 @@
+"""
+STC cycle kept up to date while tiles are removed and added one at a time.
+
+The session keeps the skeleton masks, the CellPathMatrix, and the order of
+the cells along the cycle. Each operation only rewrites the cells of the
+tiles whose mask changed:
+- adding a tile links it to one existing neighbour, as a leaf of the tree.
+- removing a tile cuts the tree into one piece per tree neighbour of the
+  tile, and they are joined again with edges near the tile.
+
+The STC cycle goes around the skeleton, so it is an Euler tour of the tree:
+once the cells of the removed tile are taken out, the cycle is cut into one
+arc per piece, and the piece of a tile is given by the position of its cells
+along the cycle. The replacement edges are the first edges between two
+pieces found by a breadth-first search of the tiles from the removed tile.
+
+A removal that disconnects the grid is rejected before any search of the
+tiles. A locally simple tile (see `hpgg.grid_graphs.articulation`) is never
+a cut. Otherwise, the hole runs of its ring are searched in lockstep through
+the holes (8-connected, with the outside of the grid as a single hole): the
+tile is a cut iff two of them are connected. Both searches stop as soon as
+they conclude, so their cost depends on the holes and the detour around the
+tile, not on the size of the grid.
+
+The order along the cycle is an implicit treap (CycleOrder), so positions,
+splits and concatenations cost O(log N). After an update, the new cycle is
+followed through the changed cells, and the runs of unchanged cells in
+between are spliced in the new order. The cost of an update then depends on
+the number of changed cells, and only logarithmically on the size of the grid.
+"""
+import bisect
+import random
+from collections import deque
+from dataclasses import dataclass
+
+import numpy as np
+
+from hpgg import instrumentation
+from hpgg.grid_graphs.articulation import is_locally_simple
+from hpgg.grid_graphs.cell_grid_graph import CELL_PATH_SIDES, CellPath, CellPathMatrix
+from hpgg.grid_graphs.tile_grid_graphs import (
+    DIRECTION_OFFSETS, EAST, OPPOSITE_DIRECTION, SOUTH, TileGridGraph
+)
+from hpgg.paths.cycle import extract_cycle
+from hpgg.paths.skeleton import spanning_tree_masks
+from hpgg.paths.stc_algo import STC_PATH_CODES, SkeletonSTC, get_stc_cell_codes
+
+NO_NODE = -1
+# the holes outside of the grid, as a single hole
+OUTSIDE = (-1, -1)
+# the 8 tiles around a tile, in cyclic order from the north one
+RING_OFFSETS = ((-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1))
+
+
+@dataclass
+class CellPathDiff:
+    """
+    The cells changed by an operation, as a (k, 2) array of (x, y),
+    with their CellPath values before and after.
+    """
+    cells: np.ndarray
+    old_codes: np.ndarray
+    new_codes: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    def apply(self, cell_path_matrix: CellPathMatrix):
+        """
+        Apply the diff to a copy of the CellPathMatrix before the operation.
+        """
+        cell_path_matrix.codes[self.cells[:, 0], self.cells[:, 1]] = self.new_codes
+
+
+class CycleOrder():
+    """
+    A sequence of nodes (the flat indices of the cells, in cycle order),
+    stored as an implicit treap: a binary tree in sequence order, balanced
+    by random priorities. Each node knows its parent, so its position is
+    found by walking up to the root.
+    """
+    def __init__(self, nb_nodes: int, sequence: list[int], seed: int = 0):
+        self.rng = random.Random(seed)
+        self.left = [NO_NODE] * nb_nodes
+        self.right = [NO_NODE] * nb_nodes
+        self.parent = [NO_NODE] * nb_nodes
+        self.size = [1] * nb_nodes
+        self.priority = [0.0] * nb_nodes
+        self.root = self.__build(sequence)
+
+    def __len__(self) -> int:
+        return self.size[self.root] if self.root != NO_NODE else 0
+
+    def reset_node(self, node: int):
+        self.left[node] = self.right[node] = self.parent[node] = NO_NODE
+        self.size[node] = 1
+        self.priority[node] = self.rng.random()
+
+    def __build(self, sequence: list[int]) -> int:
+        """
+        Build the treap of a sequence in linear time (Cartesian tree of the
+        priorities, with a stack of the right spine).
+        """
+        spine: list[int] = []
+        for node in sequence:
+            self.reset_node(node)
+            last = NO_NODE
+            while spine and self.priority[spine[-1]] < self.priority[node]:
+                last = spine.pop()
+            if last != NO_NODE:
+                self.left[node] = last
+                self.parent[last] = node
+            if spine:
+                self.right[spine[-1]] = node
+                self.parent[node] = spine[-1]
+            spine.append(node)
+        # sizes, from the leaves
+        for node in reversed(self.__inorder_parents_first(spine[0] if spine else NO_NODE)):
+            self.__update(node)
+        return spine[0] if spine else NO_NODE
+
+    def __inorder_parents_first(self, root: int) -> list[int]:
+        nodes = []
+        stack = [root] if root != NO_NODE else []
+        while stack:
+            node = stack.pop()
+            nodes.append(node)
+            for child in (self.left[node], self.right[node]):
+                if child != NO_NODE:
+                    stack.append(child)
+        return nodes
+
+    def __update(self, node: int):
+        left, right = self.left[node], self.right[node]
+        self.size[node] = 1 + (self.size[left] if left != NO_NODE else 0) + (self.size[right] if right != NO_NODE else 0)
+
+    def __merge(self, a: int, b: int) -> int:
+        if a == NO_NODE:
+            return b
+        if b == NO_NODE:
+            return a
+        if self.priority[a] > self.priority[b]:
+            child = self.__merge(self.right[a], b)
+            self.right[a] = child
+            self.parent[child] = a
+            self.__update(a)
+            return a
+        child = self.__merge(a, self.left[b])
+        self.left[b] = child
+        self.parent[child] = b
+        self.__update(b)
+        return b
+
+    def __split(self, node: int, k: int) -> tuple[int, int]:
+        """
+        Split a treap into its first k nodes and the others.
+        """
+        if node == NO_NODE:
+            return NO_NODE, NO_NODE
+        left = self.left[node]
+        left_size = self.size[left] if left != NO_NODE else 0
+        if k <= left_size:
+            first, second = self.__split(left, k)
+            self.left[node] = second
+            if second != NO_NODE:
+                self.parent[second] = node
+            self.__update(node)
+            if first != NO_NODE:
+                self.parent[first] = NO_NODE
+            return first, node
+        first, second = self.__split(self.right[node], k - left_size - 1)
+        self.right[node] = first
+        if first != NO_NODE:
+            self.parent[first] = node
+        self.__update(node)
+        if second != NO_NODE:
+            self.parent[second] = NO_NODE
+        return node, second
+
+    def rank(self, node: int) -> int:
+        """
+        Get the position of a node in the sequence.
+        """
+        left = self.left[node]
+        position = self.size[left] if left != NO_NODE else 0
+        while self.parent[node] != NO_NODE:
+            parent = self.parent[node]
+            if self.right[parent] == node:
+                left = self.left[parent]
+                position += 1 + (self.size[left] if left != NO_NODE else 0)
+            node = parent
+        return position
+
+    def select(self, position: int) -> int:
+        """
+        Get the node at a position of the sequence.
+        """
+        node = self.root
+        while True:
+            left = self.left[node]
+            left_size = self.size[left] if left != NO_NODE else 0
+            if position < left_size:
+                node = left
+            elif position == left_size:
+                return node
+            else:
+                position -= left_size + 1
+                node = self.right[node]
+
+    def rotate(self, position: int):
+        """
+        Rotate the sequence so that it starts at a position.
+        """
+        first, second = self.__split(self.root, position)
+        self.root = self.__merge(second, first)
+        self.parent[self.root] = NO_NODE
+
+    def splice(self, runs: list[tuple[int, int]], new_sequence: list[tuple[int, int] | int]):
+        """
+        Rebuild the sequence from runs of the current one, given as (start, end)
+        positions (sorted, and disjoint), and new nodes. new_sequence lists
+        indices of runs as (run_index,) tuples and new nodes as ints. The nodes
+        that are not in a run are dropped.
+        """
+        run_roots = []
+        rest = self.root
+        offset = 0
+        for start, end in runs:
+            _, rest = self.__split(rest, start - offset)
+            run_root, rest = self.__split(rest, end - start + 1)
+            run_roots.append(run_root)
+            offset = end + 1
+
+        root = NO_NODE
+        for item in new_sequence:
+            if isinstance(item, tuple):
+                part = run_roots[item[0]]
+            else:
+                self.reset_node(item)
+                part = item
+            root = self.__merge(root, part)
+        if root != NO_NODE:
+            self.parent[root] = NO_NODE
+        self.root = root
+
+
+class DynamicSTC():
+    """
+    An STC cycle of a tile grid graph, updated in place when tiles are
+    removed or added. The tile grid graph is modified by the operations.
+    """
+    def __init__(
+        self,
+        tile_grid_graph: TileGridGraph,
+        masks: np.ndarray | None = None,
+        seed: int = 0,
+    ):
+        """
+        Start from the given skeleton masks, or from the default STC skeleton.
+        """
+        assert tile_grid_graph.check_connected_graph()
+        self.tile_grid_graph = tile_grid_graph
+        self.tile_exists = tile_grid_graph.tile_exists
+        if masks is None:
+            masks = spanning_tree_masks(self.tile_exists)
+        self.masks = masks.copy()
+        self.cell_path_matrix = CellPathMatrix.from_codes(
+            get_stc_cell_codes(self.tile_exists, self.masks)
+        )
+        self.cols = self.cell_path_matrix.cols
+        sequence = []
+        if self.tile_exists.any():
+            cycle = extract_cycle(self.cell_path_matrix)
+            sequence = (cycle[:, 0] * self.cols + cycle[:, 1]).tolist()
+        self.cycle_order = CycleOrder(self.cell_path_matrix.codes.size, sequence, seed)
+
+    def get_skeleton(self) -> SkeletonSTC:
+        return SkeletonSTC(self.tile_grid_graph, self.masks.copy())
+
+    def get_cycle(self) -> np.ndarray:
+        """
+        Get the cells in cycle order, as a (N, 2) int64 array of (x, y).
+        """
+        order = self.cycle_order
+        nodes = [order.select(position) for position in range(len(order))]
+        return np.stack(np.divmod(np.array(nodes, dtype=np.int64), self.cols), axis=1).reshape(-1, 2)
+
+    def __get_neighbours(self, i: int, j: int) -> list[tuple[int, int, int]]:
+        """
+        Get the existing neighbours of a tile, as (direction, i, j).
+        """
+        n, m = self.tile_exists.shape
+        neighbours = []
+        for direction, (dx, dy) in DIRECTION_OFFSETS.items():
+            x, y = i + dx, j + dy
+            if 0 <= x < n and 0 <= y < m and self.tile_exists[x, y]:
+                neighbours.append((direction, x, y))
+        return neighbours
+
+    def __link(self, i: int, j: int, direction: int):
+        dx, dy = DIRECTION_OFFSETS[direction]
+        self.masks[i, j] |= direction
+        self.masks[i + dx, j + dy] |= OPPOSITE_DIRECTION[direction]
+
+    def __unlink(self, i: int, j: int, direction: int):
+        dx, dy = DIRECTION_OFFSETS[direction]
+        self.masks[i, j] &= ~np.uint8(direction)
+        self.masks[i + dx, j + dy] &= ~np.uint8(OPPOSITE_DIRECTION[direction])
+
+    def __rewrite_tiles(self, tiles: set[tuple[int, int]]) -> CellPathDiff:
+        """
+        Rewrite the cells of some tiles, update the cycle order,
+        and get the cells that changed.
+        """
+        codes = self.cell_path_matrix.codes
+        cells, old_codes, new_codes = [], [], []
+        for i, j in sorted(tiles):
+            if self.tile_exists[i, j]:
+                tile_codes = STC_PATH_CODES[self.masks[i, j]].tolist()
+            else:
+                tile_codes = [CellPath.NO_CELL.value] * 4
+            for (dx, dy), code in zip(((0, 0), (0, 1), (1, 0), (1, 1)), tile_codes):
+                x, y = 2 * i + dx, 2 * j + dy
+                old_code = int(codes[x, y])
+                if old_code != code:
+                    cells.append((x, y))
+                    old_codes.append(old_code)
+                    new_codes.append(code)
+                    codes[x, y] = code
+        self.__update_cycle_order(cells, old_codes, new_codes)
+        return CellPathDiff(
+            cells=np.array(cells, dtype=np.int64).reshape(-1, 2),
+            old_codes=np.array(old_codes, dtype=np.int8),
+            new_codes=np.array(new_codes, dtype=np.int8),
+        )
+
+    def __next_cell(self, node: int, previous: int) -> int:
+        """
+        Follow the cycle from a cell, away from the previous cell.
+        """
+        x, y = divmod(node, self.cols)
+        sides = CELL_PATH_SIDES[self.cell_path_matrix.codes[x, y] + 1]
+        for direction, (dx, dy) in DIRECTION_OFFSETS.items():
+            if sides & direction:
+                next_node = (x + dx) * self.cols + y + dy
+                if next_node != previous:
+                    return next_node
+        raise Exception(f"The cell ({x}, {y}) is not on a cycle.")
+
+    def __update_cycle_order(self, cells: list[tuple[int, int]], old_codes: list[int], new_codes: list[int]):
+        """
+        Splice the cycle order after the cells changed: the old cycle without
+        the changed cells is a set of runs, which are visited in the same
+        direction by the new cycle, so it is followed from a changed cell and
+        across the runs.
+        """
+        order = self.cycle_order
+        nodes = [x * self.cols + y for x, y in cells]
+        new_nodes = {node for node, code in zip(nodes, new_codes) if code > 0}
+        old_nodes = [node for node, code in zip(nodes, old_codes) if code > 0]
+        if not new_nodes:
+            order.splice([], [])
+            return
+
+        # runs of unchanged cells, with the first changed cell at position 0
+        runs = []
+        if old_nodes:
+            order.rotate(min(order.rank(node) for node in old_nodes))
+            positions = sorted(order.rank(node) for node in old_nodes) + [len(order)]
+            runs = [
+                (start + 1, end - 1) for start, end in zip(positions, positions[1:])
+                if end - start > 1
+            ]
+        run_starts = {start: index for index, (start, _) in enumerate(runs)}
+        run_ends = {end: index for index, (_, end) in enumerate(runs)}
+
+        # follow the new cycle
+        first = next(iter(new_nodes))
+        previous, node = NO_NODE, first
+        new_sequence: list[tuple[int, int] | int] = []
+        directions = set()
+        while True:
+            if node in new_nodes:
+                new_sequence.append(node)
+                previous, node = node, self.__next_cell(node, previous)
+            else:
+                # an unchanged cell is the start or the end of its run
+                position = order.rank(node)
+                if position in run_starts:
+                    index = run_starts[position]
+                    exit_position = runs[index][1]
+                else:
+                    index = run_ends[position]
+                    exit_position = runs[index][0]
+                if position != exit_position:
+                    directions.add(position < exit_position)
+                new_sequence.append((index,))
+                exit_node = order.select(exit_position)
+                inside = previous if runs[index][0] == runs[index][1] else order.select(
+                    exit_position - 1 if position < exit_position else exit_position + 1
+                )
+                previous, node = exit_node, self.__next_cell(exit_node, inside)
+            if node == first:
+                break
+
+        if directions == {False}:
+            new_sequence.reverse()
+        elif len(directions) > 1:
+            raise Exception("The runs of the cycle are not visited in the same direction.")
+        order.splice(runs, new_sequence)
+
+    def __get_tile_positions(self, i: int, j: int) -> tuple[list[int], int]:
+        """
+        Get the sorted positions of the cells of the tile (i, j) along the
+        cycle, rotated to start at its first cell.
+        """
+        order = self.cycle_order
+        nodes = [(2 * i + dx) * self.cols + 2 * j + dy for dx, dy in ((0, 0), (0, 1), (1, 0), (1, 1))]
+        order.rotate(min(order.rank(node) for node in nodes))
+        return sorted(order.rank(node) for node in nodes)
+
+    def __get_ring_hole_runs(self, i: int, j: int) -> list[list[tuple[int, int]]]:
+        """
+        Get the holes (and cells outside of the grid) of the ring of the tile
+        (i, j), grouped by runs that are 8-connected along the ring. Between
+        two runs, there is a group of neighbours connected through the ring.
+        """
+        n, m = self.tile_exists.shape
+        is_hole = [
+            not (0 <= i + dx < n and 0 <= j + dy < m and self.tile_exists[i + dx, j + dy])
+            for dx, dy in RING_OFFSETS
+        ]
+        if all(is_hole):
+            return []
+        # a corner tile between two holes does not separate them
+        for k in range(1, 8, 2):
+            if is_hole[k - 1] and is_hole[(k + 1) % 8]:
+                is_hole[k] = True
+        first = is_hole.index(False)
+        runs: list[list[tuple[int, int]]] = []
+        for k in range(first + 1, first + 9):
+            if not is_hole[k % 8]:
+                continue
+            if not is_hole[(k - 1) % 8]:
+                runs.append([])
+            dx, dy = RING_OFFSETS[k % 8]
+            if not (0 <= i + dx < n and 0 <= j + dy < m and self.tile_exists[i + dx, j + dy]):
+                runs[-1].append((i + dx, j + dy))
+        return runs
+
+    def __is_cut(self, i: int, j: int) -> bool:
+        """
+        Check if removing the tile (i, j) disconnects its neighbours.
+        The hole runs of its ring are searched in lockstep through the holes,
+        until two of them meet (a cut), or all of them but one are exhausted.
+        A search that reaches the outside of the grid is never exhausted.
+        """
+        if is_locally_simple(self.tile_exists, i, j):
+            return False
+        n, m = self.tile_exists.shape
+        owners: dict[tuple[int, int], int] = {(i, j): NO_NODE}
+        queues = []
+        for run in self.__get_ring_hole_runs(i, j):
+            search = len(queues)
+            queues.append(deque())
+            for x, y in run:
+                hole = (x, y) if 0 <= x < n and 0 <= y < m else OUTSIDE
+                if owners.get(hole, search) != search:
+                    return True
+                if hole not in owners:
+                    owners[hole] = search
+                    if hole != OUTSIDE:
+                        queues[search].append(hole)
+
+        nb_searched = 0
+        try:
+            while True:
+                open_searches = [
+                    search for search, queue in enumerate(queues)
+                    if queue or owners.get(OUTSIDE) == search
+                ]
+                if len(open_searches) <= 1:
+                    return False
+                for search in open_searches:
+                    if not queues[search]:
+                        continue
+                    x, y = queues[search].popleft()
+                    nb_searched += 1
+                    for dx, dy in RING_OFFSETS:
+                        u, v = x + dx, y + dy
+                        if 0 <= u < n and 0 <= v < m:
+                            if self.tile_exists[u, v]:
+                                continue
+                            hole = (u, v)
+                        else:
+                            hole = OUTSIDE
+                        owner = owners.get(hole)
+                        if owner is None:
+                            owners[hole] = search
+                            if hole != OUTSIDE:
+                                queues[search].append(hole)
+                        elif owner != search:
+                            return True
+        finally:
+            instrumentation.count("dynamic_stc.searched_holes", nb_searched)
+
+    def __find_replacement_edges(
+        self,
+        i: int,
+        j: int,
+        tile_positions: list[int],
+        nb_pieces: int,
+    ) -> list[tuple[int, int, int]] | None:
+        """
+        Find edges joining the pieces of the tree, with a breadth-first search
+        of the tiles from the tile (i, j), which is already a hole. The piece
+        of a tile is the arc of the cycle between the cells of (i, j) that
+        holds its cells. Returns the edges as (i, j, direction), or None if
+        the pieces are not all joined.
+        """
+        n, m = self.tile_exists.shape
+        order = self.cycle_order
+        labels: dict[tuple[int, int], int] = {}
+        roots: dict[int, int] = {}
+
+        def find(label: int) -> int:
+            while roots[label] != label:
+                roots[label] = roots[roots[label]]
+                label = roots[label]
+            return label
+
+        def visit(x: int, y: int):
+            label = bisect.bisect(tile_positions, order.rank(2 * x * self.cols + 2 * y))
+            labels[x, y] = label
+            roots.setdefault(label, label)
+            queue.append((x, y))
+
+        queue: deque[tuple[int, int]] = deque()
+        for _, x, y in self.__get_neighbours(i, j):
+            visit(x, y)
+        edges = []
+        try:
+            while queue:
+                x, y = queue.popleft()
+                for direction, (dx, dy) in DIRECTION_OFFSETS.items():
+                    u, v = x + dx, y + dy
+                    if not (0 <= u < n and 0 <= v < m and self.tile_exists[u, v]):
+                        continue
+                    if (u, v) not in labels:
+                        visit(u, v)
+                    root, other_root = find(labels[x, y]), find(labels[u, v])
+                    if root != other_root:
+                        roots[root] = other_root
+                        edges.append((x, y, direction))
+                        nb_pieces -= 1
+                        if nb_pieces == 1:
+                            return edges
+            return None
+        finally:
+            instrumentation.count("dynamic_stc.searched_tiles", len(labels))
+
+    def remove_tile(self, i: int, j: int) -> CellPathDiff:
+        """
+        Make the tile (i, j) a hole, and repair the cycle around it.
+        Raises an Exception (and changes nothing) if it disconnects the grid.
+        """
+        if not self.tile_exists[i, j]:
+            raise Exception(f"The tile ({i}, {j}) is already a hole.")
+        tree_neighbours = [
+            (direction, x, y) for direction, x, y in self.__get_neighbours(i, j)
+            if self.masks[i, j] & direction
+        ]
+        changed_tiles = {(i, j)} | {(x, y) for _, x, y in tree_neighbours}
+
+        edges = []
+        if len(tree_neighbours) > 1:
+            if self.__is_cut(i, j):
+                raise Exception(f"Removing the tile ({i}, {j}) disconnects the graph.")
+            tile_positions = self.__get_tile_positions(i, j)
+            self.tile_exists[i, j] = False
+            edges = self.__find_replacement_edges(i, j, tile_positions, len(tree_neighbours))
+            if edges is None:
+                self.tile_exists[i, j] = True
+                raise Exception(f"Removing the tile ({i}, {j}) disconnects the graph.")
+
+        self.tile_exists[i, j] = False
+        for direction, _, _ in tree_neighbours:
+            self.__unlink(i, j, direction)
+        for x, y, direction in edges:
+            self.__link(x, y, direction)
+            dx, dy = DIRECTION_OFFSETS[direction]
+            changed_tiles |= {(x, y), (x + dx, y + dy)}
+        return self.__rewrite_tiles(changed_tiles)
+
+    def add_tile(self, i: int, j: int) -> CellPathDiff:
+        """
+        Make the hole (i, j) a tile, linked to one of its neighbours in the skeleton.
+        Raises an Exception if it has no neighbour (it would not be connected).
+        """
+        if self.tile_exists[i, j]:
+            raise Exception(f"The tile ({i}, {j}) already exists.")
+        neighbours = self.__get_neighbours(i, j)
+        if not neighbours and self.tile_exists.any():
+            raise Exception(f"The tile ({i}, {j}) has no neighbour, adding it disconnects the graph.")
+        self.tile_exists[i, j] = True
+        changed_tiles = {(i, j)}
+        if neighbours:
+            direction, x, y = neighbours[0]
+            self.__link(i, j, direction)
+            changed_tiles.add((x, y))
+        return self.__rewrite_tiles(changed_tiles)
+
+
+# Tests
+import unittest
+class TestDynamicSTC(unittest.TestCase):
+    def test_random_toggles(self):
+        """
+        Test that the cycle stays a Hamiltonian cycle of the current tiles,
+        that the diffs rebuild it, and that the cycle order follows it.
+        """
+        from hpgg.grid_graphs.cell_grid_graph import CellGridGraph
+        from hpgg.paths.validation import validate_cell_path_matrix
+
+        rng = random.Random(0)
+        for size in (1, 3, 9):
+            grid = TileGridGraph(size, size)
+            session = DynamicSTC(grid)
+            for _ in range(200):
+                i, j = rng.randrange(size), rng.randrange(size)
+                codes = session.cell_path_matrix.codes.copy()
+                masks = session.masks.copy()
+                tile_exists = grid.tile_exists.copy()
+                try:
+                    diff = session.remove_tile(i, j) if grid.tile_exists[i, j] else session.add_tile(i, j)
+                except Exception as exception:
+                    # the operation changed nothing
+                    self.assertIn("disconnects", str(exception))
+                    self.assertTrue(np.array_equal(masks, session.masks))
+                    self.assertTrue(np.array_equal(tile_exists, grid.tile_exists))
+                    continue
+
+                before = CellPathMatrix.from_codes(codes)
+                diff.apply(before)
+                self.assertTrue(np.array_equal(before.codes, session.cell_path_matrix.codes))
+                if grid.get_nb_tiles() == 0:
+                    continue
+                report = validate_cell_path_matrix(session.cell_path_matrix, CellGridGraph(grid))
+                self.assertTrue(report.is_valid, report.get_message())
+
+                cycle = [tuple(cell) for cell in session.get_cycle().tolist()]
+                expected = [tuple(cell) for cell in extract_cycle(session.cell_path_matrix).tolist()]
+                start = cycle.index(expected[0])
+                cycle = cycle[start:] + cycle[:start]
+                self.assertIn(expected, (cycle, cycle[:1] + cycle[:0:-1]))
+
+    def test_local_diff(self):
+        """
+        Test that removing a tile in a large grid only changes cells around it.
+        """
+        grid = TileGridGraph(60, 60)
+        session = DynamicSTC(grid)
+        diff = session.remove_tile(30, 30)
+        self.assertFalse(grid.tile_exists[30, 30])
+        self.assertGreater(len(diff), 0)
+        self.assertTrue(np.all(np.abs(diff.cells - 61) <= 3))
+        diff = session.add_tile(30, 30)
+        self.assertTrue(np.all(session.cell_path_matrix.codes[60:62, 60:62] > 0))
+        with self.assertRaises(Exception):
+            session.add_tile(30, 30)
+
+    def test_rejected_removal_is_local(self):
+        """
+        Test that a removal that disconnects the grid is rejected without
+        searching the tiles, and that the replacement edges around a long
+        wall of holes are found.
+        """
+        from hpgg.instrumentation import TraceCollector, collecting
+
+        for n in (20, 80):
+            # two halves joined by a single tile, and a wall with a gap
+            mask = np.ones((n, n), dtype=bool)
+            mask[:, n // 2] = False
+            mask[n // 2, n // 2] = True
+            mask[n // 4, 1:n // 2] = False
+            grid = TileGridGraph.from_mask(mask)
+            session = DynamicSTC(grid)
+            masks = session.masks.copy()
+
+            collector = TraceCollector()
+            with collecting(collector):
+                for i, j in ((n // 2, n // 2), (n // 2, n // 2 - 1), (n // 2, n // 2 + 1)):
+                    with self.assertRaisesRegex(Exception, "disconnects"):
+                        session.remove_tile(i, j)
+            # each search goes through the holes once at most
+            self.assertEqual(collector.counters["dynamic_stc.searched_tiles"], 0)
+            self.assertLessEqual(collector.counters["dynamic_stc.searched_holes"], 3 * (n * n - grid.get_nb_tiles()))
+            self.assertTrue(np.array_equal(masks, session.masks))
+
+            # a tile between the wall and a column of holes, joined around the column
+            i, j = n // 4 - 1, n // 4
+            grid.tile_exists[1:i, j] = False
+            session = DynamicSTC(grid)
+            session.remove_tile(i, j)
+            self.assertTrue(grid.check_connected_graph())
+            self.assertEqual(len(extract_cycle(session.cell_path_matrix)), 4 * grid.get_nb_tiles())
@@ -0,0 +1,694 @@
+"""
+Exact Hamiltonian path solver for cell grid graphs.
+
+Unlike STC, the cells can have arbitrary (single-cell) holes, and the path
+goes from a given start cell s to a given end cell t.
+
+The search is a depth-first search over the head of the path. The visited
+cells are bitmasks (cell (x, y) is bit x * cols + y of a Python int), so
+most tests run on all the cells at once with a few big-int operations:
+- colour parity: the grid is bipartite, so the unvisited cells must split
+  between the two colours exactly as the rest of the path alternates them.
+- degrees and dead ends: each unvisited cell needs 2 edges (t and the head 1).
+  A cell with exactly the edges it needs uses them all (forced edges), which
+  removes the other edges of its neighbours, and so on.
+- b-matching: the degrees must be satisfiable all at once, which is a flow
+  between the two colours, kept up to date with augmenting paths.
+- connectivity and cut cells: the unvisited cells must be connected, and
+  removing one of them (a cut cell c) can split them in at most 2 parts:
+  the part of t, and a part S that the path covers before going through c.
+  So the next cell must be in S, and S must pass the colour parity test.
+- a memo of the (head, unvisited cells) states that have already failed.
+- Warnsdorff ordering: moves to the cells with the fewest free neighbours first,
+  ties broken in a new random order at each restart.
+"""
+import random
+import sys
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from hpgg.grid_graphs.cell_grid_graph import CellGridGraph
+
+SOLVED = "solved"
+INFEASIBLE = "infeasible"
+LIMIT_REACHED = "limit_reached"
+
+
+@dataclass
+class HamiltonianPathResult:
+    """
+    Result of the exact solver.
+    path is the list of (x, y) cells from s to t, or None if no path was found.
+    """
+    status: str
+    path: list[tuple[int, int]] | None
+    nb_nodes_explored: int
+    elapsed_time: float
+
+    def get_path_array(self) -> np.ndarray:
+        """
+        Get the path as a (N, 2) int32 array of cell coordinates.
+        """
+        if self.path is None:
+            return np.zeros((0, 2), dtype=np.int32)
+        return np.array(self.path, dtype=np.int32).reshape(-1, 2)
+
+
+class SearchLimitReached(Exception):
+    pass
+
+
+class SearchRestart(Exception):
+    pass
+
+
+def count_bits(a: int, b: int, c: int, d: int) -> tuple[int, int]:
+    """
+    Bit-parallel count of 4 bitmasks: get the bitmasks of the positions
+    set in at least 2 and in at least 3 of them.
+    """
+    at_least_2 = (a & b) | (c & d) | ((a | b) & (c | d))
+    at_least_3 = (a & b & (c | d)) | (c & d & (a | b))
+    return at_least_2, at_least_3
+
+
+class ExactHamiltonianPathSolver():
+    """
+    Exact solver for the Hamiltonian path problem between two cells,
+    on a grid of cells with holes.
+    """
+    def __init__(
+        self,
+        cells: np.ndarray | CellGridGraph,
+        max_memo_size: int = 1 << 22,
+    ):
+        """
+        cells is a 2D boolean mask of the existing cells, or a cell grid graph.
+        max_memo_size bounds the number of failed states kept in memory.
+        """
+        if isinstance(cells, CellGridGraph):
+            cells = cells.get_cell_mask()
+        self.cells = np.asarray(cells, dtype=bool)
+        self.rows, self.cols = self.cells.shape
+        self.max_memo_size = max_memo_size
+        self.nb_nodes_explored = 0
+        rows, cols = self.rows, self.cols
+
+        positions = np.flatnonzero(self.cells).tolist()
+        self.nb_cells = len(positions)
+        self.all_cells = sum(1 << p for p in positions)
+
+        # masks used to shift bitmasks horizontally without wrapping around rows
+        self.not_first_column = sum(1 << p for p in range(rows * cols) if p % cols != 0)
+        self.not_last_column = sum(1 << p for p in range(rows * cols) if p % cols != cols - 1)
+
+        # colour of the cells (the grid is bipartite)
+        self.colours = [(p // cols + p % cols) % 2 for p in range(rows * cols)]
+        self.colour_masks = [0, 0]
+        for p in positions:
+            self.colour_masks[self.colours[p]] |= 1 << p
+
+        # DFS arrays of `get_start_cells`
+        self.timer = 0
+        self.discovery = [0] * (rows * cols)
+        self.low = [0] * (rows * cols)
+        self.size = [0] * (rows * cols)
+        self.nb_start_colour = [0] * (rows * cols)
+
+        # neighbours of each cell, as a tuple and as a bitmask
+        self.adjacent: list[tuple[int, ...]] = [() for _ in range(rows * cols)]
+        self.neighbours = [0] * (rows * cols)
+        for p in positions:
+            x, y = divmod(p, cols)
+            adjacent = []
+            for dx, dy in ((-1, 0), (0, 1), (1, 0), (0, -1)):
+                if 0 <= x + dx < rows and 0 <= y + dy < cols and self.cells[x + dx, y + dy]:
+                    adjacent.append((x + dx) * cols + y + dy)
+            self.adjacent[p] = tuple(adjacent)
+            self.neighbours[p] = sum(1 << q for q in adjacent)
+
+    def __grow(self, mask: int) -> int:
+        """
+        Add to a bitmask all the neighbours (existing or not) of its cells.
+        """
+        return (
+            mask
+            | ((mask << 1) & self.not_first_column)
+            | ((mask >> 1) & self.not_last_column)
+            | (mask << self.cols)
+            | (mask >> self.cols)
+        )
+
+    def is_connected(self, start_mask: int, cells: int) -> bool:
+        """
+        Check that all the cells of a bitmask are reachable from the cells
+        of start_mask, through these cells only (bit-parallel flood fill).
+        """
+        reached = start_mask & cells
+        while True:
+            grown = self.__grow(reached) & cells
+            if grown == reached:
+                return reached == cells
+            reached = grown
+
+    def get_available_edges(self, u: int, unvisited: int, t: int) -> tuple[int, int]:
+        """
+        Get the edges the rest of the path can use, as bitmasks of horizontal
+        and vertical edges, stored on their west or north cell.
+        """
+        cols = self.cols
+        available = unvisited | (1 << u)
+        horizontal = available & (available >> 1) & self.not_last_column
+        vertical = available & (available >> cols)
+        if unvisited & ~(1 << t):
+            # t is entered last only
+            if u + cols == t or u - cols == t:
+                vertical &= ~(1 << min(u, t))
+            elif (u + 1 == t or u - 1 == t) and u // cols == t // cols:
+                horizontal &= ~(1 << min(u, t))
+        return horizontal, vertical
+
+    def __step(self, cells: int, horizontal: int, vertical: int) -> int:
+        """
+        Get the cells joined to the cells of a bitmask by the given edges.
+        """
+        cols = self.cols
+        return (
+            ((cells & horizontal) << 1)
+            | ((cells >> 1) & horizontal)
+            | ((cells & vertical) << cols)
+            | ((cells >> cols) & vertical)
+        )
+
+    def repair_matching(
+        self,
+        u: int,
+        unvisited: int,
+        t: int,
+        edges: tuple[int, int],
+        matching: tuple[int, int],
+    ) -> tuple[int, int] | None:
+        """
+        The edges of the rest of the path give each unvisited cell 2 edges,
+        and 1 to the head u and to t. The grid is bipartite, so such a set of
+        edges (a perfect b-matching) is a flow from one colour to the other,
+        which also catches colour imbalances behind small cuts.
+
+        Repair the matching of the previous state (horizontal and vertical
+        bitmasks, like the edges) with augmenting paths, found by a bit-parallel
+        BFS. Returns the new matching, or None if there is no perfect b-matching.
+        """
+        head = 1 << u
+        ends = head | (1 << t)
+        inner = unvisited & ~ends
+        horizontal, vertical = edges
+        matched_horizontal = matching[0] & horizontal
+        matched_vertical = matching[1] & vertical
+
+        # the head needs a single edge
+        east, west = matched_horizontal, matched_horizontal << 1
+        south, north = matched_vertical, matched_vertical << self.cols
+        if count_bits(north, east, south, west)[0] & head:
+            if east & head:
+                matched_horizontal &= ~head
+            elif west & head:
+                matched_horizontal &= ~(head >> 1)
+            else:
+                matched_vertical &= ~head
+
+        sources = self.colour_masks[0]
+        while True:
+            east, west = matched_horizontal, matched_horizontal << 1
+            south, north = matched_vertical, matched_vertical << self.cols
+            at_least_2, _ = count_bits(north, east, south, west)
+            missing = (inner & ~at_least_2) | (ends & ~(north | east | south | west))
+            if not missing:
+                return matched_horizontal, matched_vertical
+            first_cells = missing & sources
+            last_cells = missing & ~sources
+            if not first_cells or not last_cells:
+                return None
+
+            # BFS layers of the alternating paths: free edges from the first
+            # colour to the second, matched edges from the second to the first
+            free_horizontal = horizontal & ~matched_horizontal
+            free_vertical = vertical & ~matched_vertical
+            layers = [first_cells]
+            reached = first_cells
+            while True:
+                layer = self.__step(layers[-1], free_horizontal, free_vertical) & ~reached
+                if not layer:
+                    return None
+                layers.append(layer)
+                reached |= layer
+                if layer & last_cells:
+                    break
+                layer = self.__step(layer, matched_horizontal, matched_vertical) & ~reached
+                if not layer:
+                    return None
+                layers.append(layer)
+                reached |= layer
+
+            # flip the edges of one augmenting path, from its last cell
+            cell = layers[-1] & last_cells
+            cell &= -cell
+            flipped_horizontal, flipped_vertical = 0, 0
+            for k in range(len(layers) - 1, 0, -1):
+                if k % 2 == 1:
+                    previous = self.__step(cell, free_horizontal, free_vertical) & layers[k - 1]
+                else:
+                    previous = self.__step(cell, matched_horizontal, matched_vertical) & layers[k - 1]
+                previous &= -previous
+                low = min(cell, previous)
+                if max(cell, previous) == low << 1 and self.cols > 1:
+                    flipped_horizontal |= low
+                else:
+                    flipped_vertical |= low
+                cell = previous
+            matched_horizontal ^= flipped_horizontal
+            matched_vertical ^= flipped_vertical
+
+    def get_forced_moves(
+        self,
+        u: int,
+        unvisited: int,
+        t: int,
+        edges: tuple[int, int],
+    ) -> tuple[int, tuple[int, int]] | None:
+        """
+        Degree tests on all the cells at once, with bit-parallel operations.
+        The path still has to go through the head u and the unvisited cells:
+        u and t need 1 more edge, the other cells 2. So a cell with exactly
+        the edges it needs uses all of them (forced edges), no cell can have
+        more forced edges than it needs, and a cell with all its forced edges
+        does not use its other edges. This is repeated until nothing changes.
+
+        edges are the available edges, from `get_available_edges`.
+        Returns None if these tests fail, or else the bitmask of the cell the head
+        is forced to move to (0 if the next move is not forced), and the edges
+        that are left.
+        """
+        cols = self.cols
+        head = 1 << u
+        ends = head | (1 << t)
+        inner = unvisited & ~ends
+        horizontal, vertical = edges
+
+        while True:
+            east, west = horizontal, horizontal << 1
+            south, north = vertical, vertical << cols
+            at_least_2, at_least_3 = count_bits(north, east, south, west)
+            if inner & ~at_least_2 or ends & ~(north | east | south | west):
+                return None
+            # cells with exactly the edges they need
+            exact = (inner & ~at_least_3) | (ends & ~at_least_2)
+
+            forced_horizontal = horizontal & (exact | (exact >> 1))
+            forced_vertical = vertical & (exact | (exact >> cols))
+            forced_east, forced_west = forced_horizontal, forced_horizontal << 1
+            forced_south, forced_north = forced_vertical, forced_vertical << cols
+            forced_2, forced_3 = count_bits(forced_north, forced_east, forced_south, forced_west)
+            forced_1 = forced_north | forced_east | forced_south | forced_west
+            if forced_3 or ends & forced_2:
+                return None
+
+            # cells with all their edges drop the other ones
+            saturated = (inner & forced_2) | (ends & forced_1)
+            dropped_horizontal = horizontal & ~forced_horizontal & (saturated | (saturated >> 1))
+            dropped_vertical = vertical & ~forced_vertical & (saturated | (saturated >> cols))
+            if not dropped_horizontal and not dropped_vertical:
+                break
+            horizontal &= ~dropped_horizontal
+            vertical &= ~dropped_vertical
+
+        forced_moves = (
+            ((forced_north & head) >> cols)
+            | ((forced_south & head) << cols)
+            | ((forced_east & head) << 1)
+            | ((forced_west & head) >> 1)
+        )
+        return forced_moves, (horizontal, vertical)
+
+    def get_start_cells(self, u: int, unvisited: int, nb_unvisited: int, t: int) -> int:
+        """
+        Get the bitmask of the neighbours of the head u where a Hamiltonian path
+        of the unvisited cells ending at t can start, as far as the cut cells
+        tell (0 if there is no such path).
+
+        Runs an iterative Tarjan DFS rooted at t over the unvisited cells.
+        For a cut cell c, the DFS subtree S separated by c holds the start of
+        the path, which covers S and then goes through c: c can separate a
+        single subtree, and S must alternate colours from the start to c.
+        The subtrees are nested, so the start is in the last interval of
+        discovery times.
+        """
+        adjacent = self.adjacent
+        colours = self.colours
+        discovery = self.discovery
+        low = self.low
+        size = self.size
+        nb_start_colour = self.nb_start_colour
+        start_colour = 1 - colours[u]
+
+        # discovery times are not reset between calls, a cell is discovered in
+        # this call iff its discovery time is at least first_time
+        first_time = self.timer + 1
+        timer = first_time
+        discovery[t] = low[t] = timer
+        size[t] = 1
+        nb_start_colour[t] = colours[t] == start_colour
+        start_interval = (first_time, first_time + nb_unvisited)
+        separators = set()
+        nb_root_children = 0
+
+        # explicit DFS stack: node, parent, next neighbour to explore
+        nodes = [t]
+        parents = [-1]
+        next_neighbours = [0]
+        while nodes:
+            v = nodes[-1]
+            k = next_neighbours[-1]
+            v_adjacent = adjacent[v]
+            if k < len(v_adjacent):
+                next_neighbours[-1] = k + 1
+                w = v_adjacent[k]
+                if not unvisited >> w & 1:
+                    continue
+                if discovery[w] < first_time:
+                    timer += 1
+                    discovery[w] = low[w] = timer
+                    size[w] = 1
+                    nb_start_colour[w] = colours[w] == start_colour
+                    nodes.append(w)
+                    parents.append(v)
+                    next_neighbours.append(0)
+                elif w != parents[-1] and discovery[w] < low[v]:
+                    low[v] = discovery[w]
+                continue
+
+            nodes.pop()
+            next_neighbours.pop()
+            p = parents.pop()
+            if p < 0:
+                continue
+            if low[v] < low[p]:
+                low[p] = low[v]
+            size[p] += size[v]
+            nb_start_colour[p] += nb_start_colour[v]
+
+            if p == t:
+                nb_root_children += 1
+            elif low[v] >= discovery[p]:
+                # p is a cut cell separating the subtree of v
+                if p in separators:
+                    self.timer = timer
+                    return 0
+                separators.add(p)
+                if (
+                    nb_start_colour[v] != (size[v] + 1) // 2
+                    or colours[p] != start_colour ^ (size[v] & 1)
+                ):
+                    self.timer = timer
+                    return 0
+                start_interval = (
+                    max(start_interval[0], discovery[v]),
+                    min(start_interval[1], discovery[v] + size[v]),
+                )
+                if start_interval[0] >= start_interval[1]:
+                    self.timer = timer
+                    return 0
+
+        self.timer = timer
+        # t ends the path, so it can not be a cut cell
+        if timer - first_time + 1 != nb_unvisited or nb_root_children > 1:
+            return 0
+        start_cells = 0
+        for w in adjacent[u]:
+            if unvisited >> w & 1 and start_interval[0] <= discovery[w] < start_interval[1]:
+                start_cells |= 1 << w
+        return start_cells
+
+    def solve(
+        self,
+        start: tuple[int, int],
+        end: tuple[int, int],
+        max_nodes: int | None = None,
+        time_limit: float | None = None,
+        restart_nodes: int | None = 1024,
+        seed: int = 0,
+    ) -> HamiltonianPathResult:
+        """
+        Find a Hamiltonian path from the start cell to the end cell.
+        The search stops after max_nodes explored nodes or time_limit seconds, if given.
+
+        A DFS that took a bad turn early can spend a very long time below it,
+        so the search restarts after restart_nodes nodes (doubled at each restart),
+        with ties between moves broken in a new random order. The failed states
+        are kept across restarts, and the budget keeps growing, so the search
+        stays exact. restart_nodes=None disables the restarts.
+        """
+        for cell in (start, end):
+            if not (0 <= cell[0] < self.rows and 0 <= cell[1] < self.cols and self.cells[cell[0], cell[1]]):
+                raise Exception(f"The cell {tuple(cell)} does not exist.")
+
+        s = int(start[0]) * self.cols + int(start[1])
+        t = int(end[0]) * self.cols + int(end[1])
+        begin_time = time.perf_counter()
+        self.nb_nodes_explored = 0
+
+        if not self.__check_root(s, t):
+            return HamiltonianPathResult(INFEASIBLE, None, 0, time.perf_counter() - begin_time)
+
+        adjacent = self.adjacent
+        neighbours = self.neighbours
+        colours = self.colours
+        colour_masks = self.colour_masks
+        get_available_edges = self.get_available_edges
+        get_forced_moves = self.get_forced_moves
+        repair_matching = self.repair_matching
+        get_start_cells = self.get_start_cells
+        max_memo_size = self.max_memo_size
+        deadline = begin_time + time_limit if time_limit is not None else None
+        failed: set[tuple[int, int]] = set()
+        path: list[int] = []
+        rng = random.Random(seed)
+        tie_breaks = list(range(self.rows * self.cols))
+        restart_at = restart_nodes
+
+        def search(u: int, unvisited: int, remaining: int, matching: tuple[int, int]) -> bool:
+            """
+            u is the head of the path (already visited), remaining is the
+            number of unvisited cells, and matching is the b-matching of the
+            previous state.
+            """
+            self.nb_nodes_explored += 1
+            if remaining == 0:
+                return u == t
+            if max_nodes is not None and self.nb_nodes_explored > max_nodes:
+                raise SearchLimitReached()
+            if restart_at is not None and self.nb_nodes_explored > restart_at:
+                raise SearchRestart()
+            if deadline is not None and self.nb_nodes_explored % 1024 == 0 and time.perf_counter() > deadline:
+                raise SearchLimitReached()
+
+            # colour parity of the rest of the path, which ends at t
+            nb_opposite = (colour_masks[1 - colours[u]] & unvisited).bit_count()
+            if nb_opposite != (remaining + 1) // 2 or colours[t] != colours[u] ^ (remaining & 1):
+                return False
+
+            # degrees and forced edges of all the cells
+            forced = get_forced_moves(u, unvisited, t, get_available_edges(u, unvisited, t))
+            if forced is None:
+                return False
+            forced_moves, edges = forced
+
+            if (u, unvisited) in failed:
+                return False
+
+            matching = repair_matching(u, unvisited, t, edges, matching)
+            if matching is None:
+                if len(failed) < max_memo_size:
+                    failed.add((u, unvisited))
+                return False
+
+            if forced_moves:
+                candidates = forced_moves
+            else:
+                # connectivity and cut cells of the unvisited cells
+                candidates = get_start_cells(u, unvisited, remaining, t)
+            if remaining > 1:
+                # t is entered last only
+                candidates &= ~(1 << t)
+            moves = sorted(
+                ((neighbours[w] & unvisited).bit_count(), tie_breaks[w], w)
+                for w in adjacent[u] if candidates >> w & 1
+            )
+            for _, _, w in moves:
+                if search(w, unvisited & ~(1 << w), remaining - 1, matching):
+                    path.append(w)
+                    return True
+
+            if len(failed) < max_memo_size:
+                failed.add((u, unvisited))
+            return False
+
+        recursion_limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(recursion_limit, self.nb_cells + 100))
+        try:
+            while True:
+                try:
+                    found = search(s, self.all_cells & ~(1 << s), self.nb_cells - 1, (0, 0))
+                    break
+                except SearchRestart:
+                    restart_at = self.nb_nodes_explored + 2 * restart_nodes
+                    restart_nodes *= 2
+                    rng.shuffle(tie_breaks)
+            status = SOLVED if found else INFEASIBLE
+        except SearchLimitReached:
+            found = False
+            status = LIMIT_REACHED
+        finally:
+            sys.setrecursionlimit(recursion_limit)
+
+        elapsed_time = time.perf_counter() - begin_time
+        if not found:
+            return HamiltonianPathResult(status, None, self.nb_nodes_explored, elapsed_time)
+
+        path.append(s)
+        path.reverse()
+        return HamiltonianPathResult(
+            status,
+            [divmod(p, self.cols) for p in path],
+            self.nb_nodes_explored,
+            elapsed_time,
+        )
+
+    def __check_root(self, s: int, t: int) -> bool:
+        """
+        Feasibility tests on the whole instance, before the search.
+        """
+        if self.nb_cells == 1:
+            return s == t
+        if s == t:
+            return False
+        if not self.is_connected(1 << s, self.all_cells):
+            return False
+
+        # colour parity: the path alternates colours, from s to t
+        nb_opposite = self.colour_masks[1 - self.colours[s]].bit_count()
+        if nb_opposite != self.nb_cells // 2:
+            return False
+        if self.colours[t] != self.colours[s] ^ ((self.nb_cells - 1) & 1):
+            return False
+
+        # degrees: s and t need 1 neighbour, the other cells 2
+        for p in np.flatnonzero(self.cells).tolist():
+            if len(self.adjacent[p]) < (1 if p in (s, t) else 2):
+                return False
+        return True
+
+
+def solve_hamiltonian_path(
+    cells: np.ndarray | CellGridGraph,
+    start: tuple[int, int],
+    end: tuple[int, int],
+    max_nodes: int | None = None,
+    time_limit: float | None = None,
+    seed: int = 0,
+) -> HamiltonianPathResult:
+    """
+    Find a Hamiltonian path from start to end on a grid of cells
+    (2D boolean mask or cell grid graph).
+    """
+    return ExactHamiltonianPathSolver(cells).solve(start, end, max_nodes, time_limit, seed=seed)
+
+
+# Tests
+import unittest
+class TestExactSolver(unittest.TestCase):
+    def assert_hamiltonian_path(self, cells: np.ndarray, result: HamiltonianPathResult, start, end):
+        path = result.get_path_array()
+        self.assertEqual(result.status, SOLVED)
+        self.assertEqual(len(path), np.count_nonzero(cells))
+        self.assertEqual(tuple(path[0]), start)
+        self.assertEqual(tuple(path[-1]), end)
+        self.assertTrue(np.all(cells[path[:, 0], path[:, 1]]))
+        self.assertEqual(len(np.unique(path, axis=0)), len(path))
+        self.assertTrue(np.all(np.abs(np.diff(path, axis=0)).sum(axis=1) == 1))
+
+    def test_small_grids_against_brute_force(self):
+        """
+        Test that the solver finds a path exactly when a brute-force DFS does.
+        """
+        def brute_force(cells, start, end) -> bool:
+            n, m = cells.shape
+            nb_cells = np.count_nonzero(cells)
+
+            def dfs(cell, visited) -> bool:
+                if len(visited) == nb_cells:
+                    return cell == end
+                x, y = cell
+                for next_cell in ((x-1, y), (x, y+1), (x+1, y), (x, y-1)):
+                    if (
+                        0 <= next_cell[0] < n and 0 <= next_cell[1] < m
+                        and cells[next_cell] and next_cell not in visited
+                    ):
+                        visited.add(next_cell)
+                        if dfs(next_cell, visited):
+                            return True
+                        visited.remove(next_cell)
+                return False
+            return dfs(start, {start})
+
+        rng = random.Random(0)
+        for _ in range(300):
+            n, m = rng.randint(1, 4), rng.randint(1, 4)
+            cells = np.array([[rng.random() > 0.15 for _ in range(m)] for _ in range(n)])
+            existing = [tuple(cell) for cell in np.argwhere(cells).tolist()]
+            if len(existing) == 0:
+                continue
+            start, end = rng.choice(existing), rng.choice(existing)
+            result = solve_hamiltonian_path(cells, start, end)
+            if brute_force(cells, start, end):
+                self.assert_hamiltonian_path(cells, result, start, end)
+            else:
+                self.assertEqual(result.status, INFEASIBLE)
+
+    def test_infeasible_instances(self):
+        """
+        Test instances rejected by the feasibility tests, before any branching.
+        """
+        # s and t of the same colour, with an even number of cells
+        cells = np.ones((6, 6), dtype=bool)
+        result = solve_hamiltonian_path(cells, (0, 0), (5, 5))
+        self.assertEqual(result.status, INFEASIBLE)
+        self.assertEqual(result.nb_nodes_explored, 0)
+
+        # the corner (0, 0) forces edges until (0, 2) has a single edge left
+        cells = np.ones((12, 12), dtype=bool)
+        for hole in [(2, 1), (2, 3), (3, 3), (5, 8), (6, 2), (7, 11), (10, 7), (10, 8)]:
+            cells[hole] = False
+        result = solve_hamiltonian_path(cells, (2, 9), (5, 7))
+        self.assertEqual(result.status, INFEASIBLE)
+        self.assertLessEqual(result.nb_nodes_explored, 1)
+
+    def test_grid_with_holes(self):
+        """
+        Test a 12x12 grid with single-cell holes, and the search limits.
+        """
+        cells = np.ones((12, 12), dtype=bool)
+        cells[2, 4] = False
+        cells[6, 7] = False
+        solver = ExactHamiltonianPathSolver(cells)
+        result = solver.solve((6, 9), (3, 11))
+        self.assert_hamiltonian_path(cells, result, (6, 9), (3, 11))
+        self.assertLess(result.nb_nodes_explored, 10000)
+
+        result = solver.solve((6, 9), (3, 11), max_nodes=10)
+        self.assertEqual(result.status, LIMIT_REACHED)
+        self.assertIsNone(result.path)
+
+        with self.assertRaises(Exception):
+            solver.solve((2, 4), (3, 11))
@@ -0,0 +1,620 @@
+"""
+Frontier (broken-profile) dynamic programme counting the Hamiltonian
+cycles and paths of narrow cell grids, with holes.
+
+The cells are processed one at a time, along the long side of the grid,
+so the frontier crosses the narrow side: it has one plug per column (the
+edge going down from the last processed cell of the column) plus the plug
+going right from the last processed cell. A plug holds a label: the two
+ends of a path fragment share a label, and a fragment whose other end is
+an end of the Hamiltonian path (a dangling end) has a label that appears once.
+
+A state is the plugs encoded as an int (4 bits per plug, labels numbered
+by first appearance), the number of path ends placed (2 bits), and a "done"
+bit, set when the cycle or the path is closed. Once both path ends are
+placed, the two dangling fragments share a label, like a pair: it does not
+matter which pair they are, as a pair can only be closed last, so the
+states that only differ by it are the same state.
+
+A table maps the states to their big-integer number of partial solutions:
+the states are hashed once into an interned layout (a sorted array of
+states), and the counts are an object array in the order of the layout.
+The transitions of a whole layout through a cell are compiled into index
+arrays when the layout is first reached at that cell, so the long runs of
+identical rows reuse them and only add big integers (with `np.add.reduceat`).
+
+The states that cannot be completed for parity are dropped: the grid is a
+checkerboard, and a path covering a set of cells has as many black cells as
+white ones, up to its ends. So the colour imbalance of the cells left must
+be made up by the cells entered by the plugs and by the path ends left
+(fixed terminals, or free ends of any colour). Most of the states with free
+ends are dropped this way, along with the done state before the last cell.
+
+The tables at the start of each row can be kept, to sample solutions
+uniformly: the last cell is drawn first, and each previous state is drawn
+with a probability proportional to its count.
+"""
+import random
+
+import numpy as np
+
+from hpgg.grid_graphs.cell_grid_graph import (
+    SIDES_TO_CELL_PATH, CellGridGraph, CellPath, CellPathMatrix
+)
+from hpgg.grid_graphs.tile_grid_graphs import EAST, NORTH, SOUTH, WEST
+
+CYCLES = "cycles"
+PATHS = "paths"
+
+LABEL_BITS = 4
+LABEL_MASK = (1 << LABEL_BITS) - 1
+MAX_WIDTH = 12
+
+# bits of the cell types
+CELL_EXISTS = 1
+CAN_GO_DOWN = 2
+CAN_GO_RIGHT = 4
+IS_TERMINAL = 8
+
+
+def normalize_labels(plugs: np.ndarray) -> np.ndarray:
+    """
+    Relabel the plugs of each row of a (k, nb_plugs) array by order of first appearance.
+    """
+    # one table of new labels per row, flattened, with label 0 marked as never new
+    indices = plugs.astype(np.int32) + np.arange(len(plugs), dtype=np.int32)[:, None] * (LABEL_MASK + 1)
+    new_labels = np.zeros(len(plugs) * (LABEL_MASK + 1), dtype=np.int8)
+    new_labels[::LABEL_MASK + 1] = -1
+    nb_labels = np.zeros(len(plugs), dtype=np.int8)
+    for index in indices.T:
+        labels = new_labels[index]
+        is_new = labels == 0
+        nb_labels += is_new
+        new_labels[index] = np.where(is_new, nb_labels, labels)
+    return np.maximum(new_labels[indices], 0).astype(np.int64)
+
+
+class FrontierDP():
+    """
+    Count the Hamiltonian cycles (mode "cycles") or paths (mode "paths")
+    of a grid of cells. Paths go from start to end if they are given, and
+    otherwise have any ends (each path is counted once, not once per direction).
+
+    The frontier crosses the narrow side of the grid, so the cost grows
+    exponentially with the width (up to MAX_WIDTH cells) and linearly with
+    the length.
+    """
+    def __init__(
+        self,
+        cells: np.ndarray | CellGridGraph,
+        mode: str = CYCLES,
+        start: tuple[int, int] | None = None,
+        end: tuple[int, int] | None = None,
+        keep_tables: bool = False,
+    ):
+        """
+        cells is a 2D boolean mask of the existing cells, or a cell grid graph.
+        keep_tables keeps the state tables at the start of each row, for `sample`.
+        """
+        if mode not in (CYCLES, PATHS):
+            raise Exception(f"Unknown mode '{mode}', expected '{CYCLES}' or '{PATHS}'.")
+        if (start is None) != (end is None):
+            raise Exception("Give both path ends, or none of them.")
+        if mode == CYCLES and start is not None:
+            raise Exception("Cycles have no ends.")
+        if isinstance(cells, CellGridGraph):
+            cells = cells.get_cell_mask()
+        cells = np.asarray(cells, dtype=bool)
+        self.mode = mode
+        self.keep_tables = keep_tables
+
+        # the frontier crosses the narrow side
+        self.transposed = cells.shape[1] > cells.shape[0]
+        if self.transposed:
+            cells = cells.T
+            if start is not None:
+                start, end = (start[1], start[0]), (end[1], end[0])
+        self.cells = cells
+        self.rows, self.width = cells.shape
+        if self.width > MAX_WIDTH:
+            raise Exception(f"The grid is {self.width} cells wide, the frontier DP is limited to {MAX_WIDTH}.")
+        self.terminals = None if start is None else {tuple(start), tuple(end)}
+        if self.terminals is not None:
+            for cell in self.terminals:
+                if not (0 <= cell[0] < self.rows and 0 <= cell[1] < self.width and cells[cell[0], cell[1]]):
+                    raise Exception(f"The cell {cell} does not exist.")
+
+        self.ends_shift = LABEL_BITS * (self.width + 1)
+        self.done_bit = 1 << (self.ends_shift + 2)
+        self.cell_types = self.__get_cell_types()
+        self.targets, self.is_last = self.__get_parity_targets()
+        # a table is a layout (an interned sorted int64 array of states) and an
+        # object array of counts; the steps are compiled once per layout and step key
+        self.layouts: list[np.ndarray] = []
+        self.layout_ids: dict[bytes, int] = {}
+        self.compiled_steps: dict[tuple[int, ...], tuple[np.ndarray, np.ndarray, np.ndarray, int]] = {}
+        self.row_tables: list[tuple[int, np.ndarray]] = []
+        self.last_layout_id: int | None = None
+        self.count: int | None = None
+
+    def __get_cell_types(self) -> np.ndarray:
+        cells = self.cells
+        cell_types = cells * CELL_EXISTS
+        cell_types[:-1, :] |= (cells[:-1, :] & cells[1:, :]) * CAN_GO_DOWN
+        cell_types[:, :-1] |= (cells[:, :-1] & cells[:, 1:]) * CAN_GO_RIGHT
+        if self.terminals is not None:
+            for x, y in self.terminals:
+                cell_types[x, y] |= IS_TERMINAL
+        return cell_types
+
+    def __get_parity_targets(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get, after each cell (in processing order), twice the colour imbalance
+        (black - white) of the cells left minus the colours of the terminals
+        left, and whether no cell is left.
+        """
+        colours = 1 - 2 * (np.add.outer(np.arange(self.rows), np.arange(self.width)) % 2)
+        values = 2 * colours * self.cells
+        if self.terminals is not None:
+            for x, y in self.terminals:
+                values[x, y] -= colours[x, y]
+        values = values.ravel()
+        cells = self.cells.ravel().astype(np.int64)
+        # sums over the cells after each cell
+        targets = np.cumsum(values[::-1])[::-1] - values
+        nb_cells_left = np.cumsum(cells[::-1])[::-1] - cells
+        return targets.reshape(self.rows, self.width), (nb_cells_left == 0).reshape(self.rows, self.width)
+
+    def __get_completable(self, states: np.ndarray, i: int, j: int) -> np.ndarray:
+        """
+        Check the parity of states after the cell (i, j): the colours of
+        the cells entered by the plugs, and of the free ends left (any
+        colour), must add up to the target of the cell.
+        """
+        width = self.width
+        # the plugs of the columns up to j go down to the next row
+        rows = i + (np.arange(width + 1) <= j)
+        columns = np.append(np.arange(width), j + 1)
+        colours = 1 - 2 * ((rows + columns) % 2)
+        entered = (self.decode_batch(states) != 0) @ colours
+        nb_free_ends = 0
+        if self.mode == PATHS and self.terminals is None:
+            nb_free_ends = 2 - ((states >> self.ends_shift) & 3)
+        difference = int(self.targets[i, j]) - entered
+        is_completable = (np.abs(difference) <= nb_free_ends) & ((difference - nb_free_ends) % 2 == 0)
+        is_done = (states & self.done_bit) != 0
+        return np.where(is_done, bool(self.is_last[i, j]), is_completable)
+
+    def encode_batch(self, plugs: np.ndarray, done: np.ndarray, nb_ends: np.ndarray) -> np.ndarray:
+        """
+        Encode a (k, width + 1) array of plugs as k states.
+        """
+        states = normalize_labels(plugs) @ (1 << (LABEL_BITS * np.arange(self.width + 1, dtype=np.int64)))
+        return np.where(done, self.done_bit, states | nb_ends << self.ends_shift)
+
+    def decode_batch(self, states: np.ndarray) -> np.ndarray:
+        """
+        Decode k states as a (k, width + 1) array of plugs.
+        """
+        return (states[:, None] >> (LABEL_BITS * np.arange(self.width + 1, dtype=np.int64))) & LABEL_MASK
+
+    def decode(self, state: int) -> tuple[list[int], bool]:
+        plugs = [(state >> (LABEL_BITS * k)) & LABEL_MASK for k in range(self.width + 1)]
+        return plugs, bool(state & self.done_bit)
+
+    def __get_valid_degrees(self, cell_type: int) -> tuple[int, ...]:
+        if self.mode == CYCLES:
+            return (2,)
+        if self.terminals is not None:
+            return (1,) if cell_type & IS_TERMINAL else (2,)
+        return (1, 2)
+
+    def get_transitions(
+        self,
+        states: np.ndarray,
+        j: int,
+        cell_type: int,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Get the states after processing the cell of column j, from an array of
+        states before it, as arrays of the indices of the states before, the
+        states after, and the edges, with the bits 1 (down) and 2 (right) of
+        the edges leaving the cell.
+        """
+        width = self.width
+        plugs = self.decode_batch(states)
+        up, left = plugs[:, j], plugs[:, width]
+
+        if not cell_type & CELL_EXISTS:
+            sources = np.flatnonzero((up == 0) & (left == 0))
+            return sources, states[sources], np.zeros(len(sources), dtype=np.int64)
+
+        is_alive = (states & self.done_bit) == 0
+        nb_incoming = (up != 0).astype(np.int64) + (left != 0)
+        nb_ends = (states >> self.ends_shift) & 3
+        label = np.where(up != 0, up, left)
+        valid_degrees = self.__get_valid_degrees(cell_type)
+        all_sources, all_next_states, all_edges = [], [], []
+        for down in ((0, 1) if cell_type & CAN_GO_DOWN else (0,)):
+            for right in ((0, 1) if cell_type & CAN_GO_RIGHT else (0,)):
+                degree = nb_incoming + down + right
+                # a cell of degree 1 is a path end
+                new_nb_ends = nb_ends + (degree == 1)
+                sources = np.flatnonzero(is_alive & np.isin(degree, valid_degrees) & (new_nb_ends <= 2))
+                new_plugs = plugs[sources]
+                new_plugs[:, j] = new_plugs[:, width] = 0
+                new_nb_ends = new_nb_ends[sources]
+                is_done = np.zeros(len(sources), dtype=bool)
+                if down or right:
+                    # a fragment going on, or a new one (a fresh label is renumbered by `encode_batch`)
+                    new_labels = np.where(nb_incoming[sources] == 0, LABEL_MASK, label[sources])
+                    if down:
+                        new_plugs[:, j] = new_labels
+                    if right:
+                        new_plugs[:, width] = new_labels
+                else:
+                    # the two fragments coming in are joined, or the fragment coming in ends
+                    source_up, source_left = up[sources, None], left[sources, None]
+                    is_joined = nb_incoming[sources] == 2
+                    # closing a cycle, or joining the two path ends: only the last fragment
+                    is_closing = is_joined & (source_up[:, 0] == source_left[:, 0])
+                    is_merging = is_joined & ~is_closing
+                    new_plugs = np.where(is_merging[:, None] & (new_plugs == source_left), source_up, new_plugs)
+                    # the other end of a fragment ending at the cell becomes a dangling
+                    # end, or the fragment was already dangling and the path is complete
+                    is_ending = nb_incoming[sources] == 1
+                    is_done = is_closing | (is_ending & ~(new_plugs == label[sources, None]).any(axis=1))
+                    is_valid = ~is_done | ~new_plugs.any(axis=1)
+                    if self.mode == PATHS:
+                        is_valid &= ~is_closing | (nb_ends[sources] == 2)
+                    sources, new_plugs = sources[is_valid], new_plugs[is_valid]
+                    new_nb_ends, is_done = new_nb_ends[is_valid], is_done[is_valid]
+
+                # once both path ends are placed, the two dangling fragments share a label
+                pairing = np.flatnonzero(~is_done & (new_nb_ends == 2) & (nb_ends[sources] == 1))
+                if len(pairing):
+                    pairing_plugs = new_plugs[pairing]
+                    label_counts = np.bincount(
+                        (np.arange(len(pairing))[:, None] * (LABEL_MASK + 1) + pairing_plugs).ravel(),
+                        minlength=len(pairing) * (LABEL_MASK + 1),
+                    ).reshape(len(pairing), LABEL_MASK + 1)
+                    is_dangling = label_counts == 1
+                    is_dangling[:, 0] = False
+                    first = np.argmax(is_dangling, axis=1)[:, None]
+                    second = LABEL_MASK - np.argmax(is_dangling[:, ::-1], axis=1)[:, None]
+                    new_plugs[pairing] = np.where(pairing_plugs == second, first, pairing_plugs)
+
+                all_sources.append(sources)
+                all_next_states.append(self.encode_batch(new_plugs, is_done, new_nb_ends))
+                all_edges.append(np.full(len(sources), down | right << 1, dtype=np.int64))
+        return np.concatenate(all_sources), np.concatenate(all_next_states), np.concatenate(all_edges)
+
+    def __get_layout_id(self, layout: np.ndarray) -> int:
+        key = layout.tobytes()
+        layout_id = self.layout_ids.get(key)
+        if layout_id is None:
+            layout_id = self.layout_ids[key] = len(self.layouts)
+            self.layouts.append(layout)
+        return layout_id
+
+    def __get_step_key(self, i: int, j: int) -> tuple[int, ...]:
+        """
+        The cells with the same step key have the same compiled steps: the
+        column, the cell type, and what the parity of the states depends on.
+        """
+        return (j, int(self.cell_types[i, j]), i % 2, int(self.targets[i, j]), bool(self.is_last[i, j]))
+
+    def __compile_step(self, layout_id: int, i: int, j: int) -> tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+        """
+        Get the transitions through the cell (i, j) from all the states of a
+        layout, as the sources (indices in the layout) sorted by destination
+        (index in the next layout), the start of each destination in the
+        sources, the edges of each transition, and the id of the next layout.
+        """
+        step_key = self.__get_step_key(i, j)
+        sources, next_states, edges = self.get_transitions(self.layouts[layout_id], j, step_key[1])
+        is_completable = self.__get_completable(next_states, i, j)
+        sources, next_states, edges = sources[is_completable], next_states[is_completable], edges[is_completable]
+
+        # the next layout is sorted, so the layouts of the same states are equal
+        layout, destinations = np.unique(next_states, return_inverse=True)
+        order = np.argsort(destinations, kind="stable")
+        starts = np.searchsorted(destinations[order], np.arange(len(layout) + 1))
+        compiled_step = (sources[order], starts, edges[order], self.__get_layout_id(layout))
+        self.compiled_steps[(layout_id, *step_key)] = compiled_step
+        return compiled_step
+
+    def __get_compiled_step(self, layout_id: int, i: int, j: int) -> tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+        compiled_step = self.compiled_steps.get((layout_id, *self.__get_step_key(i, j)))
+        if compiled_step is None:
+            compiled_step = self.__compile_step(layout_id, i, j)
+        return compiled_step
+
+    def __step(self, layout_id: int, counts: np.ndarray, i: int, j: int) -> tuple[int, np.ndarray]:
+        """
+        Process the cell (i, j) for all the states of a table.
+        """
+        sources, starts, _, next_layout_id = self.__get_compiled_step(layout_id, i, j)
+        if len(sources) == 0:
+            return next_layout_id, np.zeros(0, dtype=object)
+        return next_layout_id, np.add.reduceat(counts[sources], starts[:-1])
+
+    def __get_index(self, layout_id: int, state: int) -> int | None:
+        """
+        Get the index of a state in a layout, or None if it is not in it.
+        """
+        layout = self.layouts[layout_id]
+        index = int(np.searchsorted(layout, state))
+        return index if index < len(layout) and layout[index] == state else None
+
+    def __accepted_state(self) -> int:
+        return self.done_bit
+
+    def run(self) -> int:
+        """
+        Run the DP and get the number of Hamiltonian cycles or paths.
+        """
+        nb_cells = int(np.count_nonzero(self.cells))
+        if nb_cells <= 1:
+            # a single cell is a path, but not a cycle
+            self.count = int(self.mode == PATHS and nb_cells == 1)
+            return self.count
+
+        layout_id = self.__get_layout_id(np.zeros(1, dtype=np.int64))
+        counts = np.array([1], dtype=object)
+        self.row_tables = []
+        for i in range(self.rows):
+            if self.keep_tables:
+                self.row_tables.append((layout_id, counts))
+            for j in range(self.width):
+                layout_id, counts = self.__step(layout_id, counts, i, j)
+                if len(counts) == 0:
+                    break
+        self.last_layout_id = layout_id
+        index = self.__get_index(layout_id, self.__accepted_state())
+        self.count = int(counts[index]) if index is not None else 0
+        return self.count
+
+    def sample_sides(self, rng: random.Random | None = None) -> np.ndarray | None:
+        """
+        Draw a Hamiltonian cycle or path uniformly at random. It is returned
+        as the sides crossed in each cell (a rows x cols uint8 array of 4-bit
+        masks, like `CellPathMatrix.get_sides`), or None if there is none.
+        Needs keep_tables=True.
+        """
+        if not self.keep_tables:
+            raise Exception("Sampling needs the state tables, use keep_tables=True.")
+        if self.count is None:
+            self.run()
+        if self.count == 0:
+            return None
+        randrange = rng.randrange if rng is not None else random.randrange
+        width = self.width
+        sides = np.zeros((self.rows, width), dtype=np.uint8)
+        if np.count_nonzero(self.cells) == 1:
+            return self.__to_original_sides(sides)
+
+        # the drawn state is followed by its index in the layout of its table
+        index = self.__get_index(self.last_layout_id, self.__accepted_state())
+        for i in range(self.rows - 1, -1, -1):
+            # recompute the tables of the row from its first table
+            tables = [self.row_tables[i]]
+            for j in range(width - 1):
+                tables.append(self.__step(*tables[-1], i, j))
+
+            for j in range(width - 1, -1, -1):
+                cell_type = int(self.cell_types[i, j])
+                layout_id, counts = tables[j]
+                sources, starts, all_edges, _ = self.__get_compiled_step(layout_id, i, j)
+                draw = randrange(int(counts[sources[starts[index]:starts[index + 1]]].sum()))
+                for position in range(starts[index], starts[index + 1]):
+                    draw -= counts[sources[position]]
+                    if draw < 0:
+                        break
+                index = int(sources[position])
+                edges = int(all_edges[position])
+                plugs, _ = self.decode(int(self.layouts[layout_id][index]))
+                if cell_type & CELL_EXISTS:
+                    sides[i, j] = (
+                        (NORTH if plugs[j] else 0)
+                        | (WEST if plugs[width] else 0)
+                        | (SOUTH if edges & 1 else 0)
+                        | (EAST if edges & 2 else 0)
+                    )
+        return self.__to_original_sides(sides)
+
+    def __to_original_sides(self, sides: np.ndarray) -> np.ndarray:
+        if not self.transposed:
+            return sides
+        # transposing swaps north and west, south and east
+        swapped = (
+            np.where(sides & NORTH, WEST, 0) | np.where(sides & WEST, NORTH, 0)
+            | np.where(sides & SOUTH, EAST, 0) | np.where(sides & EAST, SOUTH, 0)
+        )
+        return swapped.astype(np.uint8).T.copy()
+
+
+def count_hamiltonian_cycles(cells: np.ndarray | CellGridGraph) -> int:
+    """
+    Count the Hamiltonian cycles of a grid of cells.
+    """
+    return FrontierDP(cells, CYCLES).run()
+
+
+def count_hamiltonian_paths(
+    cells: np.ndarray | CellGridGraph,
+    start: tuple[int, int] | None = None,
+    end: tuple[int, int] | None = None,
+) -> int:
+    """
+    Count the Hamiltonian paths of a grid of cells, from start to end if given.
+    """
+    return FrontierDP(cells, PATHS, start, end).run()
+
+
+def sample_hamiltonian_cycle(
+    cells: np.ndarray | CellGridGraph,
+    rng: random.Random | None = None,
+) -> CellPathMatrix | None:
+    """
+    Draw a Hamiltonian cycle uniformly at random, or None if there is none.
+    """
+    if isinstance(cells, CellGridGraph):
+        cells = cells.get_cell_mask()
+    sides = FrontierDP(cells, CYCLES, keep_tables=True).sample_sides(rng)
+    if sides is None:
+        return None
+    codes = np.full(sides.shape, CellPath.NO_PATH.value, dtype=np.int8)
+    for cell_sides, cell_path in SIDES_TO_CELL_PATH.items():
+        codes[sides == cell_sides] = cell_path.value
+    codes[~np.asarray(cells, dtype=bool)] = CellPath.NO_CELL.value
+    return CellPathMatrix.from_codes(codes)
+
+
+def sample_hamiltonian_path(
+    cells: np.ndarray | CellGridGraph,
+    start: tuple[int, int] | None = None,
+    end: tuple[int, int] | None = None,
+    rng: random.Random | None = None,
+) -> np.ndarray | None:
+    """
+    Draw a Hamiltonian path uniformly at random (from start to end if given),
+    as a (N, 2) int32 array of the cells in path order, or None if there is none.
+    """
+    sides = FrontierDP(cells, PATHS, start, end, keep_tables=True).sample_sides(rng)
+    if sides is None:
+        return None
+    return walk_path(sides, start)
+
+
+def walk_path(sides: np.ndarray, start: tuple[int, int] | None = None) -> np.ndarray:
+    """
+    Get the cells of a path given by its sides, in order from start
+    (or from one of its ends).
+    """
+    nb_cells = int(np.count_nonzero(sides)) or 1
+    if start is None:
+        degrees = np.zeros(sides.shape, dtype=np.int8)
+        for direction in (NORTH, EAST, SOUTH, WEST):
+            degrees += (sides & direction) != 0
+        ends = np.argwhere(degrees == 1)
+        start = tuple(ends[0]) if len(ends) > 0 else tuple(np.argwhere(sides == 0)[0])
+    offsets = {NORTH: (-1, 0), EAST: (0, 1), SOUTH: (1, 0), WEST: (0, -1)}
+    opposite = {NORTH: SOUTH, EAST: WEST, SOUTH: NORTH, WEST: EAST}
+
+    path = np.zeros((nb_cells, 2), dtype=np.int32)
+    x, y = start
+    came_from = 0
+    for k in range(nb_cells):
+        path[k] = (x, y)
+        for direction in (NORTH, EAST, SOUTH, WEST):
+            if sides[x, y] & direction and direction != came_from:
+                dx, dy = offsets[direction]
+                x, y = x + dx, y + dy
+                came_from = opposite[direction]
+                break
+    return path
+
+
+# Tests
+import unittest
+class TestFrontierDP(unittest.TestCase):
+    def brute_force_count(self, cells: np.ndarray, mode: str, start=None, end=None) -> int:
+        """
+        Count the Hamiltonian cycles or paths by enumerating the paths.
+        """
+        all_cells = [tuple(cell) for cell in np.argwhere(cells)]
+        nb_cells = len(all_cells)
+
+        def neighbours(cell):
+            x, y = cell
+            for nx, ny in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+                if 0 <= nx < cells.shape[0] and 0 <= ny < cells.shape[1] and cells[nx, ny]:
+                    yield (nx, ny)
+
+        def count_from(path, visited):
+            if len(path) == nb_cells:
+                if mode == CYCLES:
+                    return int(path[0] in neighbours(path[-1]))
+                return int(end is None or path[-1] == end)
+            total = 0
+            for cell in neighbours(path[-1]):
+                if cell not in visited:
+                    visited.add(cell)
+                    path.append(cell)
+                    total += count_from(path, visited)
+                    path.pop()
+                    visited.remove(cell)
+            return total
+
+        if mode == CYCLES:
+            # each cycle is found twice from its first cell
+            return count_from([all_cells[0]], {all_cells[0]}) // 2 if nb_cells > 2 else 0
+        if start is not None:
+            return count_from([start], {start})
+        if nb_cells == 1:
+            return 1
+        # each path is found once from each end
+        return sum(count_from([cell], {cell}) for cell in all_cells) // 2
+
+    def test_known_counts(self):
+        """
+        Test the counts of full grids against known values.
+        """
+        self.assertEqual(count_hamiltonian_cycles(np.ones((4, 4), dtype=bool)), 6)
+        self.assertEqual(count_hamiltonian_cycles(np.ones((6, 6), dtype=bool)), 1072)
+        self.assertEqual(count_hamiltonian_cycles(np.ones((3, 3), dtype=bool)), 0)
+        self.assertEqual(count_hamiltonian_paths(np.ones((3, 3), dtype=bool)), 20)
+        self.assertEqual(count_hamiltonian_paths(np.ones((1, 1), dtype=bool)), 1)
+        # a 2 x n strip has a single cycle, and a single path between its corners
+        self.assertEqual(count_hamiltonian_cycles(np.ones((2, 500), dtype=bool)), 1)
+        self.assertEqual(count_hamiltonian_paths(np.ones((500, 2), dtype=bool), (0, 0), (499, 0)), 1)
+
+    def test_random_grids_against_brute_force(self):
+        """
+        Test the counts on random small grids with holes.
+        """
+        rng = np.random.default_rng(12)
+        for _ in range(60):
+            rows, cols = rng.integers(1, 5, size=2)
+            cells = rng.random((rows, cols)) < 0.8
+            if not cells.any():
+                continue
+            self.assertEqual(count_hamiltonian_cycles(cells), self.brute_force_count(cells, CYCLES))
+            self.assertEqual(count_hamiltonian_paths(cells), self.brute_force_count(cells, PATHS))
+            start, end = (tuple(cell) for cell in rng.permutation(np.argwhere(cells))[:2]) \
+                if cells.sum() >= 2 else (None, None)
+            if start is not None:
+                self.assertEqual(
+                    count_hamiltonian_paths(cells, start, end),
+                    self.brute_force_count(cells, PATHS, start, end),
+                )
+
+    def test_sampling(self):
+        """
+        Test that the sampled cycles and paths are valid, and that all the
+        cycles of a small grid are drawn.
+        """
+        from hpgg.paths.validation import validate_cell_path_matrix
+
+        cells = np.ones((8, 60), dtype=bool)
+        cells[3:5, 20:30] = False
+        rng = random.Random(0)
+        cell_path_matrix = sample_hamiltonian_cycle(cells, rng)
+        report = validate_cell_path_matrix(cell_path_matrix)
+        self.assertTrue(report.is_valid, report.get_message())
+        self.assertEqual(report.nb_cells, cells.sum())
+
+        path = sample_hamiltonian_path(cells, (0, 0), (7, 0), rng)
+        self.assertEqual(len(path), cells.sum())
+        self.assertEqual(tuple(path[0]), (0, 0))
+        self.assertEqual(tuple(path[-1]), (7, 0))
+        self.assertTrue(cells[path[:, 0], path[:, 1]].all())
+        self.assertEqual(len({tuple(cell) for cell in path}), len(path))
+        self.assertTrue((np.abs(np.diff(path, axis=0)).sum(axis=1) == 1).all())
+
+        # the 6 cycles of a 4 x 4 grid
+        cells = np.ones((4, 4), dtype=bool)
+        drawn = {sample_hamiltonian_cycle(cells, rng).codes.tobytes() for _ in range(200)}
+        self.assertEqual(len(drawn), 6)
+        self.assertIsNone(sample_hamiltonian_cycle(np.ones((3, 3), dtype=bool), rng))
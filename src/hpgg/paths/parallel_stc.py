@@ -0,0 +1,182 @@
+"""
+Algorithm STC on horizontal strips of the grid, in parallel processes.
+
+Each worker builds the spanning forest of a strip of tile rows and writes
+its masks and CellPath values in shared memory, so the strips are never
+copied between processes. A worker only sends back the trees of the tiles
+of the first and last rows of its strip.
+
+The forests are then linked into a single tree by a union-find over the
+trees touching the strip borders: each selected vertical edge across a
+border only changes the masks of its two tiles, so only their 8 cells
+are patched.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from hpgg.grid_graphs.cell_grid_graph import CellGridGraph, CellPathMatrix
+from hpgg.grid_graphs.connectivity import spanning_forest
+from hpgg.grid_graphs.tile_grid_graphs import NORTH, SOUTH
+from hpgg.paths.skeleton import spanning_forest_masks
+from hpgg.paths.stc_algo import STC_PATH_CODES, get_stc_cell_codes
+
+# number of strips per worker, so that faster strips balance slower ones
+STRIPS_PER_WORKER = 4
+
+
+def _attach(name: str, shape: tuple[int, ...], dtype) -> tuple[shared_memory.SharedMemory, np.ndarray]:
+    memory = shared_memory.SharedMemory(name=name)
+    return memory, np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+
+
+def _build_strip(task: tuple) -> tuple[np.ndarray, np.ndarray, int, int]:
+    """
+    Build the forest of the tile rows [start, end) and its cells.
+    Returns the tree of each tile of the first and last rows (-1 for holes),
+    the number of runs of the strip, and its number of trees.
+    """
+    names, n, m, start, end = task
+    tiles_memory, tile_exists = _attach(names[0], (n, m), bool)
+    masks_memory, masks = _attach(names[1], (n, m), np.uint8)
+    codes_memory, codes = _attach(names[2], (2 * n, 2 * m), np.int8)
+    try:
+        strip = tile_exists[start:end]
+        strip_masks, run_ids, run_roots = spanning_forest_masks(strip)
+        masks[start:end] = strip_masks
+        codes[2 * start:2 * end] = get_stc_cell_codes(strip, strip_masks)
+
+        nb_runs = len(run_roots)
+        if nb_runs == 0:
+            no_trees = np.full(m, -1, dtype=np.int64)
+            return no_trees, no_trees, 0, 0
+        first_trees = np.where(strip[0], run_roots[run_ids[:m]], -1)
+        last_trees = np.where(strip[-1], run_roots[run_ids[-m:]], -1)
+        nb_trees = int(np.count_nonzero(run_roots == np.arange(nb_runs)))
+        return first_trees, last_trees, nb_runs, nb_trees
+    finally:
+        del tile_exists, masks, codes, strip
+        tiles_memory.close()
+        masks_memory.close()
+        codes_memory.close()
+
+
+def _set_tile_codes(codes: np.ndarray, masks: np.ndarray, rows: np.ndarray, columns: np.ndarray):
+    tile_codes = STC_PATH_CODES[masks[rows, columns]]
+    codes[2 * rows, 2 * columns] = tile_codes[:, 0]
+    codes[2 * rows, 2 * columns + 1] = tile_codes[:, 1]
+    codes[2 * rows + 1, 2 * columns] = tile_codes[:, 2]
+    codes[2 * rows + 1, 2 * columns + 1] = tile_codes[:, 3]
+
+
+def ParallelAlgorithmSTC(
+    cell_grid_graph: CellGridGraph,
+    nb_workers: int | None = None,
+    nb_strips: int | None = None,
+) -> CellPathMatrix:
+    """
+    Algorithm STC (Spanning Tree Coverage) on strips of tile rows, built by
+    nb_workers processes (by default, one per CPU). With a single worker,
+    the strips are built in this process.
+    Raises an Exception if the graph is not connected.
+    """
+    tile_exists = np.asarray(cell_grid_graph.tile_grid_graph.tile_exists, dtype=bool)
+    n, m = tile_exists.shape
+    nb_workers = nb_workers or os.cpu_count() or 1
+    nb_strips = max(1, min(nb_strips or nb_workers * STRIPS_PER_WORKER, n))
+    bounds = np.linspace(0, n, nb_strips + 1).astype(np.int64)
+    if n == 0 or m == 0 or not tile_exists.any():
+        raise Exception("The graph is not connected.")
+
+    memories = [
+        shared_memory.SharedMemory(create=True, size=size)
+        for size in (n * m, n * m, 4 * n * m)
+    ]
+    # the arrays on the shared memory must be released before closing it
+    views = []
+    try:
+        shared_tiles = np.ndarray((n, m), dtype=bool, buffer=memories[0].buf)
+        views.append(shared_tiles)
+        shared_tiles[:] = tile_exists
+        names = tuple(memory.name for memory in memories)
+        tasks = [(names, n, m, int(start), int(end)) for start, end in zip(bounds[:-1], bounds[1:])]
+        if nb_workers == 1:
+            results = [_build_strip(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(nb_workers) as pool:
+                results = list(pool.map(_build_strip, tasks))
+
+        masks = np.ndarray((n, m), dtype=np.uint8, buffer=memories[1].buf)
+        codes = np.ndarray((2 * n, 2 * m), dtype=np.int8, buffer=memories[2].buf)
+        views += [masks, codes]
+
+        # link the trees across the strip borders
+        run_offsets = np.cumsum([0] + [nb_runs for _, _, nb_runs, _ in results])
+        upper, lower, rows, columns = [], [], [], []
+        for k in range(len(results) - 1):
+            last_trees = results[k][1]
+            first_trees = results[k + 1][0]
+            touching = np.flatnonzero((last_trees >= 0) & (first_trees >= 0))
+            upper.append(run_offsets[k] + last_trees[touching])
+            lower.append(run_offsets[k + 1] + first_trees[touching])
+            rows.append(np.full(len(touching), bounds[k + 1] - 1, dtype=np.int64))
+            columns.append(touching)
+        nb_trees = sum(nb_trees for _, _, _, nb_trees in results)
+        if len(results) > 1:
+            upper, lower = np.concatenate(upper), np.concatenate(lower)
+            rows, columns = np.concatenate(rows), np.concatenate(columns)
+            # only the trees touching a border take part in the union-find
+            trees, nodes = np.unique(np.concatenate([upper, lower]), return_inverse=True)
+            _, tree_edges = spanning_forest(len(trees), nodes[:len(upper)], nodes[len(upper):])
+            nb_trees -= len(tree_edges)
+            rows, columns = rows[tree_edges], columns[tree_edges]
+            masks[rows, columns] |= np.uint8(SOUTH)
+            masks[rows + 1, columns] |= np.uint8(NORTH)
+            _set_tile_codes(codes, masks, rows, columns)
+            _set_tile_codes(codes, masks, rows + 1, columns)
+        if nb_trees != 1:
+            raise Exception("The graph is not connected.")
+
+        return CellPathMatrix.from_codes(codes.copy())
+    finally:
+        views.clear()
+        shared_tiles = masks = codes = None
+        for memory in memories:
+            memory.close()
+            memory.unlink()
+
+
+# Tests
+import unittest
+class TestParallelSTC(unittest.TestCase):
+    def test_parallel_stc_random_grids(self):
+        """
+        Test that ParallelAlgorithmSTC gives a Hamiltonian cycle for any number of strips.
+        """
+        import random
+        from hpgg.grid_graphs.tile_grid_graphs import TileGridGraph
+        from hpgg.paths.validation import validate_cell_path_matrix
+
+        random.seed(0)
+        for k in range(30):
+            grid = TileGridGraph(random.randint(1, 12), random.randint(1, 12))
+            grid.add_periphery_holes(random.randint(0, 20), keep_connected=True)
+            grid.add_holes(random.randint(0, 6), keep_connected=True)
+            cell_grid_graph = CellGridGraph(grid)
+            nb_workers = 2 if k % 10 == 0 else 1
+            cell_path_matrix = ParallelAlgorithmSTC(cell_grid_graph, nb_workers, random.randint(1, 12))
+            report = validate_cell_path_matrix(cell_path_matrix, cell_grid_graph)
+            self.assertTrue(report.is_valid, report.get_message())
+
+    def test_not_connected(self):
+        """
+        Test that a graph cut between two strips is detected.
+        """
+        from hpgg.grid_graphs.tile_grid_graphs import TileGridGraph
+
+        grid = TileGridGraph(6, 5)
+        grid.tile_exists[3, :] = False
+        with self.assertRaises(Exception):
+            ParallelAlgorithmSTC(CellGridGraph(grid), 1, 3)
@@ -0,0 +1,249 @@
+"""
+Spanning trees of tile grid graphs, stored as per-tile 4-bit neighbour masks.
+
+The mask of a tile has the bit of a direction (NORTH, EAST, SOUTH, WEST)
+set if the skeleton has an edge from this tile to the adjacent tile
+in that direction. Holes have a mask of 0.
+
+`spanning_tree_masks` always builds the same tree, while
+`random_spanning_tree_batch` draws uniformly random trees.
+"""
+import numpy as np
+
+from hpgg.grid_graphs.connectivity import label_components, row_runs, run_adjacencies, spanning_forest
+from hpgg.grid_graphs.tile_grid_graphs import EAST, NORTH, SOUTH, WEST
+
+# number of edges of a node, from its 4-bit mask
+MASK_DEGREE = np.array([bin(mask).count("1") for mask in range(16)], dtype=np.uint8)
+
+
+def spanning_tree_masks(tile_exists: np.ndarray) -> np.ndarray:
+    """
+    Build a spanning tree of the tiles (a spanning forest if the tiles are
+    not connected), as a n x m uint8 array of 4-bit neighbour masks.
+
+    All horizontal edges inside a run of adjacent tiles are kept (a run is a path),
+    and runs are linked by the vertical edges selected by a union-find over runs.
+    """
+    masks, _, _ = spanning_forest_masks(tile_exists)
+    return masks
+
+
+def spanning_forest_masks(tile_exists: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Same as `spanning_tree_masks`, but also returns the run index of each
+    tile (flat, see `row_runs`) and the root run of each run, which
+    identifies the tree of each tile.
+    """
+    tile_exists = np.asarray(tile_exists, dtype=bool)
+    n, m = tile_exists.shape
+    masks = np.zeros((n, m), dtype=np.uint8)
+    if tile_exists.size == 0:
+        return masks, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    # horizontal edges, inside runs
+    horizontal = tile_exists[:, :-1] & tile_exists[:, 1:]
+    masks[:, :-1] |= horizontal * np.uint8(EAST)
+    masks[:, 1:] |= horizontal * np.uint8(WEST)
+
+    # vertical edges, between runs
+    run_ids, nb_runs = row_runs(tile_exists)
+    upper, lower, cells = run_adjacencies(tile_exists, run_ids)
+    run_roots, tree_edges = spanning_forest(nb_runs, upper, lower)
+    cells = cells[tree_edges]
+    masks.ravel()[cells] |= np.uint8(SOUTH)
+    masks.ravel()[cells + m] |= np.uint8(NORTH)
+
+    return masks, run_ids, run_roots
+
+
+def random_spanning_tree_batch(
+    tile_exists: np.ndarray,
+    nb_trees: int,
+    rng: np.random.Generator | int | None = None,
+) -> np.ndarray:
+    """
+    Draw uniformly random spanning trees of the tiles (one spanning tree per
+    component if the tiles are not connected), as a nb_trees x n x m uint8
+    array of 4-bit neighbour masks. rng is a numpy Generator or a seed.
+
+    Wilson's algorithm: the first tile of each component is in the tree, then
+    a random walk starts from the first tile that is not in the tree, until it
+    hits the tree. Each tile of the walk remembers the direction it was last
+    left by, so following these directions from the start of the walk gives
+    the loop-erased walk, which is added to the tree.
+    The walks of all the trees advance together, one step per iteration.
+    """
+    rng = np.random.default_rng(rng)
+    tile_exists = np.asarray(tile_exists, dtype=bool)
+    n, m = tile_exists.shape
+    masks = np.zeros((nb_trees, n, m), dtype=np.uint8)
+    tiles = np.flatnonzero(tile_exists)
+    nb_tiles = len(tiles)
+    if nb_trees == 0 or nb_tiles == 0:
+        return masks
+
+    # neighbours of the tiles, as indices in `tiles`, packed to the left
+    tile_ids = np.full(n * m, -1, dtype=np.int64)
+    tile_ids[tiles] = np.arange(nb_tiles)
+    x, y = np.divmod(tiles, m)
+    neighbours = np.zeros((nb_tiles, 4), dtype=np.int64)
+    directions = np.zeros((nb_tiles, 4), dtype=np.uint8)
+    degrees = np.zeros(nb_tiles, dtype=np.int64)
+    for direction, dx, dy in ((NORTH, -1, 0), (EAST, 0, 1), (SOUTH, 1, 0), (WEST, 0, -1)):
+        inside = (0 <= x + dx) & (x + dx < n) & (0 <= y + dy) & (y + dy < m)
+        neighbour = np.full(nb_tiles, -1, dtype=np.int64)
+        neighbour[inside] = tile_ids[(x + dx)[inside] * m + (y + dy)[inside]]
+        has_neighbour = neighbour >= 0
+        rows = np.flatnonzero(has_neighbour)
+        neighbours[rows, degrees[rows]] = neighbour[rows]
+        directions[rows, degrees[rows]] = direction
+        degrees += has_neighbour
+
+    labels, _ = label_components(tile_exists)
+    _, roots = np.unique(labels.ravel()[tiles], return_index=True)
+    # per tree arrays are flattened, tree b and tile t at b * nb_tiles + t
+    in_tree = np.zeros((nb_trees, nb_tiles), dtype=bool)
+    in_tree[:, roots] = True
+    in_tree = in_tree.ravel()
+    exits = np.zeros(nb_trees * nb_tiles, dtype=np.int64)
+
+    # state of the walk of each tree
+    offsets = np.arange(nb_trees, dtype=np.int64) * nb_tiles
+    starts = np.zeros(nb_trees, dtype=np.int64)
+    positions = np.zeros(nb_trees, dtype=np.int64)
+    retracing = np.zeros(nb_trees, dtype=bool)
+    seeking = np.ones(nb_trees, dtype=bool)
+    active = np.arange(nb_trees)
+    while len(active) > 0:
+        # start a walk from the first tile that is not in the tree
+        seekers = active[seeking[active]]
+        if len(seekers) > 0:
+            is_missing = ~in_tree.reshape(nb_trees, nb_tiles)[seekers]
+            first_missing = is_missing.argmax(axis=1)
+            starts[seekers] = positions[seekers] = first_missing
+            seeking[seekers] = False
+            finished = ~is_missing[np.arange(len(seekers)), first_missing]
+            if finished.any():
+                seeking[seekers[finished]] = True
+                active = active[~seeking[active]]
+
+        # random steps
+        is_retracing = retracing[active]
+        walkers = active[~is_retracing]
+        if len(walkers) > 0:
+            current = positions[walkers]
+            slots = (rng.random(len(walkers)) * degrees[current]).astype(np.int64)
+            exits[offsets[walkers] + current] = slots
+            current = neighbours[current, slots]
+            hit = in_tree[offsets[walkers] + current]
+            positions[walkers] = np.where(hit, starts[walkers], current)
+            retracing[walkers] = hit
+
+        # add the loop-erased walks to the trees
+        retracers = active[is_retracing]
+        if len(retracers) > 0:
+            flat = offsets[retracers] + positions[retracers]
+            in_tree[flat] = True
+            current = neighbours[positions[retracers], exits[flat]]
+            positions[retracers] = current
+            done = in_tree[offsets[retracers] + current]
+            retracing[retracers] = ~done
+            seeking[retracers] = done
+
+    # each tile but the roots has an edge to the tile it was last left for
+    exits = exits.reshape(nb_trees, nb_tiles)
+    others = np.setdiff1d(np.arange(nb_tiles), roots)
+    slots = exits[:, others]
+    edge_directions = directions[others, slots]
+    flat_masks = masks.reshape(nb_trees, n * m)
+    flat_masks[:, tiles[others]] = edge_directions
+    opposite_directions = ((edge_directions << 2) | (edge_directions >> 2)) & 15
+    tree_ids = np.repeat(np.arange(nb_trees), len(others))
+    np.bitwise_or.at(
+        flat_masks,
+        (tree_ids, tiles[neighbours[others, slots]].ravel()),
+        opposite_directions.ravel(),
+    )
+    return masks
+
+
+def random_spanning_tree_masks(
+    tile_exists: np.ndarray,
+    rng: np.random.Generator | int | None = None,
+) -> np.ndarray:
+    """
+    Draw a uniformly random spanning tree of the tiles, as a n x m uint8
+    array of 4-bit neighbour masks (see `random_spanning_tree_batch`).
+    """
+    return random_spanning_tree_batch(tile_exists, 1, rng)[0]
+
+
+def skeleton_edges(masks: np.ndarray) -> np.ndarray:
+    """
+    Get the edges of a skeleton as a (k, 4) int array of (i1, j1, i2, j2),
+    with (i2, j2) the tile to the east or to the south of (i1, j1).
+    """
+    east = np.argwhere(masks & EAST)
+    south = np.argwhere(masks & SOUTH)
+    return np.concatenate([
+        np.hstack([east, east + (0, 1)]),
+        np.hstack([south, south + (1, 0)]),
+    ]).astype(np.int64)
+
+
+# Tests
+import unittest
+class TestSkeleton(unittest.TestCase):
+    def test_spanning_tree_masks(self):
+        """
+        Test that the masks form a spanning forest: edges between existing tiles,
+        the same components as the tiles, and no cycle.
+        """
+        from hpgg.grid_graphs.connectivity import count_components
+
+        rng = np.random.default_rng(0)
+        for _ in range(50):
+            tile_exists = rng.random((rng.integers(1, 20), rng.integers(1, 20))) > 0.25
+            masks = spanning_tree_masks(tile_exists)
+            n, m = tile_exists.shape
+            self.assertTrue(np.all(masks[~tile_exists] == 0))
+
+            edges = skeleton_edges(masks)
+            self.assertTrue(np.all(tile_exists[edges[:, 2], edges[:, 3]]))
+            self.assertEqual(int(MASK_DEGREE[masks].sum()), 2 * len(edges))
+
+            # the tree has as many components as the tiles, and no cycle
+            roots, _ = spanning_forest(n * m, edges[:, 0] * m + edges[:, 1], edges[:, 2] * m + edges[:, 3])
+            tree_components = len(np.unique(roots[tile_exists.ravel()]))
+            self.assertEqual(tree_components, count_components(tile_exists))
+            self.assertEqual(len(edges), tile_exists.sum() - tree_components)
+
+    def test_random_spanning_trees(self):
+        """
+        Test that the random trees are spanning forests, drawn uniformly:
+        the 3 x 3 grid has 192 spanning trees.
+        """
+        from hpgg.grid_graphs.connectivity import count_components
+
+        rng = np.random.default_rng(1)
+        for _ in range(30):
+            tile_exists = rng.random((rng.integers(1, 12), rng.integers(1, 12))) > 0.25
+            n, m = tile_exists.shape
+            for masks in random_spanning_tree_batch(tile_exists, 3, rng):
+                self.assertTrue(np.all(masks[~tile_exists] == 0))
+                edges = skeleton_edges(masks)
+                self.assertTrue(np.all(tile_exists[edges[:, 2], edges[:, 3]]))
+                self.assertEqual(int(MASK_DEGREE[masks].sum()), 2 * len(edges))
+                roots, _ = spanning_forest(n * m, edges[:, 0] * m + edges[:, 1], edges[:, 2] * m + edges[:, 3])
+                tree_components = len(np.unique(roots[tile_exists.ravel()]))
+                self.assertEqual(tree_components, count_components(tile_exists))
+                self.assertEqual(len(edges), tile_exists.sum() - tree_components)
+
+        trees = random_spanning_tree_batch(np.ones((3, 3), dtype=bool), 192 * 50, rng=2)
+        _, counts = np.unique(trees.reshape(len(trees), -1), axis=0, return_counts=True)
+        self.assertEqual(len(counts), 192)
+        self.assertTrue(np.all((counts > 20) & (counts < 90)))
+
+        same_seed = random_spanning_tree_masks(np.ones((5, 5), dtype=bool), rng=7)
+        self.assertTrue(np.array_equal(same_seed, random_spanning_tree_masks(np.ones((5, 5), dtype=bool), rng=7)))
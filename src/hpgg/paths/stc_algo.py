@@ -1,165 +1,243 @@
-import networkx as nx
+import numpy as np
 
-from attr import dataclass
-from hpgg.grid_graphs.cell_grid_graph import CellGridGraph, CellPath, CellPathMatrix
-from hpgg.grid_graphs.tile_grid_graphs import TileGridGraph
+from hpgg import instrumentation
+from hpgg.grid_graphs.cell_grid_graph import (
+    SIDES_TO_CELL_PATH, CellGridGraph, CellPath, CellPathMatrix
+)
+from hpgg.grid_graphs.tile_grid_graphs import EAST, NORTH, SOUTH, WEST, TileGridGraph
+from hpgg.paths.skeleton import (
+    MASK_DEGREE, random_spanning_tree_batch, skeleton_edges, spanning_tree_masks
+)
 
 class SkeletonSTC():
     """
-    A skeleton is a minimum spanning tree of a tile grid graph.
-    It contains NodeSTC objects, that are nodes present at the center
-    of a tile.
+    A skeleton is a spanning tree of a tile grid graph.
+    Its nodes are at the center of the tiles (NodeSTC), 
+    connected to adjacent tiles.
     We can consider a SkeletonSTC as a tile grid graph where each tile
     is a node, connected to adjacent tiles.
+
+    The tree is stored as a n x m uint8 array of 4-bit neighbour masks:
+    bit NORTH, EAST, SOUTH or WEST is set if the node has an edge in that direction.
     """
     def __init__(
         self,
         tile_grid_graph: TileGridGraph,
+        masks: np.ndarray | None = None,
     ):
         """
         Construct a skeleton from a tile grid graph.
+        Any spanning tree works for STC, so by default the tree is built
+        directly from the tile array, in O(n*m).
+        A precomputed tree can be given as neighbour masks instead.
         """
         self.tile_grid_graph = tile_grid_graph
 
-        # convert tiles to nodes
-        self.graph = nx.Graph()
-        for i in range(tile_grid_graph.n):
-            for j in range(tile_grid_graph.m):
-                if tile_grid_graph.tile_exists[i][j]:
-                    self.graph.add_node((i, j))
-        
-        # connect adjacent tiles (nodes)
-        for i in range(tile_grid_graph.n):
-            for j in range(tile_grid_graph.m):
-                if tile_grid_graph.tile_exists[i][j]:
-                    # check the 4 adjacent tiles, and connect them if they exist
-                    for dx, dy in [(1, 0), (-1, 0), (0, 1), (0, -1)]:
-                        # check if the adjacent cell is in the grid
-                        if 0 <= i + dx < tile_grid_graph.n and 0 <= j + dy < tile_grid_graph.m:
-                            # check if the adjacent cell exists
-                            if tile_grid_graph.tile_exists[i + dx][j + dy]:
-                                self.graph.add_edge((i, j), (i + dx, j + dy))
-                
-        # construct the skeleton from the tile grid graph (using a MST algo like Kruskal)
-        self.graph = nx.minimum_spanning_tree(self.graph)
-
-def set_cell_paths_in_vicinity_of_node_stc(
-    cell_path_matrix: CellPathMatrix,
-    node_stc: tuple[int, int],
-    path_codes: list[CellPath],
-):
-    node_stc_x, node_stc_y = node_stc
-    dx_dy_list = [(0, 0), (0, 1), (1, 0), (1, 1)]
-    for i in range(4):
-        # this cell must exists (since it is in the vicinity of a NodeSTC)
-        dx = dx_dy_list[i][0]
-        dy = dx_dy_list[i][1]
-        cell_x = node_stc_x * 2 + dx
-        cell_y = node_stc_y * 2 + dy
-        path_code = path_codes[i]
-        cell_path_matrix.cell_path_matrix[cell_x][cell_y] = path_code
+        with instrumentation.span("SkeletonSTC", n=tile_grid_graph.n, m=tile_grid_graph.m):
+            if masks is None:
+                with instrumentation.span("spanning_tree_masks"):
+                    masks = spanning_tree_masks(tile_grid_graph.tile_exists)
+            self.masks = masks
+
+    def get_degrees(self) -> np.ndarray:
+        """
+        Get the number of edges of each node, as a n x m uint8 array.
+        """
+        return MASK_DEGREE[self.masks]
+
+    def get_edges(self) -> np.ndarray:
+        """
+        Get the edges of the skeleton as a (k, 4) array of (i1, j1, i2, j2).
+        """
+        return skeleton_edges(self.masks)
+
+    @property
+    def graph(self):
+        """
+        The skeleton as a networkx graph, built on demand.
+        """
+        import networkx as nx
+
+        graph = nx.Graph()
+        graph.add_nodes_from(map(tuple, np.argwhere(self.tile_grid_graph.tile_exists).tolist()))
+        graph.add_edges_from(
+            ((i1, j1), (i2, j2)) for i1, j1, i2, j2 in self.get_edges().tolist()
+        )
+        return graph
+
+def get_stc_path_codes(node_mask: int) -> list[CellPath]:
+    """
+    Get the CellPath of the 4 cells around a NodeSTC (top-left, top-right,
+    bottom-left, bottom-right), from the 4-bit mask of its EdgeSTCs.
+
+    The path goes around the skeleton without crossing it:
+    - a cell crosses an outer side of the tile iff there is an EdgeSTC
+      in that direction (the path follows the edge, on both sides).
+    - a cell crosses an inner side (to a sibling cell of the same tile)
+      iff there is no EdgeSTC between the two cells.
+
+    Ex:
+    4 edges:  ┘└
+              ┐┌
+    3 edges:  ┘└    │└    ┘│    ──
+              ──    │┌    ┐│    ┐┌
+    2 edges:  ──    ││    ─┐    ┘│    ┌─    │└
+              ──    ││    ┐│    ─┘    │┌    └─
+    1 edge:   ┌┐    ┌─    ││    ─┐
+              ││    └─    └┘    ─┘
+    """
+    top_left = (NORTH if node_mask & NORTH else EAST) | (WEST if node_mask & WEST else SOUTH)
+    top_right = (NORTH if node_mask & NORTH else WEST) | (EAST if node_mask & EAST else SOUTH)
+    bottom_left = (SOUTH if node_mask & SOUTH else EAST) | (WEST if node_mask & WEST else NORTH)
+    bottom_right = (SOUTH if node_mask & SOUTH else WEST) | (EAST if node_mask & EAST else NORTH)
+    return [
+        SIDES_TO_CELL_PATH[sides]
+        for sides in (top_left, top_right, bottom_left, bottom_right)
+    ]
+
+# CellPath values of the 4 cells around a NodeSTC, for each of the 16 node masks
+STC_PATH_CODES = np.array(
+    [[path.value for path in get_stc_path_codes(node_mask)] for node_mask in range(16)],
+    dtype=np.int8,
+)
+
+def get_stc_cell_codes(
+    tile_exists: np.ndarray,
+    skeleton_masks: np.ndarray,
+) -> np.ndarray:
+    """
+    Apply STC_PATH_CODES to the whole grid in one scatter.
+    Returns a 2n x 2m int8 array of CellPath values.
+    The masks can be a batch of skeletons (B x n x m), then the
+    result is a B x 2n x 2m array.
+    """
+    n, m = tile_exists.shape
+    node_codes = STC_PATH_CODES[skeleton_masks]
+    node_codes[..., ~tile_exists, :] = CellPath.NO_CELL.value
+
+    cell_codes = np.empty((*skeleton_masks.shape[:-2], 2*n, 2*m), dtype=np.int8)
+    cell_codes[..., 0::2, 0::2] = node_codes[..., 0]
+    cell_codes[..., 0::2, 1::2] = node_codes[..., 1]
+    cell_codes[..., 1::2, 0::2] = node_codes[..., 2]
+    cell_codes[..., 1::2, 1::2] = node_codes[..., 3]
+    return cell_codes
 
 def AlgorithmSTC(
     cell_grid_graph: CellGridGraph,
 ) -> CellPathMatrix:
     """
-    Algorithm STC
+    Algorithm STC (Spanning Tree Coverage).
+    Builds a spanning tree of the tiles (the skeleton), then a Hamiltonian
+    cycle of the cells that goes around the skeleton.
     """
+    tile_grid_graph = cell_grid_graph.tile_grid_graph
+    with instrumentation.span("AlgorithmSTC", n=tile_grid_graph.n, m=tile_grid_graph.m):
+        assert tile_grid_graph.check_connected_graph()
 
-    assert cell_grid_graph.tile_grid_graph.check_connected_graph()
+        # Construct the SkeletonSTC, a spanning tree of the grid graph
+        skeleton = SkeletonSTC(tile_grid_graph)
 
-    # Construct the SkeletonSTC, a minimum spanning tree of the grid graph
-    skeleton = SkeletonSTC(cell_grid_graph.tile_grid_graph)
-
-    # From the skeleton, construct the CellPathMatrix
-    cell_path_matrix = CellPathMatrix(cell_grid_graph)
-    for node_stc in skeleton.graph.nodes:
-        node_stc_x, node_stc_y = node_stc
-        # a single NodeSTC is surrounded by 4 cells
-        # we need to determine which correct CellPath to add
-        # We need to ensure that the path is coherent with the adjacent cells
-        # check:
-        # - path continuity
-        # - no crossing with EdgeSTC
-        # since we are using a STC method, we are guaranteed to find a 
-        # valid path for each cells
-
-        # if current node has 4 edges:
-        if len(skeleton.graph.edges(node_stc)) == 4:
-            """
-            ┘└
-            ┐┌
-            """
-            path_codes = [
-                CellPath.TOP_RIGHT,
-                CellPath.TOP_LEFT,
-                CellPath.BOTTOM_LEFT,
-                CellPath.BOTTOM_RIGHT,
-            ]
-            set_cell_paths_in_vicinity_of_node_stc(
-                cell_path_matrix, node_stc, path_codes
-            )
-        elif len(skeleton.graph.edges(node_stc)) == 3:
-            """
-            4 cases, depending on the orientation of the 3 EdgeSTCs:
-            ┘└    │└    ┘│    ──
-            ──    │┌    ┐│    ┐┌
-            """
-            # get the 3 edges of the current NodeSTC
-            edges = list(skeleton.graph.edges(node_stc))
-            # the missing edge (top, bottom, left or right) gives the orientation
-            for dx, dy in [(1, 0), (-1, 0), (0, 1), (0, -1)]:
-                # check if the edge is missing
-                if (node_stc_x + dx, node_stc_y + dy) not in edges and (node_stc_y + dy, node_stc_x + dx) not in edges:
-                    # determine the path codes
-                    if dx == 1 and dy == 0:
-                        path_codes = [
-                            CellPath.TOP_RIGHT,
-                            CellPath.TOP_LEFT,
-                            CellPath.VERTICAL,
-                            CellPath.VERTICAL,
-                        ]
-                    elif dx == -1 and dy == 0:
-                        path_codes = [
-                            CellPath.VERTICAL,
-                            CellPath.VERTICAL,
-                            CellPath.BOTTOM_LEFT,
-                            CellPath.BOTTOM_RIGHT,
-                        ]
-                    elif dx == 0 and dy == 1:
-                        path_codes = [
-                            CellPath.VERTICAL,
-                            CellPath.TOP_LEFT,
-                            CellPath.VERTICAL,
-                            CellPath.BOTTOM_RIGHT,
-                        ]
-                    else:
-                        path_codes = [
-                            CellPath.TOP_RIGHT,
-                            CellPath.VERTICAL,
-                            CellPath.BOTTOM_LEFT,
-                            CellPath.VERTICAL,
-                        ]
-                    # set the path codes
-                    set_cell_paths_in_vicinity_of_node_stc(
-                        cell_path_matrix, node_stc, path_codes
-                    )
-        elif len(skeleton.graph.edges(node_stc)) == 2:
-            """
-            6 cases, depending on the orientation of the 2 EdgeSTCs:
-            ──    ││    ─┐    ┘│    ┌─    │└
-            ──    ││    ┐│    ─┘    │┌    └─
-            """
-            ...
-        elif len(skeleton.graph.edges(node_stc)) == 1:
-            """
-            4 cases, depending on the orientation of the 1 EdgeSTC:
-            ┌┐    ┌─    ││    ─┐
-            ││    └─    └┘    ─┘
-            """
-            ...
-        else:
-            raise Exception("Invalid number of edges for a NodeSTC.")
+        # From the skeleton, construct the CellPathMatrix
+        # a single NodeSTC is surrounded by 4 cells, whose CellPath only
+        # depends on the EdgeSTCs of the node
+        with instrumentation.span("get_stc_cell_codes"):
+            cell_codes = get_stc_cell_codes(tile_grid_graph.tile_exists, skeleton.masks)
+        with instrumentation.span("CellPathMatrix"):
+            cell_path_matrix = CellPathMatrix.from_codes(cell_codes)
+
+        if instrumentation.is_enabled():
+            degrees = skeleton.get_degrees()[tile_grid_graph.tile_exists]
+            for degree, nb_nodes in enumerate(np.bincount(degrees, minlength=5).tolist()):
+                instrumentation.count(f"stc.nodes.degree_{degree}", nb_nodes)
+            instrumentation.count("stc.cells_written", 4 * len(degrees))
 
     # Return the CellPathMatrix
     return cell_path_matrix
+
+
+def AlgorithmRandomSTC(
+    cell_grid_graph: CellGridGraph,
+    nb_cycles: int = 1,
+    rng: np.random.Generator | int | None = None,
+) -> list[CellPathMatrix]:
+    """
+    Algorithm STC with uniformly random skeletons.
+    Each spanning tree gives a different Hamiltonian cycle, so this draws
+    nb_cycles random cycles of the cells (they can repeat on small grids).
+    rng is a numpy Generator or a seed.
+    """
+
+    assert cell_grid_graph.tile_grid_graph.check_connected_graph()
+
+    tile_exists = cell_grid_graph.tile_grid_graph.tile_exists
+    skeleton_masks = random_spanning_tree_batch(tile_exists, nb_cycles, rng)
+    cell_codes = get_stc_cell_codes(tile_exists, skeleton_masks)
+    return [CellPathMatrix.from_codes(codes) for codes in cell_codes]
+
+
+# Tests
+import unittest
+class TestAlgorithmSTC(unittest.TestCase):
+    def assert_hamiltonian_cycle(self, tile_grid_graph: TileGridGraph, cell_path_matrix: CellPathMatrix):
+        from hpgg.grid_graphs.cell_grid_graph import CELL_PATH_TO_SIDES
+        from hpgg.grid_graphs.tile_grid_graphs import DIRECTION_OFFSETS, OPPOSITE_DIRECTION
+
+        cell_grid_graph = CellGridGraph(tile_grid_graph)
+        rows, cols = cell_grid_graph.get_nb_rows(), cell_grid_graph.get_nb_columns()
+        cells = [
+            (x, y) for x in range(rows) for y in range(cols)
+            if cell_grid_graph.cell_exists(x, y)
+        ]
+
+        # walk along the cycle, from the first cell
+        previous, current = None, cells[0]
+        visited = set()
+        while current not in visited:
+            visited.add(current)
+            sides = CELL_PATH_TO_SIDES[cell_path_matrix.cell_path_matrix[current[0]][current[1]]]
+            neighbours = []
+            for direction, (dx, dy) in DIRECTION_OFFSETS.items():
+                if sides & direction:
+                    neighbour = (current[0] + dx, current[1] + dy)
+                    neighbour_path = cell_path_matrix.cell_path_matrix[neighbour[0]][neighbour[1]]
+                    # the neighbour must join back
+                    self.assertTrue(CELL_PATH_TO_SIDES[neighbour_path] & OPPOSITE_DIRECTION[direction])
+                    neighbours.append(neighbour)
+            next_cell = neighbours[0] if neighbours[0] != previous else neighbours[1]
+            previous, current = current, next_cell
+
+        self.assertEqual(current, cells[0])
+        self.assertEqual(len(visited), len(cells))
+
+    def test_stc_random_grids(self):
+        """
+        Test that AlgorithmSTC gives a Hamiltonian cycle on random connected grids.
+        """
+        import random
+        random.seed(0)
+        for _ in range(30):
+            grid = TileGridGraph(random.randint(1, 10), random.randint(1, 10))
+            grid.add_periphery_holes(random.randint(0, 20), keep_connected=True)
+            grid.add_holes(random.randint(0, 5), keep_connected=True)
+            cell_path_matrix = AlgorithmSTC(CellGridGraph(grid))
+            self.assert_hamiltonian_cycle(grid, cell_path_matrix)
+
+    def test_random_stc(self):
+        """
+        Test that AlgorithmRandomSTC gives distinct Hamiltonian cycles, the same for a seed.
+        """
+        from hpgg.paths.validation import validate_cell_path_matrix
+
+        grid = TileGridGraph(6, 7)
+        grid.add_holes(4, keep_connected=True)
+        cell_grid_graph = CellGridGraph(grid)
+        cell_path_matrices = AlgorithmRandomSTC(cell_grid_graph, 50, rng=3)
+        for cell_path_matrix in cell_path_matrices:
+            report = validate_cell_path_matrix(cell_path_matrix, cell_grid_graph)
+            self.assertTrue(report.is_valid, report.get_message())
+        self.assertGreater(len({matrix.codes.tobytes() for matrix in cell_path_matrices}), 40)
+
+        again = AlgorithmRandomSTC(cell_grid_graph, 50, rng=3)
+        self.assertTrue(all(
+            np.array_equal(a.codes, b.codes) for a, b in zip(cell_path_matrices, again)
+        ))
@@ -0,0 +1,333 @@
+"""
+Local search for STC cycles with few turns.
+
+A turn is a corner cell of the cycle. In an STC cycle, the 4 cells of a tile
+only depend on the mask of the tile in the skeleton, so the number of turns
+is the sum of MASK_TURNS over the masks of the tiles.
+
+A move swaps an edge of the skeleton: a non-tree edge (a, b) is added, and
+an edge (c, p) of the tree path from a to b is removed, which gives another
+spanning tree. Only the masks of a, b, c and p change, so a move is costed
+from these 4 tiles. The tree is kept rooted (parent and depth of each tile)
+to find the tree paths.
+"""
+import random
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from hpgg.grid_graphs.cell_grid_graph import CELL_PATH_SIDES, CellGridGraph, CellPathMatrix
+from hpgg.grid_graphs.tile_grid_graphs import EAST, NORTH, SOUTH, WEST
+from hpgg.paths.skeleton import spanning_tree_masks
+from hpgg.paths.stc_algo import STC_PATH_CODES, get_stc_cell_codes
+
+
+def is_corner(sides: np.ndarray) -> np.ndarray:
+    return ((sides & (EAST | WEST)) != 0) & ((sides & (NORTH | SOUTH)) != 0)
+
+
+# number of turns of the 4 cells around a NodeSTC, for each of the 16 node masks
+MASK_TURNS = is_corner(CELL_PATH_SIDES[STC_PATH_CODES + 1]).sum(axis=1).astype(np.int64)
+
+
+def count_turns(cell_path_matrix: CellPathMatrix) -> int:
+    """
+    Count the turns (corner cells) of a path.
+    """
+    return int(np.count_nonzero(is_corner(cell_path_matrix.get_sides())))
+
+
+def opposite(direction: int) -> int:
+    return ((direction << 2) | (direction >> 2)) & 15
+
+
+@dataclass
+class TurnOptimizationResult:
+    """
+    Result of the turn optimizer: the best skeleton found and its cycle.
+    """
+    masks: np.ndarray
+    cell_path_matrix: CellPathMatrix
+    nb_turns: int
+    initial_nb_turns: int
+    nb_iterations: int
+    nb_moves_evaluated: int
+    nb_moves_applied: int
+    elapsed_time: float
+
+    @property
+    def moves_per_second(self) -> float:
+        return self.nb_moves_evaluated / self.elapsed_time if self.elapsed_time > 0 else 0.0
+
+    def get_message(self) -> str:
+        return (
+            f"{self.initial_nb_turns} -> {self.nb_turns} turns, "
+            f"{self.nb_moves_evaluated} moves evaluated in {self.elapsed_time:.2f}s "
+            f"({self.moves_per_second:.0f} moves/s), {self.nb_moves_applied} applied."
+        )
+
+
+class TurnOptimizerSTC():
+    """
+    Minimize the turns of an STC cycle by skeleton edge swaps.
+    """
+    def __init__(
+        self,
+        cell_grid_graph: CellGridGraph,
+        masks: np.ndarray | None = None,
+    ):
+        """
+        Start from the given skeleton masks, or from the default STC skeleton.
+        """
+        assert cell_grid_graph.tile_grid_graph.check_connected_graph()
+        self.cell_grid_graph = cell_grid_graph
+        self.tile_exists = cell_grid_graph.tile_grid_graph.tile_exists
+        n, m = self.tile_exists.shape
+        self.n, self.m = n, m
+        if masks is None:
+            masks = spanning_tree_masks(self.tile_exists)
+
+        # the search works on lists of flat tile indices
+        self.masks: list[int] = masks.ravel().tolist()
+        self.turns: list[int] = MASK_TURNS.tolist()
+        self.offsets = {NORTH: -m, EAST: 1, SOUTH: m, WEST: -1}
+        self.directions = {offset: direction for direction, offset in self.offsets.items()}
+        self.nb_turns = int(MASK_TURNS[masks][self.tile_exists].sum())
+
+        # edges between adjacent tiles, as (a, b, direction from a to b)
+        flat_exists = self.tile_exists.ravel()
+        self.edges: list[tuple[int, int, int]] = []
+        for tile in np.flatnonzero(flat_exists).tolist():
+            i, j = divmod(tile, m)
+            if j + 1 < m and flat_exists[tile + 1]:
+                self.edges.append((tile, tile + 1, EAST))
+            if i + 1 < n and flat_exists[tile + m]:
+                self.edges.append((tile, tile + m, SOUTH))
+
+        self.parent: list[int] = [-1] * (n * m)
+        self.depth: list[int] = [0] * (n * m)
+        tiles = np.flatnonzero(flat_exists)
+        if len(tiles) > 0:
+            root = int(tiles[0])
+            self.parent[root] = root
+            self.__set_depths(root)
+
+    def __set_depths(self, subtree_root: int):
+        """
+        Set the depths in the subtree of a tile, from its parent.
+        """
+        masks, parent, depth, offsets = self.masks, self.parent, self.depth, self.offsets
+        if parent[subtree_root] != subtree_root:
+            depth[subtree_root] = depth[parent[subtree_root]] + 1
+        stack = [subtree_root]
+        while stack:
+            tile = stack.pop()
+            for direction, offset in offsets.items():
+                if masks[tile] & direction:
+                    child = tile + offset
+                    if child != parent[tile]:
+                        parent[child] = tile
+                        depth[child] = depth[tile] + 1
+                        stack.append(child)
+
+    def get_tree_path(self, a: int, b: int) -> tuple[list[int], list[int]]:
+        """
+        Get the tree path from a to b, as the lower tiles of its edges
+        (each edge is a tile and its parent), on the side of a and on the side of b.
+        """
+        parent, depth = self.parent, self.depth
+        a_side, b_side = [], []
+        while depth[a] > depth[b]:
+            a_side.append(a)
+            a = parent[a]
+        while depth[b] > depth[a]:
+            b_side.append(b)
+            b = parent[b]
+        while a != b:
+            a_side.append(a)
+            a = parent[a]
+            b_side.append(b)
+            b = parent[b]
+        return a_side, b_side
+
+    def get_delta(self, a: int, b: int, direction: int, child: int) -> int:
+        """
+        Get the change of turns when adding the edge (a, b) and removing
+        the edge between child and its parent.
+        """
+        masks, turns = self.masks, self.turns
+        parent = self.parent[child]
+        new_masks = {a: masks[a], b: masks[b], child: masks[child], parent: masks[parent]}
+        new_masks[a] |= direction
+        new_masks[b] |= opposite(direction)
+        removed = self.directions[parent - child]
+        new_masks[child] &= ~removed
+        new_masks[parent] &= ~opposite(removed)
+        return sum(turns[mask] - turns[masks[tile]] for tile, mask in new_masks.items())
+
+    def apply_move(self, a: int, b: int, direction: int, child: int, a_side: bool):
+        """
+        Add the edge (a, b) and remove the edge between child and its parent.
+        a_side tells if child is on the tree path from a (else from b).
+        """
+        masks, parent = self.masks, self.parent
+        removed = self.directions[parent[child] - child]
+        masks[child] &= ~removed
+        masks[parent[child]] &= ~opposite(removed)
+        masks[a] |= direction
+        masks[b] |= opposite(direction)
+
+        # the subtree of child hangs from the new edge, rerooted at its end
+        subtree_root, new_parent = (a, b) if a_side else (b, a)
+        tile = subtree_root
+        while tile != child:
+            next_tile = parent[tile]
+            parent[tile] = new_parent
+            new_parent, tile = tile, next_tile
+        parent[child] = new_parent
+        self.__set_depths(subtree_root)
+
+    def get_masks(self) -> np.ndarray:
+        return np.array(self.masks, dtype=np.uint8).reshape(self.n, self.m)
+
+    def optimize(
+        self,
+        max_iterations: int | None = 100_000,
+        time_limit: float | None = None,
+        seed: int = 0,
+        accept_sideways: bool = True,
+    ) -> TurnOptimizationResult:
+        """
+        Run the local search: each iteration draws a non-tree edge, costs all
+        the swaps with the edges of its tree path, and applies the best one if
+        it removes turns (or keeps the same number, with accept_sideways, to
+        move along plateaus). Stops after max_iterations or time_limit seconds.
+        """
+        rng = random.Random(seed)
+        start_time = time.perf_counter()
+        initial_nb_turns = best_nb_turns = self.nb_turns
+        best_masks = self.get_masks()
+        nb_iterations = nb_moves_evaluated = nb_moves_applied = 0
+        masks, edges = self.masks, self.edges
+
+        while (max_iterations is None or nb_iterations < max_iterations) and edges:
+            if time_limit is not None and nb_iterations % 256 == 0 and time.perf_counter() - start_time > time_limit:
+                break
+            nb_iterations += 1
+            a, b, direction = edges[rng.randrange(len(edges))]
+            if masks[a] & direction:
+                continue
+
+            a_side, b_side = self.get_tree_path(a, b)
+            best_move, best_delta, nb_ties = None, None, 0
+            for side, children in ((True, a_side), (False, b_side)):
+                for child in children:
+                    delta = self.get_delta(a, b, direction, child)
+                    if best_delta is None or delta < best_delta:
+                        best_move, best_delta, nb_ties = (child, side), delta, 1
+                    elif delta == best_delta:
+                        # break ties uniformly at random
+                        nb_ties += 1
+                        if rng.randrange(nb_ties) == 0:
+                            best_move = (child, side)
+            nb_moves_evaluated += len(a_side) + len(b_side)
+
+            if best_delta < 0 or (best_delta == 0 and accept_sideways):
+                self.apply_move(a, b, direction, *best_move)
+                self.nb_turns += best_delta
+                nb_moves_applied += 1
+                if self.nb_turns < best_nb_turns:
+                    best_nb_turns = self.nb_turns
+                    best_masks = self.get_masks()
+
+        cell_codes = get_stc_cell_codes(self.tile_exists, best_masks)
+        return TurnOptimizationResult(
+            masks=best_masks,
+            cell_path_matrix=CellPathMatrix.from_codes(cell_codes),
+            nb_turns=best_nb_turns,
+            initial_nb_turns=initial_nb_turns,
+            nb_iterations=nb_iterations,
+            nb_moves_evaluated=nb_moves_evaluated,
+            nb_moves_applied=nb_moves_applied,
+            elapsed_time=time.perf_counter() - start_time,
+        )
+
+
+def minimize_turns(
+    cell_grid_graph: CellGridGraph,
+    max_iterations: int | None = 100_000,
+    time_limit: float | None = None,
+    seed: int = 0,
+    masks: np.ndarray | None = None,
+) -> TurnOptimizationResult:
+    """
+    Find an STC cycle with few turns, starting from the given skeleton masks
+    (by default, the STC skeleton).
+    """
+    return TurnOptimizerSTC(cell_grid_graph, masks).optimize(max_iterations, time_limit, seed)
+
+
+# Tests
+import unittest
+class TestTurnOptimizer(unittest.TestCase):
+    def test_incremental_delta(self):
+        """
+        Test that the incremental cost of the moves matches a full count,
+        and that the rooted tree stays consistent with the masks.
+        """
+        from hpgg.grid_graphs.tile_grid_graphs import TileGridGraph
+        from hpgg.paths.skeleton import MASK_DEGREE, random_spanning_tree_masks
+
+        random.seed(2)
+        grid = TileGridGraph(8, 9)
+        grid.add_holes(10, keep_connected=True)
+        cell_grid_graph = CellGridGraph(grid)
+        optimizer = TurnOptimizerSTC(cell_grid_graph, random_spanning_tree_masks(grid.tile_exists, rng=0))
+        rng = random.Random(0)
+        for _ in range(300):
+            a, b, direction = rng.choice(optimizer.edges)
+            if optimizer.masks[a] & direction:
+                continue
+            a_side, b_side = optimizer.get_tree_path(a, b)
+            side, children = rng.choice([(True, a_side), (False, b_side)])
+            if not children:
+                continue
+            child = rng.choice(children)
+            delta = optimizer.get_delta(a, b, direction, child)
+            optimizer.apply_move(a, b, direction, child, side)
+            optimizer.nb_turns += delta
+
+            masks = optimizer.get_masks()
+            self.assertEqual(optimizer.nb_turns, int(MASK_TURNS[masks][grid.tile_exists].sum()))
+            self.assertEqual(int(MASK_DEGREE[masks].sum()), 2 * (grid.tile_exists.sum() - 1))
+            for tile in np.flatnonzero(grid.tile_exists).tolist():
+                parent = optimizer.parent[tile]
+                if parent != tile:
+                    self.assertTrue(optimizer.masks[tile] & optimizer.directions[parent - tile])
+                    self.assertEqual(optimizer.depth[tile], optimizer.depth[parent] + 1)
+
+    def test_minimize_turns(self):
+        """
+        Test that the optimized cycle is a Hamiltonian cycle with fewer turns.
+        """
+        from hpgg.grid_graphs.tile_grid_graphs import TileGridGraph
+        from hpgg.paths.stc_algo import AlgorithmSTC
+        from hpgg.paths.validation import validate_cell_path_matrix
+
+        random.seed(3)
+        grid = TileGridGraph(10, 10)
+        grid.add_holes(8, keep_connected=True)
+        cell_grid_graph = CellGridGraph(grid)
+        result = minimize_turns(cell_grid_graph, max_iterations=20_000, seed=1)
+        report = validate_cell_path_matrix(result.cell_path_matrix, cell_grid_graph)
+        self.assertTrue(report.is_valid, report.get_message())
+        self.assertEqual(result.initial_nb_turns, count_turns(AlgorithmSTC(cell_grid_graph)))
+        self.assertEqual(result.nb_turns, count_turns(result.cell_path_matrix))
+        self.assertLess(result.nb_turns, result.initial_nb_turns)
+        self.assertGreater(result.moves_per_second, 0)
+        self.assertIn("moves/s", result.get_message())
+
+        # the same seed gives the same cycle
+        again = minimize_turns(cell_grid_graph, max_iterations=20_000, seed=1)
+        self.assertTrue(np.array_equal(again.masks, result.masks))
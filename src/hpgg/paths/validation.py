@@ -0,0 +1,240 @@
+"""
+Validation of the Hamiltonian cycle described by a CellPathMatrix.
+
+All the checks are whole-array operations:
+- coverage: every existing cell has a path, and only existing cells.
+- joins: the path of a cell crosses a side iff the path of the adjacent
+  cell crosses it too (checked with array shifts).
+- single component: once all joins are consistent, the path is a set of
+  disjoint cycles. They are counted on the corner cells only, since the
+  straight cells between two corners carry no information.
+"""
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from hpgg.grid_graphs.cell_grid_graph import CellGridGraph, CellPath, CellPathMatrix
+from hpgg.grid_graphs.tile_grid_graphs import EAST, NORTH, SOUTH, WEST
+from hpgg.paths.cycle import count_cycles
+
+
+@dataclass
+class ValidationReport:
+    """
+    Result of `validate_cell_path_matrix`.
+    The offending cells are (k, 2) arrays of (x, y), in row-major order,
+    limited to the first max_reported cells.
+    """
+    nb_cells: int
+    nb_cycles: int | None = None
+    uncovered_cells: np.ndarray = field(default_factory=lambda: np.zeros((0, 2), dtype=np.int64))
+    unexpected_cells: np.ndarray = field(default_factory=lambda: np.zeros((0, 2), dtype=np.int64))
+    broken_join_cells: np.ndarray = field(default_factory=lambda: np.zeros((0, 2), dtype=np.int64))
+
+    @property
+    def is_valid(self) -> bool:
+        return self.nb_cycles == 1
+
+    def get_message(self) -> str:
+        if len(self.uncovered_cells) > 0:
+            return f"Cells without path: {self.uncovered_cells.tolist()}."
+        if len(self.unexpected_cells) > 0:
+            return f"Path on cells that do not exist: {self.unexpected_cells.tolist()}."
+        if len(self.broken_join_cells) > 0:
+            return f"Path not joined with the adjacent cells: {self.broken_join_cells.tolist()}."
+        if self.nb_cycles != 1:
+            return f"The path is made of {self.nb_cycles} cycles."
+        return "The path is a Hamiltonian cycle."
+
+
+def get_broken_joins(sides: np.ndarray) -> np.ndarray:
+    """
+    Get a boolean mask of the cells whose path crosses a side that the
+    adjacent cell does not cross (or the border of the grid), or the reverse.
+    """
+    broken = np.zeros(sides.shape, dtype=bool)
+
+    # sides on the border of the grid
+    broken[0, :] |= (sides[0, :] & NORTH) != 0
+    broken[-1, :] |= (sides[-1, :] & SOUTH) != 0
+    broken[:, 0] |= (sides[:, 0] & WEST) != 0
+    broken[:, -1] |= (sides[:, -1] & EAST) != 0
+
+    # horizontal joins
+    mismatch = ((sides[:, :-1] & EAST) != 0) != ((sides[:, 1:] & WEST) != 0)
+    broken[:, :-1] |= mismatch
+    broken[:, 1:] |= mismatch
+
+    # vertical joins
+    mismatch = ((sides[:-1, :] & SOUTH) != 0) != ((sides[1:, :] & NORTH) != 0)
+    broken[:-1, :] |= mismatch
+    broken[1:, :] |= mismatch
+
+    return broken
+
+
+def count_path_cycles(sides: np.ndarray) -> int:
+    """
+    Count the cycles of a path whose joins are all consistent.
+
+    Each corner cell is joined to one corner horizontally (the next or previous
+    corner of its row) and to one corner vertically (the next or previous corner
+    of its column). Alternating horizontal and vertical partners follows the
+    cycles, and the permutation "vertical partner of the horizontal partner"
+    has exactly 2 cycles per path cycle (the even and the odd corners).
+    """
+    rows, cols = sides.shape
+    is_corner = ((sides & (EAST | WEST)) != 0) & ((sides & (NORTH | SOUTH)) != 0)
+    corners = np.flatnonzero(is_corner)
+    nb_corners = len(corners)
+    if nb_corners == 0:
+        return 0
+
+    index_type = np.int32 if rows * cols < 2**31 else np.int64
+    corner_ids = np.arange(nb_corners, dtype=index_type)
+    corner_sides = sides.ravel()[corners]
+
+    # horizontal partners: neighbours in the row-major order of the corners
+    horizontal_partners = np.where(
+        corner_sides & EAST,
+        np.minimum(corner_ids + 1, nb_corners - 1),
+        np.maximum(corner_ids - 1, 0),
+    )
+
+    # vertical partners: neighbours in the column-major order of the corners
+    ids_grid = np.full(rows * cols, -1, dtype=index_type)
+    ids_grid[corners] = corner_ids
+    column_order = ids_grid.reshape(rows, cols).T.ravel()
+    column_order = column_order[column_order >= 0]
+    column_positions = np.empty(nb_corners, dtype=index_type)
+    column_positions[column_order] = corner_ids
+    vertical_partners = np.where(
+        corner_sides & SOUTH,
+        column_order[np.minimum(column_positions + 1, nb_corners - 1)],
+        column_order[np.maximum(column_positions - 1, 0)],
+    )
+
+    return count_cycles(vertical_partners[horizontal_partners]) // 2
+
+
+def validate_cell_path_matrix(
+    cell_path_matrix: CellPathMatrix,
+    cell_grid_graph: CellGridGraph | None = None,
+    max_reported: int = 10,
+) -> ValidationReport:
+    """
+    Check that a CellPathMatrix is a single Hamiltonian cycle.
+
+    If a cell grid graph is given, the path must cover exactly its cells.
+    Otherwise, the cells are the ones that are not NO_CELL in the matrix.
+    """
+    codes = cell_path_matrix.codes
+    if cell_grid_graph is not None:
+        cell_mask = cell_grid_graph.get_cell_mask()
+        if cell_mask.shape != codes.shape:
+            raise Exception(
+                f"The CellPathMatrix has shape {codes.shape}, "
+                f"but the cell grid graph has shape {cell_mask.shape}."
+            )
+    else:
+        cell_mask = codes != CellPath.NO_CELL.value
+
+    sides = cell_path_matrix.get_sides()
+    report = ValidationReport(nb_cells=int(np.count_nonzero(cell_mask)))
+
+    if codes.size == 0:
+        report.nb_cycles = 0
+        return report
+
+    def first_cells(mask: np.ndarray) -> np.ndarray:
+        if not mask.any():
+            return np.zeros((0, 2), dtype=np.int64)
+        return np.argwhere(mask)[:max_reported]
+
+    has_path = sides != 0
+    report.uncovered_cells = first_cells(cell_mask > has_path)
+    report.unexpected_cells = first_cells(cell_mask < (codes != CellPath.NO_CELL.value))
+    report.broken_join_cells = first_cells(get_broken_joins(sides))
+    if (
+        len(report.uncovered_cells) > 0
+        or len(report.unexpected_cells) > 0
+        or len(report.broken_join_cells) > 0
+    ):
+        return report
+
+    # all the joins are consistent: the path is a set of disjoint cycles
+    report.nb_cycles = count_path_cycles(sides)
+    return report
+
+
+def check_hamiltonian_cycle(
+    cell_path_matrix: CellPathMatrix,
+    cell_grid_graph: CellGridGraph | None = None,
+):
+    """
+    Raise an Exception if the CellPathMatrix is not a single Hamiltonian cycle.
+    """
+    report = validate_cell_path_matrix(cell_path_matrix, cell_grid_graph)
+    if not report.is_valid:
+        raise Exception(report.get_message())
+
+
+# Tests
+import unittest
+class TestValidation(unittest.TestCase):
+    def test_validate_stc_and_broken_matrices(self):
+        """
+        Test the validation of a valid cycle, and of the usual ways to break it.
+        """
+        from hpgg.grid_graphs.tile_grid_graphs import tile_grid_graph_from_text
+        from hpgg.paths.stc_algo import AlgorithmSTC
+
+        grid_text = """
+        x x x
+        x . x
+        x x x
+        """
+        cell_grid_graph = CellGridGraph(tile_grid_graph_from_text(grid_text.strip()))
+        cell_path_matrix = AlgorithmSTC(cell_grid_graph)
+        report = validate_cell_path_matrix(cell_path_matrix, cell_grid_graph)
+        self.assertTrue(report.is_valid, report.get_message())
+        self.assertEqual(report.nb_cells, 32)
+
+        # a missing path
+        broken = CellPathMatrix.from_codes(cell_path_matrix.codes.copy())
+        broken.set_cell_path(0, 3, CellPath.NO_PATH)
+        report = validate_cell_path_matrix(broken, cell_grid_graph)
+        self.assertFalse(report.is_valid)
+        self.assertEqual(report.uncovered_cells.tolist(), [[0, 3]])
+
+        # a path on the hole
+        broken = CellPathMatrix.from_codes(cell_path_matrix.codes.copy())
+        broken.set_cell_path(2, 2, CellPath.NO_PATH)
+        report = validate_cell_path_matrix(broken, cell_grid_graph)
+        self.assertEqual(report.unexpected_cells.tolist(), [[2, 2]])
+
+        # a glyph that does not join its neighbours
+        broken = CellPathMatrix.from_codes(cell_path_matrix.codes.copy())
+        broken.set_cell_path(0, 3, CellPath.VERTICAL)
+        report = validate_cell_path_matrix(broken, cell_grid_graph)
+        self.assertEqual(report.broken_join_cells[0].tolist(), [0, 2])
+
+        # two separate cycles: the outer and inner rings of the grid
+        codes = np.full((6, 6), CellPath.HORIZONTAL.value, dtype=np.int8)
+        outer = CellPathMatrix.from_codes(codes)
+        for x in range(6):
+            for y in range(6):
+                on_ring = 0 if x in (0, 5) or y in (0, 5) else 1
+                low, high = on_ring, 5 - on_ring
+                if x in (low, high) and y in (low, high):
+                    corner = {
+                        (low, low): CellPath.BOTTOM_RIGHT, (low, high): CellPath.BOTTOM_LEFT,
+                        (high, low): CellPath.TOP_LEFT, (high, high): CellPath.TOP_RIGHT,
+                    }[(x, y)]
+                    outer.set_cell_path(x, y, corner)
+                elif y in (low, high):
+                    outer.set_cell_path(x, y, CellPath.VERTICAL)
+        outer.codes[2:4, 2:4] = CellPath.NO_CELL.value
+        report = validate_cell_path_matrix(outer)
+        self.assertEqual(report.nb_cycles, 2)
+        self.assertFalse(report.is_valid)
@@ -0,0 +1,259 @@
+"""
+Drawing of tile grid graphs and of their Hamiltonian cycle, in TikZ or SVG.
+
+The documents are streamed to the file, chunk by chunk, and their size only
+depends on the shape of the grid:
+- the tiles are merged into rectangles (runs of tiles in a row, stacked with
+  the identical runs of the next rows), each drawn once for the fill, the
+  cell grid and the tile grid.
+- the cycle is a single closed polyline through the centres of its cells,
+  with a point only where it turns.
+"""
+import os
+from typing import Iterator, TextIO
+
+import numpy as np
+
+from hpgg.grid_graphs.cell_grid_graph import CellPathMatrix
+from hpgg.grid_graphs.tile_grid_graphs import TIKZ_FIG_BEGIN, TIKZ_FIG_END, TileGridGraph
+from hpgg.paths.cycle import flat_indices_to_coordinates, get_cycle_order
+
+# number of rectangles or points formatted at once
+CHUNK_SIZE = 1 << 14
+# buffer size of the output files
+BUFFER_SIZE = 1 << 20
+
+FORMATS = ("tikz", "svg")
+
+
+def get_tile_rectangles(tile_exists: np.ndarray) -> np.ndarray:
+    """
+    Cover the tiles with disjoint rectangles: the runs of tiles of each row,
+    stacked with the identical runs of the next rows.
+    Returns a (k, 4) array of (top, left, bottom, right), bottom and right excluded.
+    """
+    n, m = tile_exists.shape
+    padded = np.zeros((n, m + 2), dtype=np.int8)
+    padded[:, 1:-1] = tile_exists
+    steps = np.diff(padded, axis=1)
+    rows, lefts = np.nonzero(steps == 1)
+    _, rights = np.nonzero(steps == -1)
+    if len(rows) == 0:
+        return np.zeros((0, 4), dtype=np.int64)
+
+    # sort the runs by span, then by row: a stack is a sequence of consecutive rows
+    spans = lefts * (m + 1) + rights
+    order = np.lexsort((rows, spans))
+    rows, spans = rows[order], spans[order]
+    starts = np.ones(len(rows), dtype=bool)
+    starts[1:] = (spans[1:] != spans[:-1]) | (rows[1:] != rows[:-1] + 1)
+    first_runs = np.flatnonzero(starts)
+    last_runs = np.append(first_runs[1:], len(rows)) - 1
+
+    rectangles = np.empty((len(first_runs), 4), dtype=np.int64)
+    rectangles[:, 0] = rows[first_runs]
+    rectangles[:, 1] = lefts[order][first_runs]
+    rectangles[:, 2] = rows[last_runs] + 1
+    rectangles[:, 3] = rights[order][first_runs]
+    return rectangles
+
+
+def iter_cycle_corners(cell_path_matrix: CellPathMatrix, chunk_size: int = CHUNK_SIZE) -> Iterator[np.ndarray]:
+    """
+    Stream the cells of the Hamiltonian cycle where it turns, in visiting order,
+    as (k, 2) int32 arrays of cell coordinates (x, y).
+    """
+    order = get_cycle_order(cell_path_matrix)
+    for start in range(0, len(order), chunk_size):
+        positions = np.arange(start, min(start + chunk_size, len(order)))
+        cells = order[positions]
+        before = cells - order.take(positions - 1, mode="wrap")
+        after = order.take(positions + 1, mode="wrap") - cells
+        yield flat_indices_to_coordinates(cells[before != after], cell_path_matrix.cols)
+
+
+def _format_points(template: str, separator: str, points: np.ndarray) -> str:
+    """
+    Format (k, 2) points with a template of 2 integers, in a single string operation.
+    """
+    return separator.join([template] * len(points)) % tuple(points.ravel().tolist())
+
+
+class TikzWriter():
+    """
+    Write a TikZ figure: 1 unit per tile, rows going down.
+    """
+    def __init__(self, file: TextIO, figure: bool = True):
+        self.file = file
+        self.figure = figure
+
+    def begin(self, n: int, m: int):
+        if self.figure:
+            self.file.write(TIKZ_FIG_BEGIN)
+        else:
+            self.file.write("\\begin{tikzpicture}\n")
+
+    def __write_rectangles(self, command: str, operation: str, rectangles: np.ndarray):
+        self.file.write(f"\t\t{command}\n")
+        for start in range(0, len(rectangles), CHUNK_SIZE):
+            # (left, top) operation (right, bottom)
+            corners = rectangles[start:start + CHUNK_SIZE][:, [1, 0, 3, 2]]
+            template = f"\t\t\t(%d,%d) {operation} (%d,%d)"
+            lines = "\n".join([template] * len(corners)) % tuple(corners.ravel().tolist())
+            self.file.write(lines + "\n")
+        self.file.write("\t\t;\n")
+
+    def write_tiles(self, rectangles: np.ndarray, draw_cells: bool = True):
+        if len(rectangles) == 0:
+            return
+        self.file.write("\t\t% Tiles\n\t\t\\begin{scope}[y=-1cm]\n")
+        self.__write_rectangles("\\fill[gray!20]", "rectangle", rectangles)
+        if draw_cells:
+            self.__write_rectangles("\\draw[draw=gray, thin, step=0.5]", "grid", rectangles)
+        self.__write_rectangles("\\draw[draw=black, very thick, step=1]", "grid", rectangles)
+        self.file.write("\t\t\\end{scope}\n")
+
+    def write_cycle(self, corners: Iterator[np.ndarray]):
+        self.file.write(
+            "\n\t\t% Hamiltonian cycle\n"
+            "\t\t\\begin{scope}[x=0.5cm, y=-0.5cm, xshift=0.25cm, yshift=-0.25cm]\n"
+            "\t\t\\draw[red, thick]\n"
+        )
+        for chunk in corners:
+            if len(chunk):
+                # (y, x) -- ... --
+                self.file.write(_format_points("\t\t\t(%d,%d) --", "\n", chunk[:, ::-1]) + "\n")
+        self.file.write("\t\t\tcycle;\n\t\t\\end{scope}\n")
+
+    def end(self):
+        if self.figure:
+            self.file.write(TIKZ_FIG_END)
+        else:
+            self.file.write("\\end{tikzpicture}\n")
+
+
+class SvgWriter():
+    """
+    Write a SVG image, in units of half a cell (4 units per tile),
+    and scale pixels per tile.
+    """
+    def __init__(self, file: TextIO, scale: float = 20):
+        self.file = file
+        self.scale = scale
+
+    def begin(self, n: int, m: int):
+        self.file.write(
+            f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+            f'width="{m * self.scale:g}" height="{n * self.scale:g}" viewBox="0 0 {4 * m} {4 * n}">\n'
+            '<defs>\n'
+            '<pattern id="cells" width="2" height="2" patternUnits="userSpaceOnUse">'
+            '<path d="M 2 0 L 0 0 0 2" fill="none" stroke="gray" stroke-width="0.05"/></pattern>\n'
+            '<pattern id="tiles" width="4" height="4" patternUnits="userSpaceOnUse">'
+            '<path d="M 4 0 L 0 0 0 4" fill="none" stroke="black" stroke-width="0.3"/></pattern>\n'
+            '</defs>\n'
+        )
+
+    def write_tiles(self, rectangles: np.ndarray, draw_cells: bool = True):
+        if len(rectangles) == 0:
+            return
+        self.file.write('<defs><path id="tile-rectangles" d="\n')
+        for start in range(0, len(rectangles), CHUNK_SIZE):
+            chunk = rectangles[start:start + CHUNK_SIZE]
+            # M left top H right V bottom H left Z
+            path = np.column_stack([chunk[:, 1], chunk[:, 0], chunk[:, 3], chunk[:, 2], chunk[:, 1]]) * 4
+            self.file.write("\n".join(["M%d %dH%dV%dH%dZ"] * len(path)) % tuple(path.ravel().tolist()) + "\n")
+        self.file.write('"/></defs>\n<use xlink:href="#tile-rectangles" fill="#e6e6e6"/>\n')
+        if draw_cells:
+            self.file.write('<use xlink:href="#tile-rectangles" fill="url(#cells)"/>\n')
+        self.file.write('<use xlink:href="#tile-rectangles" fill="url(#tiles)" stroke="black" stroke-width="0.3"/>\n')
+
+    def write_cycle(self, corners: Iterator[np.ndarray]):
+        self.file.write('<polygon fill="none" stroke="red" stroke-width="0.3" stroke-linejoin="round" points="\n')
+        for chunk in corners:
+            if len(chunk):
+                # cell centres: (2y + 1, 2x + 1)
+                self.file.write(_format_points("%d,%d", " ", 2 * chunk[:, ::-1] + 1) + "\n")
+        self.file.write('"/>\n')
+
+    def end(self):
+        self.file.write("</svg>\n")
+
+
+def render(
+    output: str | TextIO,
+    tile_grid_graph: TileGridGraph,
+    cell_path_matrix: CellPathMatrix | None = None,
+    format: str | None = None,
+    draw_cells: bool = True,
+):
+    """
+    Draw a tile grid graph, and the Hamiltonian cycle of cell_path_matrix, to a
+    path or a text file. The format ("tikz" or "svg") defaults to the extension
+    of the path (".svg" for SVG, else TikZ).
+    Raises an Exception if cell_path_matrix is not a single Hamiltonian cycle.
+    """
+    if format is None:
+        is_svg = isinstance(output, str) and os.path.splitext(output)[1].lower() == ".svg"
+        format = "svg" if is_svg else "tikz"
+    if format not in FORMATS:
+        raise Exception(f"Unknown format '{format}', expected one of {FORMATS}.")
+
+    if isinstance(output, str):
+        with open(output, "w", buffering=BUFFER_SIZE) as file:
+            render(file, tile_grid_graph, cell_path_matrix, format, draw_cells)
+        return
+
+    writer = SvgWriter(output) if format == "svg" else TikzWriter(output)
+    writer.begin(tile_grid_graph.n, tile_grid_graph.m)
+    writer.write_tiles(get_tile_rectangles(tile_grid_graph.tile_exists), draw_cells)
+    if cell_path_matrix is not None:
+        writer.write_cycle(iter_cycle_corners(cell_path_matrix))
+    writer.end()
+
+
+# Tests
+import unittest
+class TestRendering(unittest.TestCase):
+    def test_tile_rectangles(self):
+        """
+        Test that the rectangles cover each tile exactly once.
+        """
+        rng = np.random.default_rng(0)
+        for density in (0.2, 0.6, 0.95, 1.0):
+            mask = rng.random((13, 9)) < density
+            covered = np.zeros(mask.shape, dtype=np.int64)
+            for top, left, bottom, right in get_tile_rectangles(mask):
+                covered[top:bottom, left:right] += 1
+            self.assertTrue(np.array_equal(covered, mask.astype(np.int64)))
+        self.assertEqual(len(get_tile_rectangles(np.ones((50, 40), dtype=bool))), 1)
+
+    def test_render_cycle(self):
+        """
+        Test that the cycle is drawn through all its corners, in both formats.
+        """
+        import io
+        import xml.etree.ElementTree as ElementTree
+        from hpgg.grid_graphs.cell_grid_graph import CellGridGraph
+        from hpgg.grid_graphs.tile_grid_graphs import tile_grid_graph_from_text
+        from hpgg.paths.stc_algo import AlgorithmSTC
+
+        grid = tile_grid_graph_from_text("x x .\nx x x")
+        cell_path_matrix = AlgorithmSTC(CellGridGraph(grid))
+        corners = np.concatenate(list(iter_cycle_corners(cell_path_matrix, chunk_size=3)))
+        # the path is a rectilinear polygon, so it alternates horizontal and vertical moves
+        moves = np.diff(np.concatenate([corners, corners[:1]]), axis=0)
+        self.assertEqual(len(corners) % 2, 0)
+        self.assertTrue(np.all((moves[:, 0] == 0) != (moves[:, 1] == 0)))
+
+        output = io.StringIO()
+        render(output, grid, cell_path_matrix, format="svg")
+        svg = ElementTree.fromstring(output.getvalue())
+        polygon = svg.find("{http://www.w3.org/2000/svg}polygon")
+        self.assertEqual(len(polygon.get("points").split()), len(corners))
+
+        output = io.StringIO()
+        render(output, grid, cell_path_matrix, format="tikz")
+        tikz = output.getvalue()
+        self.assertEqual(tikz.count(" --"), len(corners))
+        self.assertIn("cycle;", tikz)
+        self.assertEqual(tikz.count("rectangle"), len(get_tile_rectangles(grid.tile_exists)))
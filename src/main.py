@@ -7,8 +7,8 @@ def gen_random_grid_graph(n: int, m: int) -> TileGridGraph:
     """
     grid = TileGridGraph(n, m)
 
-    grid.add_periphery_holes(5)
-    grid.add_holes(3)
+    grid.add_periphery_holes(5, keep_connected=True)
+    grid.add_holes(3, keep_connected=True)
     
     #grid.make_narrow()
     #grid.generate_tikz("test.tex")
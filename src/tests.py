@@ -16,7 +16,26 @@ python -m unittest tests.TestGridGraph
 """
 
 import unittest
+from benchmarks.suite import TestBenchmarks
+from hpgg.cache import TestSolutionCache
+from hpgg.cli import TestCLI
+from hpgg.generation import TestGeneration
+from hpgg.grid_graphs.canonical import TestCanonicalForm
+from hpgg.grid_graphs.cell_grid_graph import TestCellGridGraph
 from hpgg.grid_graphs.tile_grid_graphs import TestGridGraph
+from hpgg.io.binary_format import TestBinaryFormat
+from hpgg.instrumentation import TestInstrumentation
+from hpgg.io.text_format import TestTextFormat
+from hpgg.paths.cycle import TestCycleExtraction
+from hpgg.paths.dynamic_stc import TestDynamicSTC
+from hpgg.paths.exact import TestExactSolver
+from hpgg.paths.frontier import TestFrontierDP
+from hpgg.paths.parallel_stc import TestParallelSTC
+from hpgg.paths.skeleton import TestSkeleton
+from hpgg.paths.stc_algo import TestAlgorithmSTC
+from hpgg.paths.turns import TestTurnOptimizer
+from hpgg.paths.validation import TestValidation
+from hpgg.rendering import TestRendering
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file